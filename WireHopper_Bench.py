@@ -0,0 +1,227 @@
+"""
+WireHopper - Benchmark harness
+Times every WireHopper action on synthetic documents outside Rhino.
+
+Each action is run exactly the way the GHPython component runs it: the script
+is executed as __main__ with Action/Mode/Target/Length set as globals, against
+a document built by WireHopper_Mock.generate_document(). Results are written
+as JSON lines (one record per size and action) so runs can be diffed and
+regressions caught on a plain Linux box.
+
+Usage:
+    python WireHopper_Bench.py                          # 1k and 10k components
+    python WireHopper_Bench.py --sizes 1000,10000,100000 --repeat 5
+    python WireHopper_Bench.py --actions ALL_HIDDEN,AUTO_LENGTH --out bench.jsonl
+    python WireHopper_Bench.py --compare bench.jsonl    # exit 1 on regressions
+    python WireHopper_Bench.py --profile                # add per-phase timings
+    python WireHopper_Bench.py --cold                   # time every run from a cold engine
+    python WireHopper_Bench.py --slice 16               # sliced apply; also times the Idle slices
+"""
+
+import argparse
+import json
+import os
+import runpy
+import statistics
+import sys
+import time
+
+import WireHopper_Mock as mock
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "WireHopper_Python.py")
+
+# (action, inputs, mutates the document's wiring or tree flags)
+ACTIONS = [
+    ("ALL_DEFAULT", {"Mode": 2}, False),
+    ("ALL_FAINT", {"Mode": 1}, False),
+    ("ALL_HIDDEN", {"Mode": 0}, False),
+    ("SEL_DEFAULT", {"Mode": 2}, False),
+    ("SEL_FAINT", {"Mode": 1}, False),
+    ("SEL_HIDDEN", {"Mode": 0}, False),
+    ("CLEAN_LENGTH", {"Mode": 0, "Length": 1500.0}, False),
+    ("AUTO_LENGTH", {}, False),
+    ("CLEAN_GEOMETRY", {"Mode": 0}, False),
+    ("CLEAN_NUMBERS", {"Mode": 1}, False),
+    ("CLEAN_TEXT", {"Mode": 0}, False),
+    ("CLEAN_BOOLEAN", {"Mode": 0}, False),
+    ("CLEAN_COLORS", {"Mode": 0}, False),
+    ("CLEAN_DATA", {}, False),
+    ("CLEAN_FANOUT", {"Mode": 1, "Target": "Percentile:95"}, False),
+    ("WIRE_STATS", {}, False),
+    ("SYNC_PREVIEW", {}, False),
+    ("TRACE_UP", {}, False),
+    ("TRACE_BOTH", {"Target": "3"}, False),
+    ("FLATTEN", {"Target": "Both"}, True),
+    ("GRAFT", {"Target": "Inputs"}, True),
+    ("SIMPLIFY", {"Target": "Both"}, True),
+    ("REVERSE", {"Target": "Outputs"}, True),
+    ("REMOVE_TREE", {"Target": "Both"}, True),
+    ("DISCONNECT_INPUTS", {}, True),
+    ("DISCONNECT_OUTPUTS", {}, True),
+    ("DISCONNECT_ALL", {}, True),
+    # A toolbar macro run as one script (the Action input overrides the name)
+    ("BATCH", {"Action": "ALL_HIDDEN\nSEL_DEFAULT\nFLATTEN Target=Inputs\nAUTO_LENGTH"}, True),
+]
+
+
+def document_shape(document):
+    """Number of top-level objects, params and wires in a document"""
+    params = 0
+    wires = 0
+    for obj in document.Objects:
+        for param in mock._params_of(obj):
+            params += 1
+            wires += len(param.Sources)
+    return {"objects": len(document.Objects), "params": params, "wires": wires}
+
+
+def run_action(document, action, inputs, profile=False, cold=False, slice_ms=None):
+    """Run one component solve; returns (seconds, outputs, document stats)"""
+    if cold:
+        # Closing the document drops its warm engine
+        mock.close(document)
+    canvas = mock.activate(document)
+    document.reset_stats()
+    init_globals = {"Action": action, "Mode": None, "Target": None, "Length": None}
+    init_globals.update(inputs)
+    if profile:
+        init_globals["Profile"] = True
+    if slice_ms:
+        init_globals["Slice"] = slice_ms
+
+    start = time.perf_counter()
+    result = runpy.run_path(SCRIPT, init_globals=init_globals, run_name="__main__")
+    seconds = time.perf_counter() - start
+
+    # Drain a sliced apply the way Rhino's Idle event would, timing each slice
+    slices = []
+    while mock.RhinoApp.Idle.handlers:
+        slice_start = time.perf_counter()
+        mock.RhinoApp.Idle.fire(None)
+        slices.append(time.perf_counter() - slice_start)
+
+    stats = dict(document.stats)
+    stats["refreshes"] = canvas.refreshes
+    if slice_ms:
+        stats["idle_slices"] = len(slices)
+        stats["max_slice_seconds"] = max(slices) if slices else 0.0
+    return seconds, result, stats
+
+
+def benchmark(sizes, actions, repeat, seed, profile=False, cold=False, slice_ms=None):
+    """Yield one result record per (size, action)"""
+    numpy_available = _numpy_available()
+    for size in sizes:
+        start = time.perf_counter()
+        shared = mock.generate_document(size, seed=seed)
+        generate_seconds = time.perf_counter() - start
+        shape = document_shape(shared)
+
+        for action, inputs, mutates in actions:
+            timings = []
+            for _ in range(repeat):
+                document = mock.generate_document(size, seed=seed) if mutates else shared
+                seconds, result, stats = run_action(document, action, inputs, profile, cold, slice_ms)
+                timings.append(seconds)
+                if document is not shared:
+                    mock.close(document)
+
+            record = {
+                "size": size,
+                "action": action,
+                "seed": seed,
+                "repeat": repeat,
+                "median": statistics.median(timings),
+                "min": min(timings),
+                "max": max(timings),
+                "count": result.get("Count"),
+                "info": result.get("Info"),
+                "numpy": numpy_available,
+                "python": sys.version.split()[0],
+                "generate_seconds": generate_seconds,
+            }
+            record.update(shape)
+            record.update(stats)
+            if result.get("Metrics"):
+                metrics = json.loads(result["Metrics"])
+                record["phases"] = metrics["phases"]
+                record["counters"] = metrics["counters"]
+            yield record
+        
+        mock.close(shared)
+
+
+def compare(records, baseline_path, tolerance):
+    """Regressions against a previous JSON-lines run: (action, size, old, new)"""
+    baseline = {}
+    with open(baseline_path) as handle:
+        for line in handle:
+            if line.strip():
+                old = json.loads(line)
+                baseline[(old["size"], old["action"])] = old
+    regressions = []
+    for record in records:
+        old = baseline.get((record["size"], record["action"]))
+        if old and record["min"] > old["min"] * tolerance:
+            regressions.append((record["action"], record["size"], old["min"], record["min"]))
+    return regressions
+
+
+def _numpy_available():
+    try:
+        import numpy  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark WireHopper actions on synthetic documents")
+    parser.add_argument("--sizes", default="1000,10000",
+                        help="comma-separated component counts (default: 1000,10000)")
+    parser.add_argument("--actions", default="",
+                        help="comma-separated action names (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per action (default: 3)")
+    parser.add_argument("--seed", type=int, default=0, help="document generator seed")
+    parser.add_argument("--out", default="", help="write JSON lines here instead of stdout")
+    parser.add_argument("--compare", default="", help="previous JSON-lines run to check against")
+    parser.add_argument("--cold", action="store_true",
+                        help="drop the warm engine before every run instead of reusing it")
+    parser.add_argument("--slice", type=float, default=None, metavar="MS",
+                        help="run with the Slice input set and record the Idle slices after each solve")
+    parser.add_argument("--profile", action="store_true",
+                        help="run with the Profile input set and record phase timings of the last run")
+    parser.add_argument("--tolerance", type=float, default=1.25,
+                        help="allowed slowdown factor of min time vs. --compare (default: 1.25)")
+    args = parser.parse_args(argv)
+
+    mock.install()
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    wanted = {name.strip().upper() for name in args.actions.split(",") if name.strip()}
+    actions = [entry for entry in ACTIONS if not wanted or entry[0] in wanted]
+    unknown = wanted - {entry[0] for entry in ACTIONS}
+    if unknown:
+        parser.error("unknown actions: " + ", ".join(sorted(unknown)))
+
+    output = open(args.out, "w") if args.out else sys.stdout
+    records = []
+    try:
+        for record in benchmark(sizes, actions, max(1, args.repeat), args.seed, args.profile, args.cold,
+                                    args.slice):
+            records.append(record)
+            output.write(json.dumps(record, sort_keys=True) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    if args.compare:
+        regressions = compare(records, args.compare, args.tolerance)
+        for action, size, old, new in regressions:
+            sys.stderr.write("REGRESSION %s @ %d: %.4fs -> %.4fs\n" % (action, size, old, new))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+"""
+WireHopper - Equivalence harness
+Randomized property check of the optimized engine against the reference loops.
+
+Every trial draws a document shape (size, floating params, fan-in and fan-out,
+wire density, long wires, selection, hidden wires) from a seeded generator and
+builds two identical copies with WireHopper_Mock.generate_document(). Each
+action runs through WireHopper_Reference.WireHopperReference on one copy and
+WireHopper_Python.WireHopperPython on the other; the harness then asserts that
+both copies end with the same WireDisplay, DataMapping, Simplify, Reverse and
+wiring on every param, and that both calls returned the same count.
+
+Each action runs twice on the same pair, the second time through the now warm
+engine, with NumPy and on the pure-Python path; both runs are checked. Each
+trial then also plays a random sequence of actions through the warm engine,
+comparing after every step, so stale index or length caches are caught too.
+A last check per trial starts a sliced apply, cancels it after one Idle slice
+and asserts that the document is back as it was and that UNDO_WIRES and
+REDO_WIRES then find nothing of the cancelled apply to replay.
+
+One JSON line is written per (size, action) with the median seconds of the
+first and the repeated call on each side and their ratios: speedup_cold
+(first calls, the engine building its index and caches) and speedup (repeated
+calls, the engine warm as it is between component solves). The mock has no
+.NET interop cost, so every attribute read and write is far cheaper than in
+Rhino, where the engine's fewer writes and refreshes are what pay off. The
+ratios track regressions between runs of this harness; they are not a
+prediction of the speedup inside Rhino. The exit code is 1 if any trial
+differs.
+
+Usage:
+    python WireHopper_Equivalence.py                          # 50, 500 and 2000 components
+    python WireHopper_Equivalence.py --sizes 100,5000 --trials 5
+    python WireHopper_Equivalence.py --seed 7 --steps 12 --out equivalence.jsonl
+"""
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+
+import WireHopper_Mock as mock
+
+mock.install()
+
+import WireHopper_Python as engine_module  # noqa: E402
+import WireHopper_Reference as reference_module  # noqa: E402
+
+NUMPY = engine_module.np
+
+# (action, method, arguments); clean_by_length takes its threshold per trial
+ACTIONS = [
+    ("ALL_DEFAULT", "set_all_wires", (2,)),
+    ("ALL_FAINT", "set_all_wires", (1,)),
+    ("ALL_HIDDEN", "set_all_wires", (0,)),
+    ("SEL_DEFAULT", "set_selected_wires", (2,)),
+    ("SEL_HIDDEN", "set_selected_wires", (0,)),
+    ("CLEAN_LENGTH", "clean_by_length", None),
+    ("AUTO_LENGTH", "set_by_relative_length", ()),
+    ("CLEAN_GEOMETRY", "clean_by_param_type", ("Geometry", 0)),
+    ("CLEAN_NUMBERS", "clean_by_param_type", ("Numbers", 1)),
+    ("CLEAN_TEXT", "clean_by_param_type", ("Text", 0)),
+    ("CLEAN_BOOLEAN", "clean_by_param_type", ("Boolean", 0)),
+    ("CLEAN_COLORS", "clean_by_param_type", ("Colors", 1)),
+    ("CLEAN_NUMBERS_INPUTS", "clean_by_param_type", ("Numbers", 0, True, False)),
+    ("CLEAN_GEOMETRY_OUTPUTS", "clean_by_param_type", ("Geometry", 1, False, True)),
+    ("CLEAN_DATA", "clean_by_data_size", ()),
+    ("SYNC_PREVIEW", "sync_with_preview", ()),
+    ("FLATTEN", "apply_tree_function", ("Flatten", "Inputs")),
+    ("GRAFT", "apply_tree_function", ("Graft", "Outputs")),
+    ("SIMPLIFY", "apply_tree_function", ("Simplify", "Both")),
+    ("REVERSE", "apply_tree_function", ("Reverse", "Both")),
+    ("REMOVE_TREE", "apply_tree_function", ("RemoveAll", "Both")),
+    ("DISCONNECT_INPUTS", "disconnect_selected", ("Inputs",)),
+    ("DISCONNECT_OUTPUTS", "disconnect_selected", ("Outputs",)),
+    ("DISCONNECT_ALL", "disconnect_selected", ("All",)),
+]
+
+CLEAN_LENGTHS = (250.0, 700.0, 1500.0, 5000.0)
+
+# Actions the sliced-cancel check starts; each one writes most of the wires
+SLICED_ACTIONS = ("ALL_FAINT", "ALL_HIDDEN", "CLEAN_LENGTH Mode=0 Length=700")
+
+
+class Mismatch(Exception):
+    """A trial where the engine and the reference disagree"""
+
+
+def random_shape(rng, size):
+    """Document generator arguments for one trial"""
+    return {
+        "components": max(1, int(size * rng.uniform(0.8, 1.2))),
+        "floating_ratio": rng.uniform(0.0, 0.5),
+        "max_inputs": rng.randint(1, 6),
+        "max_outputs": rng.randint(1, 4),
+        "wire_density": rng.uniform(0.2, 1.0),
+        "long_wire_ratio": rng.uniform(0.0, 0.3),
+        "selected_ratio": rng.choice((0.0, 0.05, 0.3, 1.0)),
+        "hidden_ratio": rng.uniform(0.0, 0.6),
+    }
+
+
+def arguments(args, rng):
+    """Concrete arguments of an action; CLEAN_LENGTH draws its threshold"""
+    return (rng.choice(CLEAN_LENGTHS), rng.randint(0, 2)) if args is None else args
+
+
+def document_state(document):
+    """Display, tree flags and sources of every param, in document order"""
+    state = []
+    for obj in document.Objects:
+        for param in mock._params_of(obj):
+            state.append((
+                str(param.InstanceGuid),
+                str(param.WireDisplay),
+                str(getattr(param, "DataMapping", None)),
+                param.Simplify,
+                param.Reverse,
+                tuple(str(source.InstanceGuid) for source in param.Sources),
+            ))
+    return state
+
+
+def check(label, reference_count, engine_count, reference_doc, engine_doc):
+    """Raise Mismatch naming the first difference between the two documents"""
+    if reference_count != engine_count:
+        raise Mismatch("%s: count %r (reference) != %r (engine)" % (label, reference_count, engine_count))
+    reference_state = document_state(reference_doc)
+    engine_state = document_state(engine_doc)
+    if len(reference_state) != len(engine_state):
+        raise Mismatch("%s: %d params (reference) != %d (engine)"
+                       % (label, len(reference_state), len(engine_state)))
+    for expected, actual in zip(reference_state, engine_state):
+        if expected != actual:
+            raise Mismatch("%s: param %s\n  reference %r\n  engine    %r"
+                           % (label, expected[0], expected[1:], actual[1:]))
+
+
+def run_single(shape, seed, method, args, use_numpy):
+    """
+    One action, run twice, on a fresh pair of documents.
+    
+    Returns the seconds of the first and the repeated reference call, then
+    of the first engine call (from a new engine) and the repeated one (on
+    the same, now warm, engine).
+    """
+    engine_module.np = NUMPY if use_numpy else None
+    reference_doc = mock.generate_document(seed=seed, **shape)
+    engine_doc = mock.generate_document(seed=seed, **shape)
+    reference = reference_module.WireHopperReference(reference_doc)
+    seconds = []
+    try:
+        for run in ("first", "repeat"):
+            mock.activate(reference_doc)
+            start = time.perf_counter()
+            reference_count = getattr(reference, method)(*args)
+            seconds.append(time.perf_counter() - start)
+
+            mock.activate(engine_doc)
+            hopper = engine_module.warm_engine(engine_doc)
+            start = time.perf_counter()
+            engine_count = getattr(hopper, method)(*args)
+            seconds.append(time.perf_counter() - start)
+            check("%s%r (%s call)" % (method, args, run), reference_count, engine_count, reference_doc,
+                  engine_doc)
+    finally:
+        engine_module.np = NUMPY
+        engine_module.drop_engine(engine_doc)
+        mock.close(reference_doc)
+        mock.close(engine_doc)
+    return seconds
+
+
+def run_sequence(shape, seed, rng, steps):
+    """A random run of actions through the warm engine, checked after every step"""
+    reference_doc = mock.generate_document(seed=seed, **shape)
+    engine_doc = mock.generate_document(seed=seed, **shape)
+    reference = reference_module.WireHopperReference(reference_doc)
+    history = []
+    try:
+        for _ in range(steps):
+            name, method, args = rng.choice(ACTIONS)
+            args = arguments(args, rng)
+            history.append(name)
+            mock.activate(reference_doc)
+            reference_count = getattr(reference, method)(*args)
+            mock.activate(engine_doc)
+            engine_count = getattr(engine_module.warm_engine(engine_doc), method)(*args)
+            check("warm " + " > ".join(history), reference_count, engine_count, reference_doc, engine_doc)
+    finally:
+        engine_module.drop_engine(engine_doc)
+        mock.close(reference_doc)
+        mock.close(engine_doc)
+
+
+def run_sliced_cancel(shape, seed, rng):
+    """Start a sliced apply, cancel it and check that undo and redo find nothing of it"""
+    engine_doc = mock.generate_document(seed=seed, **shape)
+    action = rng.choice(SLICED_ACTIONS)
+    try:
+        mock.activate(engine_doc)
+        before = document_state(engine_doc)
+        hopper = engine_module.warm_engine(engine_doc)
+        hopper.slice_budget = 1e-9      # one clock check per slice
+        engine_module.run_script(hopper, engine_module.parse_script(action))
+        mock.RhinoApp.Idle.fire(None)
+        if hopper.sliced is None:
+            return      # the apply finished within two slices, nothing to cancel
+        engine_module.run_script(hopper.begin(), engine_module.parse_script("APPLY_CANCEL"))
+        if document_state(engine_doc) != before:
+            raise Mismatch("%s cancelled: the document differs from before the apply" % action)
+        if engine_module.undo_journal(engine_doc).undo:
+            raise Mismatch("%s cancelled: the undo journal still holds the apply" % action)
+        for name in ("UNDO_WIRES", "REDO_WIRES"):
+            count, _ = engine_module.run_script(hopper.begin(), engine_module.parse_script(name))
+            if count or document_state(engine_doc) != before:
+                raise Mismatch("%s cancelled: %s restored %d params" % (action, name, count))
+    finally:
+        engine_module.drop_engine(engine_doc)
+        mock.close(engine_doc)
+
+
+def equivalence(sizes, actions, trials, seed, steps):
+    """Yield one record per (size, action); failures are collected in each record"""
+    rng = random.Random(seed)
+    paths = (True, False) if NUMPY is not None else (False,)
+    for size in sizes:
+        shapes = [(random_shape(rng, size), rng.randrange(1 << 30)) for _ in range(trials)]
+        for name, method, args in actions:
+            timings = ([], [], [], [])
+            failures = []
+            for shape, trial_seed in shapes:
+                trial_args = arguments(args, rng)
+                for use_numpy in paths:
+                    try:
+                        seconds = run_single(shape, trial_seed, method, trial_args, use_numpy)
+                    except Mismatch as error:
+                        failures.append({"seed": trial_seed, "shape": shape, "numpy": use_numpy,
+                                         "error": str(error)})
+                        continue
+                    if use_numpy == paths[0]:
+                        for timing, value in zip(timings, seconds):
+                            timing.append(value)
+
+            record = {
+                "size": size,
+                "action": name,
+                "trials": trials,
+                "numpy": NUMPY is not None,
+                "failures": failures,
+                "python": sys.version.split()[0],
+            }
+            if timings[0]:
+                reference, cold, reference_repeat, warm = (statistics.median(timing) for timing in timings)
+                record.update(reference=reference, reference_repeat=reference_repeat,
+                              engine_cold=cold, engine_warm=warm,
+                              speedup_cold=reference / cold if cold else None,
+                              speedup=reference_repeat / warm if warm else None)
+            yield record
+
+        if steps:
+            failures = []
+            for shape, trial_seed in shapes:
+                try:
+                    run_sequence(shape, trial_seed, rng, steps)
+                except Mismatch as error:
+                    failures.append({"seed": trial_seed, "shape": shape, "error": str(error)})
+            yield {"size": size, "action": "WARM_SEQUENCE", "trials": trials, "steps": steps,
+                   "numpy": NUMPY is not None, "failures": failures, "python": sys.version.split()[0]}
+
+        failures = []
+        for shape, trial_seed in shapes:
+            try:
+                run_sliced_cancel(shape, trial_seed, rng)
+            except Mismatch as error:
+                failures.append({"seed": trial_seed, "shape": shape, "error": str(error)})
+        yield {"size": size, "action": "SLICED_CANCEL", "trials": trials, "numpy": NUMPY is not None,
+               "failures": failures, "python": sys.version.split()[0]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check WireHopper actions against the reference implementation")
+    parser.add_argument("--sizes", default="50,500,2000",
+                        help="comma-separated component counts (default: 50,500,2000)")
+    parser.add_argument("--actions", default="",
+                        help="comma-separated action names (default: all)")
+    parser.add_argument("--trials", type=int, default=3, help="random documents per size (default: 3)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for shapes, thresholds and sequences")
+    parser.add_argument("--steps", type=int, default=8,
+                        help="actions per warm-engine sequence; 0 skips sequences (default: 8)")
+    parser.add_argument("--out", default="", help="write JSON lines here instead of stdout")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    wanted = {name.strip().upper() for name in args.actions.split(",") if name.strip()}
+    actions = [entry for entry in ACTIONS if not wanted or entry[0] in wanted]
+    unknown = wanted - {entry[0] for entry in ACTIONS}
+    if unknown:
+        parser.error("unknown actions: " + ", ".join(sorted(unknown)))
+
+    output = open(args.out, "w") if args.out else sys.stdout
+    failed = 0
+    try:
+        for record in equivalence(sizes, actions, max(1, args.trials), args.seed, max(0, args.steps)):
+            for failure in record["failures"]:
+                path = {True: ", numpy", False: ", pure"}.get(failure.get("numpy"), "")
+                sys.stderr.write("MISMATCH %s @ %d (seed %d%s): %s\n"
+                                 % (record["action"], record["size"], failure["seed"], path, failure["error"]))
+            failed += len(record["failures"])
+            output.write(json.dumps(record, sort_keys=True) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
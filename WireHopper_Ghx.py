@@ -0,0 +1,567 @@
+"""
+WireHopper - Offline .ghx cleaner
+Applies WireHopper cleanup rules to archived definitions without Rhino.
+
+Each .ghx file is read twice as a stream, so memory stays bounded by the
+param/wire graph rather than the XML tree:
+
+1. An incremental parse (iterparse, one Object chunk at a time) rebuilds the
+   params, their sources, bounds and preview state as a headless document
+   (WireHopper_Mock), and the rules run on it through the same engine the
+   GHPython component uses.
+2. A SAX pass copies the file to its destination, rewriting the WireDisplay
+   item of every param whose display changed.
+
+Only wire display is touched; data, tree flags and layout are copied as they
+are. Binary .gh files are not supported (save them as .ghx first).
+
+Usage:
+    python WireHopper_Ghx.py archive/ --rules "AUTO_LENGTH; SYNC_PREVIEW"
+    python WireHopper_Ghx.py a.ghx b.ghx --rules "CLEAN_LENGTH Length=1500 Mode=0" --out cleaned/
+    python WireHopper_Ghx.py archive/ --rules "CLEAN_TEXT Mode=0" --dry-run --jobs 8
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import xml.etree.ElementTree as ElementTree
+import xml.sax
+from xml.sax.saxutils import XMLGenerator
+
+import WireHopper_Mock as mock
+
+# Rules that need solution data cannot run on a stored file
+OFFLINE_RULES = ("CLEAN_LENGTH", "AUTO_LENGTH", "SYNC_PREVIEW")
+
+WIRE_DISPLAY_ITEM = "WireDisplay"
+
+# Stored names of built-in floating params. Component params are stored under
+# their role ("Radius", "Motion") with no type, so they are never looked up here.
+# Sliders, panels, toggles, buttons and swatches are not Param_* subclasses in
+# Grasshopper, so no type rule reaches them there; they stay unclassified here.
+PARAM_NAMES = {
+    "Geometry": mock.Param_Geometry, "Brep": mock.Param_Brep, "Surface": mock.Param_Surface,
+    "Mesh": mock.Param_Mesh, "Curve": mock.Param_Curve, "Point": mock.Param_Point,
+    "Vector": mock.Param_Vector, "Line": mock.Param_Line, "Arc": mock.Param_Arc,
+    "Circle": mock.Param_Circle, "Plane": mock.Param_Plane, "Box": mock.Param_Box,
+    "Number": mock.Param_Number, "Integer": mock.Param_Integer, "Complex": mock.Param_Complex,
+    "Domain": mock.Param_Interval, "Interval": mock.Param_Interval,
+    "Text": mock.Param_String, "Boolean": mock.Param_Boolean, "Colour": mock.Param_Colour,
+    "Data": mock.Param_GenericObject, "Guid": mock.Param_Guid, "File Path": mock.Param_FilePath,
+}
+
+# Why each kind of offline rule leaves params alone, for the report
+SKIP_REASONS = {
+    "type": "their type is not stored in the archive",
+    "preview": "their component's preview capability is not stored in the archive",
+}
+
+_engine = None
+
+
+def engine():
+    """WireHopper_Python, imported once per process on top of the mock"""
+    global _engine
+    if _engine is None:
+        mock.install()
+        import WireHopper_Python
+        _engine = WireHopper_Python
+    return _engine
+
+
+def normalize_guid(text):
+    return (text or "").strip().strip("{}").lower()
+
+
+# ==================== READING ====================
+
+class ParamRecord:
+    """A param as stored in the archive"""
+
+    def __init__(self, guid, name, sources, wire_display, bounds):
+        self.guid = guid
+        self.name = name
+        self.sources = sources
+        self.wire_display = wire_display
+        self.bounds = bounds
+
+
+class ObjectRecord:
+    """A top-level object: a floating param, or a component with its params"""
+
+    def __init__(self, guid, name, hidden, bounds, param=None, inputs=None, outputs=None):
+        self.guid = guid
+        self.name = name
+        self.hidden = hidden
+        self.bounds = bounds
+        self.param = param
+        self.inputs = inputs or []
+        self.outputs = outputs or []
+
+
+def _items(chunk):
+    """{name: element} of a chunk's items; repeated names (Source) become lists"""
+    items = {}
+    element = chunk.find("items")
+    if element is None:
+        return items
+    for item in element.findall("item"):
+        name = item.get("name")
+        if name in items:
+            if not isinstance(items[name], list):
+                items[name] = [items[name]]
+            items[name].append(item)
+        else:
+            items[name] = item
+    return items
+
+
+def _text(items, name, default=None):
+    item = items.get(name)
+    return item.text if item is not None and not isinstance(item, list) else default
+
+
+def _bounds(chunk):
+    """(x, y, width, height) from a chunk's Attributes, or None"""
+    for child in chunk.findall("chunks/chunk"):
+        if child.get("name") == "Attributes":
+            item = _items(child).get("Bounds")
+            if item is not None:
+                return tuple(float(item.findtext(axis, "0")) for axis in ("X", "Y", "W", "H"))
+    return None
+
+
+def _param(chunk, items=None):
+    items = _items(chunk) if items is None else items
+    sources = items.get("Source", [])
+    if not isinstance(sources, list):
+        sources = [sources]
+    display = _text(items, WIRE_DISPLAY_ITEM)
+    return ParamRecord(
+        normalize_guid(_text(items, "InstanceGuid")),
+        _text(items, "Name", ""),
+        [normalize_guid(source.text) for source in sources],
+        int(display) if display else 0,
+        _bounds(chunk))
+
+
+def _object(chunk):
+    """ObjectRecord for an Object chunk, or None for objects without params"""
+    name = _text(_items(chunk), "Name", "")
+    container = None
+    for child in chunk.findall("chunks/chunk"):
+        if child.get("name") == "Container":
+            container = child
+    if container is None:
+        return None
+
+    items = _items(container)
+    hidden = (_text(items, "Hidden", "false") or "").strip().lower() == "true"
+    inputs, outputs = [], []
+    for child in container.findall("chunks/chunk"):
+        if child.get("name") == "param_input":
+            inputs.append(_param(child))
+        elif child.get("name") == "param_output":
+            outputs.append(_param(child))
+
+    guid = normalize_guid(_text(items, "InstanceGuid"))
+    if inputs or outputs:
+        return ObjectRecord(guid, name, hidden, _bounds(container), inputs=inputs, outputs=outputs)
+    if "SourceCount" in items:
+        return ObjectRecord(guid, name, hidden, _bounds(container), param=_param(container, items))
+    return None
+
+
+def read_objects(path):
+    """Yield an ObjectRecord per param-carrying object, parsing incrementally"""
+    depth = 0
+    for event, element in ElementTree.iterparse(path, events=("start", "end")):
+        if element.tag != "chunk" or element.get("name") != "Object":
+            continue
+        if event == "start":
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 0:
+            record = _object(element)
+            # Drop the parsed subtree so memory does not grow with the file
+            element.clear()
+            if record is not None:
+                yield record
+
+
+# ==================== DOCUMENT ====================
+
+class UnclassifiedParam(mock.GH_Param):
+    """
+    A param whose type the archive does not record: every component param,
+    and floating params of plugin types. No param group claims it and its
+    preview capability is unknown.
+    """
+
+    preview_capable = None
+
+
+def _param_class(name):
+    return PARAM_NAMES.get(name, UnclassifiedParam)
+
+
+def _preview_capable(param_classes):
+    """True if any output previews, None if an output's type is unknown, else False"""
+    capable = [cls.preview_capable for cls in param_classes]
+    if any(capable):
+        return True
+    if None in capable:
+        return None
+    return False
+
+
+def _place(param, bounds):
+    if bounds is not None:
+        x, y, width, height = bounds
+        param.Attributes = mock.GH_Attributes(param, x, y, width, height)
+        param.Attributes.GetTopLevel = param.Attributes
+
+
+def build_document(records):
+    """Headless GH_Document from object records; returns (document, params by guid)"""
+    document = mock.GH_Document()
+    params = {}
+    stored = {}
+    for record in records:
+        if record.param is not None:
+            param = _param_class(record.name)()
+            _place(param, record.bounds)
+            param.InstanceGuid = record.param.guid
+            param.Hidden = record.hidden
+            obj = param
+            entries = [(param, record.param)]
+        else:
+            obj = mock.GH_Component(record.name)
+            if record.bounds is not None:
+                x, y, width, height = record.bounds
+                obj.Attributes = mock.GH_Attributes(obj, x, y, width, height)
+                obj.Attributes.GetTopLevel = obj.Attributes
+            obj.InstanceGuid = record.guid
+            obj.Hidden = record.hidden
+            entries = []
+            for kind, entries_of_kind, server in ((mock.GH_ParamKind.input, record.inputs, obj.Params.Input),
+                                                  (mock.GH_ParamKind.output, record.outputs, obj.Params.Output)):
+                for entry in entries_of_kind:
+                    param = UnclassifiedParam(entry.name)
+                    param.InstanceGuid = entry.guid
+                    _place(param, entry.bounds or record.bounds)
+                    server.append(param)
+                    obj._register(param, kind)
+                    entries.append((param, entry))
+            obj.IsPreviewCapable = _preview_capable([type(param) for param in obj.Params.Output])
+        for param, entry in entries:
+            param._wire_display = mock.GH_ParamWireDisplay(entry.wire_display)
+            params[entry.guid] = param
+            stored[entry.guid] = entry
+        document.AddObject(obj)
+
+    for guid, entry in stored.items():
+        target = params[guid]
+        for source in entry.sources:
+            if source in params:
+                target.AddSource(params[source])
+    document.reset_stats()
+    return document, params
+
+
+class OfflineRule:
+    """
+    A rule limited to what the archive records.
+
+    Type rules leave unclassified params alone, and SYNC_PREVIEW leaves alone
+    the params of objects whose preview capability is unknown, rather than
+    guessing and writing a display Rhino would not. skipped counts those
+    params, so the report can say how much of the rule did not apply.
+    """
+
+    def __init__(self, rule, skip, reason):
+        self.rule = rule
+        self.name = rule.name
+        self.uses_data = rule.uses_data
+        self.skip = skip
+        self.reason = reason
+        self.skipped = 0
+
+    def prepare(self, hopper, index, slots=None):
+        self.params = index.params
+        self.owners = index.owners
+        self.skipped = 0
+        return self.rule.prepare(hopper, index, slots)
+
+    def decide(self, slot):
+        if self.skip(self.params[slot], self.owners[slot]):
+            self.skipped += 1
+            return None
+        return self.rule.decide(slot)
+
+    def warning(self, params):
+        """Report line when the rule left params alone, else None"""
+        if not self.skipped:
+            return None
+        return f"{self.name} left {self.skipped} of {params} params alone: {SKIP_REASONS[self.reason]}"
+
+
+def _unclassified(param, owner):
+    return isinstance(param, UnclassifiedParam)
+
+
+def _preview_unknown(param, owner):
+    return getattr(owner, "IsPreviewCapable", False) is None
+
+
+def parse_offline_rules(text):
+    """WireRules for the offline pipeline; rejects rules that need solution data"""
+    wh = engine()
+    rules = wh.parse_rules(text, 2, "All", 1000.0, wh.shared_classifier())
+    for position, rule in enumerate(rules):
+        if rule.uses_data:
+            raise ValueError(f"{rule.name} needs solution data and cannot run on a stored file")
+        if isinstance(rule, wh.TypeRule):
+            rules[position] = OfflineRule(rule, _unclassified, "type")
+        elif isinstance(rule, wh.PreviewRule):
+            rules[position] = OfflineRule(rule, _preview_unknown, "preview")
+    if not rules:
+        raise ValueError("No rules given, e.g. --rules 'AUTO_LENGTH; SYNC_PREVIEW'")
+    return rules
+
+
+def plan_changes(path, rules_text):
+    """Run the rules on a file; returns ({param guid: new display value}, stats)"""
+    wh = engine()
+    records = list(read_objects(path))
+    document, params = build_document(records)
+    before = {guid: param.WireDisplay for guid, param in params.items()}
+
+    rules = parse_offline_rules(rules_text)
+    hopper = wh.WireHopperPython(document)
+    try:
+        decided = hopper.run_pipeline(rules)
+    finally:
+        hopper.close()
+
+    changes = {guid: param.WireDisplay.value for guid, param in params.items()
+               if param.WireDisplay != before[guid]}
+    stats = {
+        "objects": len(records),
+        "params": len(params),
+        "wires": sum(len(param.Sources) for param in params.values()),
+        "unclassified": sum(isinstance(param, UnclassifiedParam) for param in params.values()),
+        "decided": decided,
+        "changed": len(changes),
+    }
+    warnings = [rule.warning(len(params)) for rule in rules if isinstance(rule, OfflineRule)]
+    warnings = [warning for warning in warnings if warning]
+    if warnings:
+        stats["warnings"] = warnings
+    return changes, stats
+
+
+# ==================== WRITING ====================
+
+class WireDisplayRewriter(xml.sax.handler.ContentHandler):
+    """
+    SAX pass that copies an archive, setting WireDisplay on changed params.
+
+    Events inside each <items> element are held back until it closes, because
+    the InstanceGuid that says which param it belongs to comes after the count
+    attribute that may need updating. Everything else streams straight out.
+    """
+
+    def __init__(self, out, changes):
+        xml.sax.handler.ContentHandler.__init__(self)
+        self.writer = XMLGenerator(out, "utf-8", short_empty_elements=True)
+        self.out = out
+        self.changes = changes
+        self.buffer = None      # events of the open <items>, or None
+        self.depth = 0
+        self.rewritten = 0
+
+    def startDocument(self):
+        self.out.write('<?xml version="1.0" encoding="utf-8" standalone="yes"?>\n')
+
+    def startElement(self, name, attrs):
+        if name == "items" and self.buffer is None:
+            self.buffer = [("start", name, dict(attrs.items()))]
+            self.depth = 1
+        elif self.buffer is not None:
+            self.buffer.append(("start", name, dict(attrs.items())))
+            self.depth += 1
+        else:
+            self.writer.startElement(name, attrs)
+
+    def endElement(self, name):
+        if self.buffer is None:
+            self.writer.endElement(name)
+            return
+        self.buffer.append(("end", name, None))
+        self.depth -= 1
+        if self.depth == 0:
+            events, self.buffer = self.buffer, None
+            self._flush(self._rewrite(events))
+
+    def characters(self, content):
+        if self.buffer is not None:
+            # The parser may split text across calls; keep one event per run
+            if self.buffer[-1][0] == "text":
+                self.buffer[-1] = ("text", self.buffer[-1][1] + content, None)
+            else:
+                self.buffer.append(("text", content, None))
+        else:
+            self.writer.characters(content)
+
+    def ignorableWhitespace(self, content):
+        self.characters(content)
+
+    def _rewrite(self, events):
+        """Set, add or remove the WireDisplay item if this items list is a changed param"""
+        item_starts = [i for i, event in enumerate(events)
+                       if event[0] == "start" and event[1] == "item"]
+        guid = None
+        display_at = None
+        for i in item_starts:
+            name = events[i][2].get("name")
+            if name == "InstanceGuid" and events[i + 1][0] == "text":
+                guid = normalize_guid(events[i + 1][1])
+            elif name == WIRE_DISPLAY_ITEM:
+                display_at = i
+        if guid is None or guid not in self.changes:
+            return events
+
+        value = self.changes[guid]
+        self.rewritten += 1
+        count = int(events[0][2].get("count", len(item_starts)))
+        if display_at is not None:
+            end = display_at + 1
+            while events[end][0] != "end":
+                end += 1
+            if value == 0:
+                # Default is not stored; drop the item and the whitespace before it
+                start = display_at - 1 if events[display_at - 1][0] == "text" else display_at
+                events = events[:start] + events[end + 1:]
+                count -= 1
+            else:
+                events = events[:display_at + 1] + [("text", str(value), None)] + events[end:]
+        elif value != 0:
+            indent = events[item_starts[-1] - 1][1] if item_starts and events[item_starts[-1] - 1][0] == "text" else ""
+            item = [("text", indent, None),
+                    ("start", "item", {"name": WIRE_DISPLAY_ITEM, "type_name": "gh_int32", "type_code": "3"}),
+                    ("text", str(value), None),
+                    ("end", "item", None)]
+            close = len(events) - 1
+            if item_starts:
+                # Insert after the last item, keeping the closing whitespace
+                close = item_starts[-1]
+                while not (events[close][0] == "end" and events[close][1] == "item"):
+                    close += 1
+                close += 1
+            events = events[:close] + item + events[close:]
+            count += 1
+        events[0] = ("start", "items", dict(events[0][2], count=str(count)))
+        return events
+
+    def _flush(self, events):
+        for kind, value, attrs in events:
+            if kind == "start":
+                self.writer.startElement(value, attrs)
+            elif kind == "end":
+                self.writer.endElement(value)
+            else:
+                self.writer.characters(value)
+
+
+def rewrite(path, destination, changes):
+    """Stream path to destination with the changed wire displays; returns params rewritten"""
+    temporary = destination + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as out:
+        handler = WireDisplayRewriter(out, changes)
+        xml.sax.parse(path, handler)
+    os.replace(temporary, destination)
+    return handler.rewritten
+
+
+# ==================== BATCH ====================
+
+def process(job):
+    """Clean one file; returns a JSON-ready report"""
+    path, destination, rules_text, dry_run = job
+    start = time.perf_counter()
+    report = {"file": path}
+    try:
+        changes, stats = plan_changes(path, rules_text)
+        report.update(stats)
+        if not dry_run and (changes or destination != path):
+            if os.path.dirname(destination):
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+            report["rewritten"] = rewrite(path, destination, changes)
+            report["output"] = destination
+    except Exception as e:
+        report["error"] = f"{type(e).__name__}: {e}"
+    report["seconds"] = round(time.perf_counter() - start, 4)
+    return report
+
+
+def find_files(paths):
+    """(.ghx file, path relative to its root) for files and directories given"""
+    for path in paths:
+        if os.path.isdir(path):
+            for folder, _, names in os.walk(path):
+                for name in sorted(names):
+                    if name.lower().endswith(".ghx"):
+                        full = os.path.join(folder, name)
+                        yield full, os.path.relpath(full, path)
+        else:
+            yield path, os.path.basename(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply WireHopper cleanup rules to .ghx files without Rhino")
+    parser.add_argument("paths", nargs="+", help=".ghx files or directories (searched recursively)")
+    parser.add_argument("--rules", required=True,
+                        help="rules as in PIPELINE, e.g. 'CLEAN_LENGTH Length=1500 Mode=0; SYNC_PREVIEW' "
+                             "(%s or CLEAN_<GROUP>)" % ", ".join(OFFLINE_RULES))
+    parser.add_argument("--out", default="", help="write cleaned copies under this directory (default: in place)")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    parser.add_argument("--jobs", type=int, default=0, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    try:
+        rules = parse_offline_rules(args.rules)
+    except ValueError as e:
+        parser.error(str(e))
+    for rule in rules:
+        if isinstance(rule, OfflineRule):
+            sys.stderr.write(f"warning: {rule.name} leaves params alone offline when {SKIP_REASONS[rule.reason]} "
+                             f"(component params in particular); each report counts them\n")
+
+    jobs = []
+    for path, relative in find_files(args.paths):
+        destination = os.path.join(args.out, relative) if args.out else path
+        jobs.append((path, destination, args.rules, args.dry_run))
+
+    workers = min(args.jobs or os.cpu_count() or 1, max(1, len(jobs)))
+    failures = 0
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            reports = pool.imap_unordered(process, jobs)
+            for report in reports:
+                failures += "error" in report
+                sys.stdout.write(json.dumps(report, sort_keys=True) + "\n")
+    else:
+        for job in jobs:
+            report = process(job)
+            failures += "error" in report
+            sys.stdout.write(json.dumps(report, sort_keys=True) + "\n")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1086 @@
+"""
+WireHopper - Headless Grasshopper stand-in
+Pure-Python mock of the Grasshopper/Rhino subset used by WireHopper_Python.py,
+so the engine can be run and timed on a plain Python install.
+
+Usage:
+    import WireHopper_Mock as mock
+    mock.install()                          # register fake Grasshopper/Rhino/System modules
+    doc = mock.generate_document(1000)      # synthetic definition with 1000 components
+    mock.activate(doc)                      # make it the active canvas document
+
+    import WireHopper_Python as wh
+    hopper = wh.WireHopperPython()
+
+Only the members WireHopper touches are modelled. Every call that would cost
+something in Rhino (layout expiry, solution expiry, canvas refresh) is counted
+on the document so benchmarks can report write churn as well as time.
+"""
+
+import enum
+import random
+import sys
+import types
+import uuid
+from xml.sax.saxutils import escape, quoteattr
+
+
+# ==================== SYSTEM ====================
+
+class Guid(object):
+    """Stand-in for System.Guid"""
+
+    __slots__ = ("_value",)
+
+    def __init__(self, value=None):
+        if isinstance(value, Guid):
+            value = value._value
+        elif isinstance(value, str):
+            value = uuid.UUID(value)
+        self._value = value if value is not None else uuid.UUID(int=0)
+
+    @staticmethod
+    def NewGuid():
+        return Guid(uuid.uuid4())
+
+    def ToString(self):
+        return str(self._value)
+
+    def __str__(self):
+        return str(self._value)
+
+    def __repr__(self):
+        return "Guid('%s')" % self._value
+
+    def __eq__(self, other):
+        return isinstance(other, Guid) and other._value == self._value
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self._value)
+
+
+Guid.Empty = Guid()
+
+
+class Enum(object):
+    """Stand-in for System.Enum"""
+
+    @staticmethod
+    def Parse(enum_type, name):
+        return enum_type[name]
+
+
+class _Property(object):
+    """Reflection handle returned by GetType().GetProperty()"""
+
+    def __init__(self, name, property_type):
+        self.Name = name
+        self.PropertyType = property_type
+
+    def GetValue(self, obj):
+        return getattr(obj, self.Name)
+
+    def SetValue(self, obj, value):
+        setattr(obj, self.Name, value)
+
+
+class _Type(object):
+    """Reflection handle returned by GetType()"""
+
+    def __init__(self, cls):
+        self.cls = cls
+        self.Name = cls.__name__
+        self.FullName = "Grasshopper.Kernel.Parameters." + cls.__name__
+
+    def GetProperty(self, name):
+        property_type = getattr(self.cls, "_property_types", {}).get(name)
+        if property_type is None:
+            return None
+        return _Property(name, property_type)
+
+
+class Event(object):
+    """Multicast .NET event; supports += / -= and is fired by the mock"""
+
+    def __init__(self):
+        self.handlers = []
+
+    def __iadd__(self, handler):
+        self.handlers.append(handler)
+        return self
+
+    def __isub__(self, handler):
+        if handler in self.handlers:
+            self.handlers.remove(handler)
+        return self
+
+    def __len__(self):
+        return len(self.handlers)
+
+    def fire(self, sender, args=None):
+        for handler in list(self.handlers):
+            handler(sender, args)
+
+
+class EventArgs(object):
+    """Generic event argument bag"""
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+# ==================== DRAWING ====================
+
+class PointF(object):
+    """Stand-in for System.Drawing.PointF"""
+
+    __slots__ = ("X", "Y")
+
+    def __init__(self, x=0.0, y=0.0):
+        self.X = float(x)
+        self.Y = float(y)
+
+    def __repr__(self):
+        return "PointF(%g, %g)" % (self.X, self.Y)
+
+
+class RectangleF(object):
+    """Stand-in for System.Drawing.RectangleF"""
+
+    __slots__ = ("X", "Y", "Width", "Height")
+
+    def __init__(self, x=0.0, y=0.0, width=0.0, height=0.0):
+        self.X = float(x)
+        self.Y = float(y)
+        self.Width = float(width)
+        self.Height = float(height)
+
+    @property
+    def Left(self):
+        return self.X
+
+    @property
+    def Top(self):
+        return self.Y
+
+    @property
+    def Right(self):
+        return self.X + self.Width
+
+    @property
+    def Bottom(self):
+        return self.Y + self.Height
+
+    def Contains(self, x, y=None):
+        if y is None:
+            x, y = x.X, x.Y
+        return self.Left <= x <= self.Right and self.Top <= y <= self.Bottom
+
+
+# ==================== KERNEL ENUMS ====================
+
+class GH_ParamWireDisplay(enum.Enum):
+    default = 0
+    faint = 1
+    hidden = 2
+
+
+GH_DataMapping = enum.Enum("GH_DataMapping", [("None", 0), ("Flatten", 1), ("Graft", 2)])
+
+
+class GH_ParamKind(enum.Enum):
+    unknown = 0
+    floating = 1
+    input = 2
+    output = 3
+
+
+class GH_SolutionPhase(enum.Enum):
+    Blank = 0
+    Collecting = 1
+    Collected = 2
+    Computing = 3
+    Computed = 4
+    Failed = 5
+
+
+class GH_ObjectEventType(enum.Enum):
+    Unknown = 0
+    Layout = 1
+    Preview = 2
+    Sources = 3
+    Enabled = 4
+    NickName = 5
+
+
+# ==================== ATTRIBUTES ====================
+
+PARAM_WIDTH = 50.0
+PARAM_HEIGHT = 20.0
+COMPONENT_WIDTH = 120.0
+
+
+class GH_Attributes(object):
+    """Attributes with a pivot, bounds and wire grips"""
+
+    def __init__(self, owner, x=0.0, y=0.0, width=PARAM_WIDTH, height=PARAM_HEIGHT):
+        self.Owner = owner
+        self.DocObject = owner
+        self.Parent = None
+        self.Selected = False
+        self.Pivot = PointF(x, y)
+        self.Bounds = RectangleF(x, y, width, height)
+        self.InputGrip = PointF(x, y + height / 2.0)
+        self.OutputGrip = PointF(x + width, y + height / 2.0)
+        self.layout_expired = 0
+
+    def ExpireLayout(self):
+        self.layout_expired += 1
+        document = self.Owner.OnPingDocument()
+        if document is not None:
+            document.stats["expire_layout"] += 1
+
+    def _shift(self, dx, dy):
+        for point in (self.Pivot, self.InputGrip, self.OutputGrip):
+            point.X += dx
+            point.Y += dy
+        self.Bounds.X += dx
+        self.Bounds.Y += dy
+
+    def move_to(self, x, y):
+        """Move the owner (and, for components, its params) to a new pivot"""
+        dx = x - self.Pivot.X
+        dy = y - self.Pivot.Y
+        self._shift(dx, dy)
+        params = getattr(self.Owner, "Params", None)
+        if params is not None:
+            for param in list(params.Input) + list(params.Output):
+                if param.Attributes is not None:
+                    param.Attributes._shift(dx, dy)
+
+
+# ==================== DOCUMENT OBJECTS ====================
+
+class IGH_DocumentObject(object):
+    """Base of everything that can live in a GH_Document"""
+
+    def __init__(self, name="Object", nickname=None):
+        self.InstanceGuid = Guid.NewGuid()
+        self.Name = name
+        self.NickName = nickname or name
+        self.Attributes = None
+        self.ObjectChanged = Event()
+        self._document = None
+
+    def OnPingDocument(self):
+        return self._document
+
+    def GetType(self):
+        return _Type(type(self))
+
+    def __repr__(self):
+        return "<%s %s>" % (type(self).__name__, self.NickName)
+
+
+class IGH_ActiveObject(IGH_DocumentObject):
+    """Object that takes part in solutions"""
+
+    def __init__(self, name="Object", nickname=None):
+        IGH_DocumentObject.__init__(self, name, nickname)
+        self.Phase = GH_SolutionPhase.Computed
+        self.Locked = False
+
+    def ExpireSolution(self, recompute):
+        document = self.OnPingDocument()
+        if document is not None:
+            document.stats["expire_solution"] += 1
+        self._expire_downstream(set())
+        if recompute and document is not None:
+            document.NewSolution(False)
+
+    def _expire_downstream(self, seen):
+        if id(self) in seen:
+            return
+        seen.add(id(self))
+        self.Phase = GH_SolutionPhase.Blank
+        for param in self._output_params():
+            for recipient in param.Recipients:
+                owner = recipient.Attributes.GetTopLevel.DocObject if recipient.Attributes else recipient
+                owner._expire_downstream(seen)
+
+    def _output_params(self):
+        return []
+
+
+class IGH_Param(IGH_ActiveObject):
+    """Parameter: floating on the canvas or owned by a component"""
+
+    _property_types = {"DataMapping": GH_DataMapping}
+
+    display_name = None
+
+    def __init__(self, name=None, nickname=None):
+        IGH_ActiveObject.__init__(self, name or type(self).display_name or type(self).__name__, nickname)
+        self.Kind = GH_ParamKind.floating
+        self.Sources = []
+        self.Recipients = []
+        self._wire_display = GH_ParamWireDisplay.default
+        self.DataMapping = GH_DataMapping["None"]
+        self.Simplify = False
+        self.Reverse = False
+        self._hidden = False
+        self.VolatileData = GH_Structure()
+        self.Attributes = GH_Attributes(self)
+        self.Attributes.GetTopLevel = self.Attributes
+
+    preview_capable = False
+
+    @property
+    def IsPreviewCapable(self):
+        return type(self).preview_capable
+
+    @property
+    def Hidden(self):
+        return self._hidden
+
+    @Hidden.setter
+    def Hidden(self, value):
+        _set_hidden(self, value)
+
+    @property
+    def WireDisplay(self):
+        return self._wire_display
+
+    @WireDisplay.setter
+    def WireDisplay(self, value):
+        self._wire_display = value
+        document = self.OnPingDocument()
+        if document is not None:
+            document.stats["wire_writes"] += 1
+
+    @property
+    def VolatileDataCount(self):
+        return self.VolatileData.DataCount
+
+    @property
+    def SourceCount(self):
+        return len(self.Sources)
+
+    def AddSource(self, source):
+        if source not in self.Sources:
+            self.Sources.append(source)
+            source.Recipients.append(self)
+            self.ObjectChanged.fire(self, EventArgs(Type=GH_ObjectEventType.Sources))
+
+    def RemoveSource(self, source):
+        if source in self.Sources:
+            self.Sources.remove(source)
+            if self in source.Recipients:
+                source.Recipients.remove(self)
+            self.ObjectChanged.fire(self, EventArgs(Type=GH_ObjectEventType.Sources))
+
+    def RemoveAllSources(self):
+        for source in list(self.Sources):
+            if self in source.Recipients:
+                source.Recipients.remove(self)
+        self.Sources = []
+        self.ObjectChanged.fire(self, EventArgs(Type=GH_ObjectEventType.Sources))
+
+    def _output_params(self):
+        return [self]
+
+
+def _set_hidden(obj, value):
+    """Preview toggles raise ObjectChanged like Grasshopper does"""
+    changed = obj._hidden != bool(value)
+    obj._hidden = bool(value)
+    if changed:
+        obj.ObjectChanged.fire(obj, EventArgs(Type=GH_ObjectEventType.Preview))
+
+
+class GH_Structure(object):
+    """Data tree with just enough surface for counting"""
+
+    def __init__(self, branch_sizes=None):
+        self.branch_sizes = list(branch_sizes or [])
+
+    @property
+    def PathCount(self):
+        return len(self.branch_sizes)
+
+    @property
+    def DataCount(self):
+        return sum(self.branch_sizes)
+
+
+class GH_Param(IGH_Param):
+    pass
+
+
+class IGH_Component(IGH_ActiveObject):
+    """Component with input and output params"""
+
+    def __init__(self, name="Component", nickname=None):
+        IGH_ActiveObject.__init__(self, name, nickname)
+        self.Params = GH_ComponentParamServer()
+        self._hidden = False
+        self.IsPreviewCapable = True
+        self.Attributes = GH_Attributes(self, width=COMPONENT_WIDTH)
+        self.Attributes.GetTopLevel = self.Attributes
+
+    @property
+    def Hidden(self):
+        return self._hidden
+
+    @Hidden.setter
+    def Hidden(self, value):
+        _set_hidden(self, value)
+
+    def _output_params(self):
+        return list(self.Params.Output)
+
+    def _register(self, param, kind):
+        param.Kind = kind
+        attributes = param.Attributes
+        attributes.Parent = self.Attributes
+        attributes.GetTopLevel = self.Attributes
+        attributes.Owner = param
+        attributes.DocObject = param
+        param._document = self._document
+
+    def _layout(self):
+        """Place param grips along the component edges"""
+        pivot = self.Attributes.Pivot
+        rows = max(len(self.Params.Input), len(self.Params.Output), 1)
+        height = rows * PARAM_HEIGHT
+        self.Attributes.Bounds = RectangleF(pivot.X, pivot.Y, COMPONENT_WIDTH, height)
+        self.Attributes.InputGrip = PointF(pivot.X, pivot.Y + height / 2.0)
+        self.Attributes.OutputGrip = PointF(pivot.X + COMPONENT_WIDTH, pivot.Y + height / 2.0)
+        for row, param in enumerate(self.Params.Input):
+            y = pivot.Y + (row + 0.5) * PARAM_HEIGHT
+            param.Attributes.Pivot = PointF(pivot.X, y)
+            param.Attributes.Bounds = RectangleF(pivot.X, y - PARAM_HEIGHT / 2.0, PARAM_WIDTH, PARAM_HEIGHT)
+            param.Attributes.InputGrip = PointF(pivot.X, y)
+            param.Attributes.OutputGrip = PointF(pivot.X + PARAM_WIDTH, y)
+        for row, param in enumerate(self.Params.Output):
+            y = pivot.Y + (row + 0.5) * PARAM_HEIGHT
+            x = pivot.X + COMPONENT_WIDTH - PARAM_WIDTH
+            param.Attributes.Pivot = PointF(x, y)
+            param.Attributes.Bounds = RectangleF(x, y - PARAM_HEIGHT / 2.0, PARAM_WIDTH, PARAM_HEIGHT)
+            param.Attributes.InputGrip = PointF(x, y)
+            param.Attributes.OutputGrip = PointF(pivot.X + COMPONENT_WIDTH, y)
+
+
+class GH_ComponentParamServer(object):
+    def __init__(self):
+        self.Input = []
+        self.Output = []
+
+
+class GH_Component(IGH_Component):
+    pass
+
+
+# ==================== GROUPS / CLUSTERS ====================
+
+class GH_Group(IGH_DocumentObject):
+    """Named group; ObjectIDs lists the InstanceGuids of its top-level members"""
+
+    def __init__(self, nickname="Group"):
+        IGH_DocumentObject.__init__(self, "Group", nickname)
+        self.ObjectIDs = []
+        self.Attributes = GH_Attributes(self)
+
+    def AddObject(self, guid):
+        if guid not in self.ObjectIDs:
+            self.ObjectIDs.append(guid)
+
+    def RemoveObject(self, guid):
+        if guid in self.ObjectIDs:
+            self.ObjectIDs.remove(guid)
+
+
+class GH_Cluster(GH_Component):
+    """Cluster component wrapping a document of its own"""
+
+    def __init__(self, nickname="Cluster", document=None):
+        GH_Component.__init__(self, "Cluster", nickname)
+        self._inner = document if document is not None else GH_Document()
+
+    def Document(self, password):
+        return self._inner
+
+
+# ==================== PARAM TYPES ====================
+
+def _param_type(name, display, preview_capable=False):
+    return type(name, (GH_Param,), {"preview_capable": preview_capable, "display_name": display})
+
+
+Param_Geometry = _param_type("Param_Geometry", "Geometry", True)
+Param_Brep = _param_type("Param_Brep", "Brep", True)
+Param_Surface = _param_type("Param_Surface", "Surface", True)
+Param_Mesh = _param_type("Param_Mesh", "Mesh", True)
+Param_Curve = _param_type("Param_Curve", "Curve", True)
+Param_Point = _param_type("Param_Point", "Point", True)
+Param_Vector = _param_type("Param_Vector", "Vector", True)
+Param_Line = _param_type("Param_Line", "Line", True)
+Param_Arc = _param_type("Param_Arc", "Arc", True)
+Param_Circle = _param_type("Param_Circle", "Circle", True)
+Param_Plane = _param_type("Param_Plane", "Plane", True)
+Param_Box = _param_type("Param_Box", "Box", True)
+Param_Number = _param_type("Param_Number", "Number")
+Param_Integer = _param_type("Param_Integer", "Integer")
+Param_Complex = _param_type("Param_Complex", "Complex")
+Param_Interval = _param_type("Param_Interval", "Domain")
+Param_String = _param_type("Param_String", "Text")
+Param_Boolean = _param_type("Param_Boolean", "Boolean")
+Param_Colour = _param_type("Param_Colour", "Colour")
+Param_GenericObject = _param_type("Param_GenericObject", "Data")
+Param_Guid = _param_type("Param_Guid", "Guid")
+Param_FilePath = _param_type("Param_FilePath", "File Path")
+
+PARAM_TYPES = [
+    Param_Geometry, Param_Brep, Param_Surface, Param_Mesh, Param_Curve,
+    Param_Point, Param_Vector, Param_Line, Param_Arc, Param_Circle,
+    Param_Plane, Param_Box, Param_Number, Param_Integer, Param_Complex,
+    Param_Interval, Param_String, Param_Boolean, Param_Colour,
+    Param_GenericObject, Param_Guid, Param_FilePath,
+]
+
+
+# ==================== DOCUMENT ====================
+
+class GH_ValueTable(object):
+    """String key/value store serialized with the document"""
+
+    def __init__(self):
+        self.values = {}
+
+    def SetValue(self, name, value):
+        self.values[name] = value
+
+    def GetValue(self, name, default):
+        return self.values.get(name, default)
+
+
+class GH_Document(object):
+    """Document holding top-level objects, selection and solution state"""
+
+    def __init__(self):
+        self.DocumentID = Guid.NewGuid()
+        self.FilePath = ""
+        self.ValueTable = GH_ValueTable()
+        self.Objects = []
+        self.SolutionSerial = 0
+        self.Enabled = True
+        self.ObjectsAdded = Event()
+        self.ObjectsDeleted = Event()
+        self.SolutionStart = Event()
+        self.SolutionEnd = Event()
+        self.stats = {
+            "expire_layout": 0,
+            "expire_solution": 0,
+            "new_solution": 0,
+            "wire_writes": 0,
+        }
+
+    @property
+    def ObjectCount(self):
+        return len(self.Objects)
+
+    def reset_stats(self):
+        for key in self.stats:
+            self.stats[key] = 0
+
+    def AddObject(self, obj, update=False, index=-1):
+        obj._document = self
+        params = getattr(obj, "Params", None)
+        if params is not None:
+            for param in list(params.Input) + list(params.Output):
+                param._document = self
+        if index < 0:
+            self.Objects.append(obj)
+        else:
+            self.Objects.insert(index, obj)
+        self.ObjectsAdded.fire(self, EventArgs(Objects=[obj], Document=self))
+        return True
+
+    def RemoveObject(self, obj, update=False):
+        if obj not in self.Objects:
+            return False
+        for param in _params_of(obj):
+            for source in list(param.Sources):
+                param.RemoveSource(source)
+            for recipient in list(param.Recipients):
+                recipient.RemoveSource(param)
+        self.Objects.remove(obj)
+        obj._document = None
+        self.ObjectsDeleted.fire(self, EventArgs(Objects=[obj], Document=self))
+        return True
+
+    def FindObject(self, guid, top_level_only=True):
+        for obj in self.Objects:
+            if obj.InstanceGuid == guid:
+                return obj
+            if not top_level_only:
+                for param in _params_of(obj):
+                    if param.InstanceGuid == guid:
+                        return param
+        return None
+
+    def SelectedObjects(self):
+        return [obj for obj in self.Objects if obj.Attributes is not None and obj.Attributes.Selected]
+
+    def SelectAll(self):
+        for obj in self.Objects:
+            obj.Attributes.Selected = True
+
+    def DeselectAll(self):
+        for obj in self.Objects:
+            obj.Attributes.Selected = False
+
+    def NewSolution(self, expire_all_objects):
+        self.stats["new_solution"] += 1
+        self.SolutionStart.fire(self, EventArgs(Document=self))
+        if expire_all_objects:
+            for obj in self.Objects:
+                obj.Phase = GH_SolutionPhase.Blank
+        for obj in self.Objects:
+            obj.Phase = GH_SolutionPhase.Computed
+        self.SolutionSerial += 1
+        self.SolutionEnd.fire(self, EventArgs(Document=self))
+
+
+def _params_of(obj):
+    if isinstance(obj, IGH_Param):
+        return [obj]
+    if isinstance(obj, IGH_Component):
+        return list(obj.Params.Input) + list(obj.Params.Output)
+    return []
+
+
+# ==================== CANVAS / INSTANCES ====================
+
+class GH_Viewport(object):
+    """Canvas viewport; VisibleRegion is the visible rectangle in canvas units"""
+
+    def __init__(self, x=0.0, y=0.0, width=1920.0, height=1080.0):
+        self.VisibleRegion = RectangleF(x, y, width, height)
+
+
+class GH_Canvas(object):
+    """Canvas with a document, a viewport and a refresh counter"""
+
+    def __init__(self, document=None):
+        self.Document = document
+        self.Viewport = GH_Viewport()
+        self.refreshes = 0
+
+    def Refresh(self):
+        self.refreshes += 1
+
+
+class GH_SettingsServer(object):
+    def __init__(self):
+        self.values = {}
+
+    def SetValue(self, key, value):
+        self.values[key] = value
+
+    def GetValue(self, key, default):
+        return self.values.get(key, default)
+
+
+class GH_DocumentServer(object):
+    """Open documents, with add/remove events"""
+
+    def __init__(self):
+        self.documents = []
+        self.DocumentAdded = Event()
+        self.DocumentRemoved = Event()
+
+    def __iter__(self):
+        return iter(list(self.documents))
+
+    def __len__(self):
+        return len(self.documents)
+
+    def AddDocument(self, document):
+        if document not in self.documents:
+            self.documents.append(document)
+            self.DocumentAdded.fire(self, document)
+
+    def RemoveDocument(self, document):
+        if document in self.documents:
+            self.documents.remove(document)
+            self.DocumentRemoved.fire(self, document)
+
+
+class Instances(object):
+    ActiveCanvas = None
+    Settings = GH_SettingsServer()
+    DocumentServer = GH_DocumentServer()
+
+
+class RhinoApp(object):
+    Idle = Event()
+    EscapeKeyPressed = Event()
+
+
+class StatusBar(object):
+    """Stand-in for Rhino.UI.StatusBar; remembers the progress meter state"""
+    meter = None    # (lower, upper, label) while shown
+    position = 0
+    updates = 0
+
+    @classmethod
+    def ShowProgressMeter(cls, lower, upper, label, embed_label, show_percent):
+        cls.meter = (lower, upper, label)
+        cls.position = lower
+        return 1
+
+    @classmethod
+    def UpdateProgressMeter(cls, position, absolute):
+        cls.position = position if absolute else cls.position + position
+        cls.updates += 1
+        return 1
+
+    @classmethod
+    def HideProgressMeter(cls):
+        cls.meter = None
+
+
+# ==================== INSTALL ====================
+
+def install():
+    """Register the fake Grasshopper, Rhino, System and scriptcontext modules"""
+    if "Grasshopper" in sys.modules and getattr(sys.modules["Grasshopper"], "__mock__", False):
+        return sys.modules["Grasshopper"]
+
+    grasshopper = types.ModuleType("Grasshopper")
+    grasshopper.__mock__ = True
+    grasshopper.Instances = Instances
+
+    kernel = types.ModuleType("Grasshopper.Kernel")
+    for name in ("GH_ParamWireDisplay", "GH_DataMapping", "GH_ParamKind", "GH_SolutionPhase",
+                 "GH_ObjectEventType", "IGH_DocumentObject", "IGH_ActiveObject", "IGH_Param",
+                 "IGH_Component", "GH_Param", "GH_Component", "GH_Document", "GH_Structure"):
+        setattr(kernel, name, globals()[name])
+    grasshopper.Kernel = kernel
+
+    special = types.ModuleType("Grasshopper.Kernel.Special")
+    special.GH_Group = GH_Group
+    special.GH_Cluster = GH_Cluster
+    kernel.Special = special
+
+    parameters = types.ModuleType("Grasshopper.Kernel.Parameters")
+    parameters.__all__ = [cls.__name__ for cls in PARAM_TYPES]
+    for cls in PARAM_TYPES:
+        setattr(parameters, cls.__name__, cls)
+    kernel.Parameters = parameters
+
+    gui = types.ModuleType("Grasshopper.GUI")
+    canvas = types.ModuleType("Grasshopper.GUI.Canvas")
+    canvas.GH_Canvas = GH_Canvas
+    gui.Canvas = canvas
+    grasshopper.GUI = gui
+
+    system = types.ModuleType("System")
+    system.Guid = Guid
+    system.Enum = Enum
+    drawing = types.ModuleType("System.Drawing")
+    drawing.PointF = PointF
+    drawing.RectangleF = RectangleF
+    system.Drawing = drawing
+
+    rhino = types.ModuleType("Rhino")
+    rhino.RhinoApp = RhinoApp
+    rhino.UI = types.ModuleType("Rhino.UI")
+    rhino.UI.StatusBar = StatusBar
+
+    scriptcontext = types.ModuleType("scriptcontext")
+    scriptcontext.sticky = {}
+
+    sys.modules.update({
+        "Grasshopper": grasshopper,
+        "Grasshopper.Kernel": kernel,
+        "Grasshopper.Kernel.Parameters": parameters,
+        "Grasshopper.Kernel.Special": special,
+        "Grasshopper.GUI": gui,
+        "Grasshopper.GUI.Canvas": canvas,
+        "System": system,
+        "System.Drawing": drawing,
+        "Rhino": rhino,
+        "scriptcontext": scriptcontext,
+    })
+    return grasshopper
+
+
+def activate(document):
+    """Make a document the active canvas document, opening it if needed"""
+    if document is not None:
+        Instances.DocumentServer.AddDocument(document)
+    Instances.ActiveCanvas = GH_Canvas(document) if document is not None else None
+    return Instances.ActiveCanvas
+
+
+def close(document):
+    """Close a document, clearing the active canvas if it showed it"""
+    Instances.DocumentServer.RemoveDocument(document)
+    if Instances.ActiveCanvas is not None and Instances.ActiveCanvas.Document is document:
+        Instances.ActiveCanvas = None
+
+
+# ==================== SYNTHETIC DOCUMENTS ====================
+
+def make_component(param_types, outputs, x=0.0, y=0.0, name="Component", component=None):
+    """Create a component (or fill in the given one) with one input per entry of param_types"""
+    component = component or GH_Component(name)
+    component.Attributes.Pivot = PointF(x, y)
+    for position, cls in enumerate(param_types):
+        param = cls("Input %d" % position, "I%d" % position)
+        component.Params.Input.append(param)
+        component._register(param, GH_ParamKind.input)
+    for position, cls in enumerate(outputs):
+        param = cls("Output %d" % position, "O%d" % position)
+        component.Params.Output.append(param)
+        component._register(param, GH_ParamKind.output)
+    component._layout()
+    return component
+
+
+def make_param(cls, x=0.0, y=0.0):
+    """Create a floating param at a canvas position"""
+    param = cls()
+    param.Attributes.move_to(x, y)
+    return param
+
+
+def _seeded_guid(rng):
+    return Guid(uuid.UUID(int=rng.getrandbits(128)))
+
+
+def _unique(items):
+    seen = set()
+    return [item for item in items if not (id(item) in seen or seen.add(id(item)))]
+
+
+def generate_document(components=1000, seed=0, floating_ratio=0.1, max_inputs=4,
+                      max_outputs=3, wire_density=0.8, long_wire_ratio=0.05,
+                      selected_ratio=0.05, hidden_ratio=0.2, groups=0, clusters=0, cluster_size=20):
+    """
+    Build a synthetic definition with the given number of top-level objects.
+
+    Components are laid out on a grid and wired left to right so the graph is
+    a DAG; a fraction of wires jump far across the canvas to produce the long
+    outliers real definitions have. The layout, wiring, data sizes, preview
+    flags and selection are all driven by seed so runs are reproducible.
+
+    groups adds named groups over runs of neighbouring objects (some nesting
+    the group made before them); clusters adds cluster components wrapping a
+    generated definition of cluster_size objects, the first of which holds a
+    nested cluster of its own. Both are added after the rest of the document,
+    so the default document for a seed does not change.
+    """
+    rng = random.Random(seed)
+    document = GH_Document()
+    columns = max(1, int(round((components ** 0.5) * 2)))
+    spacing_x = 220.0
+    spacing_y = 110.0
+    outputs_so_far = []
+
+    for position in range(components):
+        column = position % columns
+        row = position // columns
+        x = column * spacing_x + rng.uniform(-20.0, 20.0)
+        y = row * spacing_y + rng.uniform(-20.0, 20.0)
+        if rng.random() < floating_ratio:
+            obj = make_param(rng.choice(PARAM_TYPES), x, y)
+            obj.Hidden = rng.random() < hidden_ratio
+            inputs = [obj]
+            outputs = [obj]
+        else:
+            obj = make_component(
+                [rng.choice(PARAM_TYPES) for _ in range(rng.randint(1, max_inputs))],
+                [rng.choice(PARAM_TYPES) for _ in range(rng.randint(1, max_outputs))],
+                x, y, "Component %d" % position)
+            obj.Hidden = rng.random() < hidden_ratio
+            inputs = obj.Params.Input
+            outputs = obj.Params.Output
+        obj.InstanceGuid = _seeded_guid(rng)
+        if obj not in inputs:
+            for param in list(inputs) + list(outputs):
+                param.InstanceGuid = _seeded_guid(rng)
+        document.AddObject(obj)
+        obj.Attributes.Selected = rng.random() < selected_ratio
+
+        for param in inputs:
+            if outputs_so_far and rng.random() < wire_density:
+                for _ in range(rng.choice((1, 1, 1, 2, 3))):
+                    if rng.random() < long_wire_ratio:
+                        source = rng.choice(outputs_so_far)
+                    else:
+                        source = rng.choice(outputs_so_far[-columns * 2:])
+                    if source is not param and source not in param.Sources:
+                        param.AddSource(source)
+        for param in _unique(list(inputs) + list(outputs)):
+            branches = rng.randint(1, 4)
+            scale = rng.choice((1, 1, 10, 100, 1000))
+            param.VolatileData = GH_Structure([rng.randint(0, scale) for _ in range(branches)])
+            param.WireDisplay = rng.choice(list(GH_ParamWireDisplay))
+            if rng.random() < 0.2:
+                param.DataMapping = rng.choice(list(GH_DataMapping))
+        outputs_so_far.extend(outputs)
+
+    objects = list(document.Objects)
+    made = []
+    for number in range(groups):
+        group = GH_Group("Group %d" % number)
+        group.InstanceGuid = _seeded_guid(rng)
+        start = rng.randrange(len(objects))
+        for obj in objects[start:start + rng.randint(2, 12)]:
+            group.AddObject(obj.InstanceGuid)
+        if made and rng.random() < 0.3:
+            group.AddObject(made[-1].InstanceGuid)
+        document.AddObject(group)
+        made.append(group)
+
+    for number in range(clusters):
+        nested = min(1, clusters - 1) if number == 0 else 0
+        inner = generate_document(cluster_size, seed=rng.getrandbits(32), clusters=nested, cluster_size=cluster_size)
+        cluster = make_component(
+            [rng.choice(PARAM_TYPES) for _ in range(rng.randint(1, 3))],
+            [rng.choice(PARAM_TYPES) for _ in range(rng.randint(1, 2))],
+            rng.uniform(0.0, columns * spacing_x), rng.uniform(0.0, (components // columns + 1) * spacing_y),
+            component=GH_Cluster("Cluster %d" % number, inner))
+        cluster.InstanceGuid = _seeded_guid(rng)
+        for param in list(cluster.Params.Input) + list(cluster.Params.Output):
+            param.InstanceGuid = _seeded_guid(rng)
+        document.AddObject(cluster)
+        for param in cluster.Params.Input:
+            if outputs_so_far:
+                param.AddSource(rng.choice(outputs_so_far))
+
+    document.reset_stats()
+    return document
+
+
+# ==================== GHX EXPORT ====================
+
+def save_ghx(document, path):
+    """
+    Write a document as a .ghx archive with the chunks WireHopper_Ghx reads.
+
+    Objects, params, wires, bounds, preview and non-default wire display are
+    written in Grasshopper's archive layout; solution data is not.
+    """
+    with open(path, "w", encoding="utf-8") as handle:
+        out = _GhxWriter(handle)
+        handle.write('<?xml version="1.0" encoding="utf-8" standalone="yes"?>\n')
+        out.open("Archive", name="Root")
+        out.items([("ArchiveVersion", "gh_string", "0.2.2")])
+        out.open("chunks", count=1)
+        out.open("chunk", name="Definition")
+        out.items([("DocumentID", "gh_guid", str(document.DocumentID))])
+        out.open("chunks", count=1)
+        out.open("chunk", name="DefinitionObjects")
+        out.items([("ObjectCount", "gh_int32", len(document.Objects))])
+        out.open("chunks", count=len(document.Objects))
+        for position, obj in enumerate(document.Objects):
+            _write_object(out, obj, position)
+        for _ in range(6):
+            out.close()
+
+
+def _write_object(out, obj, position):
+    out.open("chunk", name="Object", index=position)
+    out.items([("GUID", "gh_guid", str(_seeded_guid(random.Random(type(obj).__name__)))),
+               ("Name", "gh_string", obj.Name)])
+    out.open("chunks", count=1)
+    out.open("chunk", name="Container")
+    if isinstance(obj, IGH_Param):
+        _write_param_items(out, obj, [("Hidden", "gh_bool", "true" if obj.Hidden else "false")])
+        out.open("chunks", count=1)
+        _write_attributes(out, obj.Attributes)
+    else:
+        out.items([("InstanceGuid", "gh_guid", str(obj.InstanceGuid)),
+                   ("Name", "gh_string", obj.Name),
+                   ("Hidden", "gh_bool", "true" if getattr(obj, "Hidden", False) else "false")])
+        server = getattr(obj, "Params", None)
+        params = [("param_input", position, param) for position, param in enumerate(server.Input)] if server else []
+        params += [("param_output", position, param) for position, param in enumerate(server.Output)] if server else []
+        out.open("chunks", count=1 + len(params))
+        _write_attributes(out, obj.Attributes)
+        for name, index, param in params:
+            out.open("chunk", name=name, index=index)
+            _write_param_items(out, param)
+            out.open("chunks", count=1)
+            _write_attributes(out, param.Attributes)
+            out.close()
+            out.close()
+    out.close()
+    out.close()
+    out.close()
+    out.close()
+
+
+def _write_param_items(out, param, extra=()):
+    items = [("InstanceGuid", "gh_guid", str(param.InstanceGuid)),
+             ("Name", "gh_string", param.Name),
+             ("NickName", "gh_string", param.NickName),
+             ("SourceCount", "gh_int32", len(param.Sources))]
+    items += [("Source", "gh_guid", str(source.InstanceGuid), index)
+              for index, source in enumerate(param.Sources)]
+    if param.WireDisplay != GH_ParamWireDisplay.default:
+        items.append(("WireDisplay", "gh_int32", param.WireDisplay.value))
+    items.extend(extra)
+    out.items(items)
+
+
+def _write_attributes(out, attributes):
+    bounds = attributes.Bounds
+    pivot = attributes.Pivot
+    out.open("chunk", name="Attributes")
+    out.open("items", count=2)
+    out.line('<item name="Bounds" type_name="gh_drawing_rectanglef" type_code="35">'
+             '<X>%r</X><Y>%r</Y><W>%r</W><H>%r</H></item>'
+             % (bounds.X, bounds.Y, bounds.Width, bounds.Height))
+    out.line('<item name="Pivot" type_name="gh_drawing_pointf" type_code="31">'
+             '<X>%r</X><Y>%r</Y></item>' % (pivot.X, pivot.Y))
+    out.close()
+    out.close()
+
+
+class _GhxWriter(object):
+    """Indented XML element writer"""
+
+    TYPE_CODES = {"gh_bool": 1, "gh_int32": 3, "gh_guid": 9, "gh_string": 10}
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.stack = []
+
+    def line(self, text):
+        self.handle.write("  " * len(self.stack) + text + "\n")
+
+    def open(self, tag, **attributes):
+        text = "".join(" %s=%s" % (key, quoteattr(str(value))) for key, value in attributes.items())
+        self.line("<%s%s>" % (tag, text))
+        self.stack.append(tag)
+
+    def close(self):
+        tag = self.stack.pop()
+        self.line("</%s>" % tag)
+
+    def items(self, items):
+        self.open("items", count=len(items))
+        for item in items:
+            name, type_name, value = item[:3]
+            index = ' index="%d"' % item[3] if len(item) > 3 else ""
+            self.line('<item name="%s"%s type_name="%s" type_code="%d">%s</item>'
+                      % (name, index, type_name, self.TYPE_CODES[type_name], escape(str(value))))
+        self.close()
@@ -11,6 +11,8 @@ Component Inputs:
 Component Outputs:
     Info: String - Status message
     Count: Integer - Number of wires affected
+    Metrics: String - JSON phase timings and counters (optional, see Profile)
+    Plan: String - JSON change set of a DryRun (optional)
 
 Author: Eesha Jain (Python port)
 Version: 1.0 (Mac/Windows compatible)
@@ -19,424 +21,3378 @@ Version: 1.0 (Mac/Windows compatible)
 import Grasshopper as gh
 from Grasshopper.Kernel import GH_ParamWireDisplay, IGH_Param, IGH_Component
 from Grasshopper.Kernel.Parameters import *
+from Grasshopper.Kernel.Special import GH_Group, GH_Cluster
 import System
 from System import Guid
 import Rhino
 import scriptcontext as sc
 import math
+import time
+import collections
+import functools
+import fnmatch
+import shlex
+import base64
+import csv
+import json
+import os
+import struct
+import uuid
+import zlib
+from array import array
+
+# NumPy is optional: wire lengths fall back to a pure-Python loop without it
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# ==================== PROFILING ====================
+
+class Profiler:
+    """
+    Opt-in phase timings and counters for one action.
+    
+    Phases are exclusive: entering a nested phase pauses the enclosing one,
+    so phase times never add up to more than the action's total. A disabled
+    profiler hands out a shared no-op phase and ignores counts, which keeps
+    the instrumented code paths free when profiling is off.
+    """
+    
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.times = {}         # phase name -> seconds
+        self.counters = {}      # counter name -> total
+        self.stack = []
+        self.mark = 0.0
+        self.started = time.perf_counter()
+    
+    def phase(self, name):
+        """Context manager timing a phase (no-op when disabled)"""
+        return ProfilePhase(self, name) if self.enabled else NULL_PHASE
+    
+    def count(self, name, amount=1):
+        """Add to a counter"""
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+    
+    def _switch(self):
+        now = time.perf_counter()
+        if self.stack:
+            name = self.stack[-1]
+            self.times[name] = self.times.get(name, 0.0) + now - self.mark
+        self.mark = now
+    
+    def metrics(self, action, count, doc=None, error=None):
+        """JSON-ready record of the action's phase times and counters"""
+        total = time.perf_counter() - self.started
+        phases = {name: round(seconds, 6) for name, seconds in self.times.items()}
+        phases["other"] = round(max(0.0, total - sum(self.times.values())), 6)
+        record = {
+            "action": action,
+            "count": count,
+            "total": round(total, 6),
+            "phases": phases,
+            "counters": dict(self.counters),
+            "numpy": np is not None,
+            "timestamp": round(time.time(), 3),
+        }
+        if doc is not None:
+            record["document"] = str(doc.DocumentID)
+            record["objects"] = len(doc.Objects)
+        if error is not None:
+            record["error"] = error
+        return record
+    
+    @staticmethod
+    def append(path, record):
+        """Append a record to a JSON-lines trace file"""
+        with open(path, "a") as handle:
+            handle.write(json.dumps(record, sort_keys=True) + "\n")
+
+
+class ProfilePhase:
+    """One timed phase of a Profiler"""
+    
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+    
+    def __enter__(self):
+        self.profiler._switch()
+        self.profiler.stack.append(self.name)
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler._switch()
+        self.profiler.stack.pop()
+        return False
+
+
+class NullPhase:
+    """Shared phase handed out by disabled profilers"""
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_PHASE = NullPhase()
+NULL_PROFILER = Profiler()
+
+
+def parse_profile(value):
+    """(enabled, trace file path or None) from the optional Profile input"""
+    if value is None or isinstance(value, bool):
+        return bool(value), None
+    text = str(value).strip()
+    if text.lower() in ("", "0", "false", "no", "off"):
+        return False, None
+    if text.lower() in ("1", "true", "yes", "on"):
+        return True, None
+    return True, text
+
+
+# ==================== WIRE INDEX ====================
+
+class WireIndex:
+    """
+    Single-pass index of every param in a document and the wires between them.
+
+    One walk over doc.Objects records each param in a slot together with the
+    top-level object that owns it and whether it is floating, a component
+    input or a component output. Source/recipient edges and grip points are
+    read lazily from the cached params, so actions never repeat the isinstance
+    checks or the Params.Input/Params.Output expansion.
+
+    The index patches itself from document events: added objects are appended,
+    deleted objects are tombstoned, and any new solution (which is what wire
+    edits and parameter changes trigger) marks the edges for a re-read.
+    """
+    
+    FLOATING = 0
+    INPUT = 1
+    OUTPUT = 2
+    
+    def __init__(self, doc, profiler=None):
+        self.doc = doc
+        self.profiler = profiler or NULL_PROFILER
+        self.params = []        # IGH_Param per slot, None once its owner is deleted
+        self.owners = []        # top-level document object per slot
+        self.kinds = []         # FLOATING / INPUT / OUTPUT per slot
+        self.slots = {}         # param InstanceGuid -> slot
+        self.owner_slots = {}   # owner InstanceGuid -> [slots]
+        self.param_counts = {}  # component InstanceGuid -> number of params when indexed
+        self.sources = []       # per slot: list of source slots
+        self.recipients = []    # per slot: list of recipient slots
+        self.built = False
+        self.edges_valid = False
+        self.check_params = False
+        self.removed = 0
+        self.keys = None        # 16-byte GUID key -> slot, built on demand
+        self.flow = None        # FlowGraph over the current edges, built on demand
+        self.degrees = None     # DegreeTable over the current edges, built on demand
+        self.grid = None        # WireGrid of wire boxes, built on demand
+        self.solutions = 0      # SolutionStart events seen; data read before one is stale
+        self.data = None        # (solutions, {slot: item count}, {slot: branch count})
+        self.members = None     # MembershipIndex of groups and clusters, built on demand
+        self.edge_serial = 0    # bumped whenever a re-read finds different edges
+        self.generation = 0     # bumped on every full build; slots change meaning
+        self.attached = False
+    
+    # ---------- building ----------
+    
+    def build(self):
+        """Walk doc.Objects once and index every param"""
+        self.params = []
+        self.owners = []
+        self.kinds = []
+        self.slots = {}
+        self.owner_slots = {}
+        self.param_counts = {}
+        self.removed = 0
+        self.keys = None
+        self.data = None
+        self.sources = []
+        self.recipients = []
+        with self.profiler.phase("traverse"):
+            for obj in self.doc.Objects:
+                self._add_object(obj)
+        self.profiler.count("objects_visited", len(self.doc.Objects))
+        self.profiler.count("params_indexed", len(self.params))
+        self.generation += 1
+        self.built = True
+        self.edges_valid = False
+        self.check_params = False
+        return self
+    
+    def ensure(self):
+        """Return the index, building or patching it first if needed"""
+        if not self.built:
+            return self.build()
+        if self.check_params:
+            self._check_param_counts()
+        return self
+    
+    def _add_object(self, obj):
+        if isinstance(obj, IGH_Param):
+            self.owner_slots[obj.InstanceGuid] = [self._add_param(obj, obj, self.FLOATING)]
+        elif isinstance(obj, IGH_Component):
+            slots = []
+            for param in obj.Params.Input:
+                slots.append(self._add_param(param, obj, self.INPUT))
+            for param in obj.Params.Output:
+                slots.append(self._add_param(param, obj, self.OUTPUT))
+            self.owner_slots[obj.InstanceGuid] = slots
+            self.param_counts[obj.InstanceGuid] = len(slots)
+    
+    def _add_param(self, param, owner, kind):
+        slot = len(self.params)
+        self.params.append(param)
+        self.owners.append(owner)
+        self.kinds.append(kind)
+        self.slots[param.InstanceGuid] = slot
+        self.keys = None
+        return slot
+    
+    def _remove_object(self, obj):
+        guid = obj.InstanceGuid
+        for slot in self.owner_slots.pop(guid, []):
+            param = self.params[slot]
+            if param is not None:
+                self.slots.pop(param.InstanceGuid, None)
+                self.keys = None
+                self.params[slot] = None
+                self.owners[slot] = None
+                self.removed += 1
+        self.param_counts.pop(guid, None)
+    
+    def _check_param_counts(self):
+        """Re-index components whose inputs or outputs were added or removed"""
+        self.check_params = False
+        for guid, slots in list(self.owner_slots.items()):
+            if guid not in self.param_counts or not slots:
+                continue
+            owner = self.owners[slots[0]]
+            if len(owner.Params.Input) + len(owner.Params.Output) != self.param_counts[guid]:
+                self._remove_object(owner)
+                self._add_object(owner)
+                self.edges_valid = False
+    
+    # ---------- lookups ----------
+    
+    def live_slots(self, include_inputs=True, include_outputs=True):
+        """Slots of every param still in the document, in document order"""
+        params = self.params
+        if include_inputs and include_outputs:
+            return [slot for slot in range(len(params)) if params[slot] is not None]
+        kinds = self.kinds
+        wanted = {self.FLOATING}
+        if include_inputs:
+            wanted.add(self.INPUT)
+        if include_outputs:
+            wanted.add(self.OUTPUT)
+        return [slot for slot in range(len(params))
+                if params[slot] is not None and kinds[slot] in wanted]
+    
+    def slots_of(self, objects):
+        """Slots of the params belonging to the given top-level objects"""
+        result = []
+        for obj in objects:
+            slots = self.owner_slots.get(obj.InstanceGuid)
+            if slots is None:
+                self._add_object(obj)
+                slots = self.owner_slots.get(obj.InstanceGuid, [])
+                self.edges_valid = False
+            result.extend(slots)
+        return result
+    
+    def slot_keys(self):
+        """16-byte GUID key -> slot, for matching saved snapshots"""
+        if self.keys is None:
+            self.keys = {guid_key(param.InstanceGuid): slot
+                         for slot, param in enumerate(self.params) if param is not None}
+        return self.keys
+    
+    def is_indexed(self, obj):
+        """True for params and components, which own slots (possibly none)"""
+        if obj.InstanceGuid not in self.owner_slots:
+            self._add_object(obj)
+        return obj.InstanceGuid in self.owner_slots
+    
+    # ---------- edges ----------
+    
+    def ensure_edges(self):
+        """Read Sources once per param and build source/recipient slot lists"""
+        self.ensure()
+        if self.edges_valid:
+            return self
+        slots = self.slots
+        sources = []
+        recipients = [[] for _ in self.params]
+        with self.profiler.phase("traverse"):
+            for slot, param in enumerate(self.params):
+                if param is None:
+                    sources.append([])
+                    continue
+                found = []
+                for source in param.Sources:
+                    src = slots.get(source.InstanceGuid)
+                    if src is not None:
+                        found.append(src)
+                        recipients[src].append(slot)
+                sources.append(found)
+        # A solution invalidates the edges even if no wire changed; keep the
+        # flow graph and anything keyed on edge_serial when nothing did
+        if sources != self.sources:
+            self.sources = sources
+            self.recipients = recipients
+            self.flow = None
+            self.degrees = None
+            self.edge_serial += 1
+        self.edges_valid = True
+        return self
+    
+    def remove_edges(self, edges):
+        """
+        Drop (destination slot, source slot) edges from the index only.
+        
+        Plans use this so later actions see the wiring a planned disconnect
+        would leave; invalidate_edges() re-reads the document's own wires.
+        """
+        self.ensure_edges()
+        for dst, src in edges:
+            if src in self.sources[dst]:
+                self.sources[dst].remove(src)
+                self.recipients[src].remove(dst)
+        self.flow = None
+        self.degrees = None
+        self.edge_serial += 1
+    
+    def wire_geometry(self, slots=None, src_slots=None):
+        """
+        Packed arrays for every wire whose ends both have attributes.
+        
+        Returns (dst, x0, y0, x1, y1): the destination param slot of each wire
+        followed by its source OutputGrip and destination InputGrip coordinates.
+        Wires are ordered by destination slot, then by source order. Pass slots
+        to limit the result to wires ending at those params, and an array as
+        src_slots to collect each wire's source slot as well.
+        """
+        self.ensure_edges()
+        params = self.params
+        sources = self.sources
+        output_grips = {}
+        dst, x0, y0, x1, y1 = array('l'), array('d'), array('d'), array('d'), array('d')
+        
+        with self.profiler.phase("grips"):
+            for slot in (self.live_slots() if slots is None else slots):
+                if not sources[slot]:
+                    continue
+                attributes = params[slot].Attributes
+                if not attributes:
+                    continue
+                dst_pt = attributes.InputGrip
+                for src in sources[slot]:
+                    src_pt = output_grips.get(src)
+                    if src_pt is None:
+                        src_attributes = params[src].Attributes
+                        if not src_attributes:
+                            continue
+                        grip = src_attributes.OutputGrip
+                        src_pt = output_grips[src] = (grip.X, grip.Y)
+                    dst.append(slot)
+                    if src_slots is not None:
+                        src_slots.append(src)
+                    x0.append(src_pt[0])
+                    y0.append(src_pt[1])
+                    x1.append(dst_pt.X)
+                    y1.append(dst_pt.Y)
+        
+        return dst, x0, y0, x1, y1
+    
+    def data_sizes(self, slots, branches=False):
+        """
+        {slot: data size}, reading each param at most once per solution.
+        
+        The size is VolatileDataCount, plus the tree's PathCount with
+        branches=True so wide trees of short lists weigh in too.
+        """
+        if self.data is None or self.data[0] != self.solutions:
+            self.data = (self.solutions, {}, {})
+        _, items, paths = self.data
+        params = self.params
+        sizes = {}
+        reads = 0
+        for slot in slots:
+            size = items.get(slot)
+            if size is None:
+                size = items[slot] = params[slot].VolatileDataCount
+                reads += 1
+            if branches:
+                path_count = paths.get(slot)
+                if path_count is None:
+                    path_count = paths[slot] = params[slot].VolatileData.PathCount
+                size += path_count
+            sizes[slot] = size
+        self.profiler.count("data_reads", reads)
+        return sizes
+    
+    def pivots(self):
+        """Packed pivot coordinates of every indexed object, for spotting moves"""
+        coords = array('d')
+        owners = self.owners
+        for slots in self.owner_slots.values():
+            if not slots:
+                continue
+            attributes = owners[slots[0]].Attributes
+            if attributes:
+                pivot = attributes.Pivot
+                coords.append(pivot.X)
+                coords.append(pivot.Y)
+            else:
+                coords.append(0.0)
+                coords.append(0.0)
+        return coords
+    
+    def flow_graph(self):
+        """Cached FlowGraph for the current edges"""
+        self.ensure_edges()
+        if self.flow is None:
+            with self.profiler.phase("traverse"):
+                self.flow = FlowGraph(self)
+        return self.flow
+    
+    def degree_table(self):
+        """Cached DegreeTable for the current edges"""
+        self.ensure_edges()
+        if self.degrees is None or len(self.degrees.fan_in) != len(self.params):
+            with self.profiler.phase("traverse"):
+                self.degrees = DegreeTable(self)
+        return self.degrees
+    
+    def wire_grid(self):
+        """Cached WireGrid, patched for objects that moved since the last query"""
+        self.ensure_edges()
+        grid = self.grid
+        if (grid is None or grid.generation != self.generation or grid.edge_serial != self.edge_serial
+                or grid.dead * 2 > len(grid.dst)):
+            self.grid = WireGrid(self).build()
+        else:
+            grid.update()
+        return self.grid
+    
+    def memberships(self):
+        """Cached MembershipIndex, kept current from document events"""
+        self.ensure()
+        if self.members is None or self.members.generation != self.generation:
+            # Events are not followed while the index is unbuilt, so look again
+            self.members = MembershipIndex(self, self.members)
+        return self.members
+    
+    def invalidate(self):
+        """Force a full rebuild on next use"""
+        self.built = False
+        self.edges_valid = False
+    
+    def invalidate_edges(self):
+        """Force edges to be re-read on next use"""
+        self.edges_valid = False
+    
+    # ---------- document events ----------
+    
+    def attach(self):
+        """Subscribe to document events so the index stays current"""
+        if self.doc is not None and not self.attached:
+            self.doc.ObjectsAdded += self._on_objects_added
+            self.doc.ObjectsDeleted += self._on_objects_deleted
+            self.doc.SolutionStart += self._on_solution_start
+            self.attached = True
+        return self
+    
+    def detach(self):
+        """Unsubscribe from document events"""
+        if self.doc is not None and self.attached:
+            self.doc.ObjectsAdded -= self._on_objects_added
+            self.doc.ObjectsDeleted -= self._on_objects_deleted
+            self.doc.SolutionStart -= self._on_solution_start
+            self.attached = False
+        if self.members is not None:
+            self.members.close()
+            self.members = None
+    
+    def _on_objects_added(self, sender, e):
+        if not self.built:
+            return
+        for obj in e.Objects:
+            if obj.InstanceGuid not in self.owner_slots:
+                self._add_object(obj)
+            if self.members is not None:
+                self.members.add(obj)
+        self.edges_valid = False
+    
+    def _on_objects_deleted(self, sender, e):
+        if not self.built:
+            return
+        for obj in e.Objects:
+            self._remove_object(obj)
+            if self.members is not None:
+                self.members.remove(obj)
+        self.edges_valid = False
+        # Compact once tombstones outnumber live params
+        if self.removed * 2 > len(self.params):
+            self.built = False
+    
+    def _on_solution_start(self, sender, e):
+        self.edges_valid = False
+        self.check_params = True
+        self.solutions += 1
+
+
+# ==================== WIRE FLOW ====================
+
+class FlowGraph:
+    """
+    Param-level dependency graph packed into CSR arrays.
+    
+    Each slot's upstream neighbours are its wire sources plus, for a component
+    output, the inputs of the same component; downstream neighbours are its
+    recipients plus, for a component input, the outputs of the same component.
+    Wire edges cost one hop and edges through a component cost none, so a hop
+    limit counts wires. Built once per edge set; every trace after that is a
+    BFS over the packed arrays.
+    """
+    
+    def __init__(self, index):
+        self.up = self._pack(index, index.sources, WireIndex.OUTPUT, WireIndex.INPUT)
+        self.down = self._pack(index, index.recipients, WireIndex.INPUT, WireIndex.OUTPUT)
+    
+    @staticmethod
+    def _pack(index, wires, through_kind, other_kind):
+        """(offsets, targets, costs) for one direction"""
+        offsets, targets, costs = array('l', [0]), array('l'), array('b')
+        params, owners, kinds = index.params, index.owners, index.kinds
+        for slot in range(len(params)):
+            if params[slot] is not None:
+                for other in wires[slot]:
+                    targets.append(other)
+                    costs.append(1)
+                if kinds[slot] == through_kind:
+                    for other in index.owner_slots.get(owners[slot].InstanceGuid, ()):
+                        if kinds[other] == other_kind:
+                            targets.append(other)
+                            costs.append(0)
+            offsets.append(len(targets))
+        return offsets, targets, costs
+    
+    def trace(self, starts, upstream=True, hops=None):
+        """
+        Slots whose incoming wires lie on a dependency path of the starts.
+        
+        A 0-1 BFS from the start slots, crossing at most hops wires (no limit
+        when hops is None). Wire display is per destination param, so the
+        result is the set of params at the receiving end of traversed wires.
+        """
+        offsets, targets, costs = self.up if upstream else self.down
+        limit = len(offsets) if hops is None else hops
+        depth = {}
+        queue = collections.deque()
+        for slot in starts:
+            if depth.get(slot, 1) > 0:
+                depth[slot] = 0
+                queue.append((slot, 0))
+        
+        shown = set()
+        while queue:
+            slot, d = queue.popleft()
+            if d > depth[slot]:
+                continue
+            for i in range(offsets[slot], offsets[slot + 1]):
+                other = targets[i]
+                nd = d + costs[i]
+                if nd > limit:
+                    continue
+                if costs[i]:
+                    shown.add(slot if upstream else other)
+                if nd < depth.get(other, nd + 1):
+                    depth[other] = nd
+                    if costs[i]:
+                        queue.append((other, nd))
+                    else:
+                        queue.appendleft((other, nd))
+        return shown
+
+
+def parse_hops(text):
+    """Hop limit from Target ('3' or 'Hops=3'); None means no limit"""
+    text = str(text).strip()
+    if text.lower().startswith("hops"):
+        text = text[4:].lstrip(" =:")
+    return int(text) if text.isdigit() else None
+
+
+# ==================== WIRE DEGREES ====================
+
+DEFAULT_FANOUT = ("Absolute", 10.0)         # CLEAN_FANOUT: outputs feeding 10+ inputs
+DEFAULT_LONG_HAUL = ("Percentile", 95.0)    # WIRE_STATS: the 5% of wires spanning most levels
+
+
+class DegreeTable:
+    """
+    Fan-in, fan-out and dependency level of every param slot, packed.
+    
+    Built in one pass over the index's source and recipient lists and
+    cached per edge set like the FlowGraph. A slot's level is the number of
+    wires on the longest path feeding it (a component's outputs share the
+    level of its deepest input), so level[target] - level[source] says how
+    far across the graph a wire reaches.
+    """
+    
+    def __init__(self, index):
+        params = index.params
+        sources = index.sources
+        recipients = index.recipients
+        self.fan_in = array('l')
+        self.fan_out = array('l')
+        for slot in range(len(params)):
+            live = params[slot] is not None
+            self.fan_in.append(len(sources[slot]) if live else 0)
+            self.fan_out.append(len(recipients[slot]) if live else 0)
+        self.levels = self._levels(index.flow_graph().up, params)
+    
+    @staticmethod
+    def _levels(up, params):
+        """Longest upstream path per slot, in wires (iterative, cycle-safe)"""
+        offsets, targets, costs = up
+        levels = array('l', [0]) * len(params)
+        state = bytearray(len(params))     # 0 new, 1 visiting, 2 done
+        for start in range(len(params)):
+            if state[start] or params[start] is None:
+                continue
+            stack = [start]
+            while stack:
+                slot = stack[-1]
+                if state[slot] == 0:
+                    state[slot] = 1
+                    for k in range(offsets[slot], offsets[slot + 1]):
+                        if state[targets[k]] == 0:
+                            stack.append(targets[k])
+                    continue
+                stack.pop()
+                if state[slot] == 2:
+                    continue
+                level = 0
+                for k in range(offsets[slot], offsets[slot + 1]):
+                    if state[targets[k]] == 2:
+                        level = max(level, levels[targets[k]] + costs[k])
+                levels[slot] = level
+                state[slot] = 2
+        return levels
+    
+    def cut(self, threshold, values=None):
+        """Absolute threshold, or the percentile of values (default: fan-out of outputs with recipients)"""
+        kind, value = threshold
+        if kind == "Percentile":
+            if values is None:
+                values = [degree for degree in self.fan_out if degree]
+            return percentile(values, value) if values else math.inf
+        return value
+
+
+class WireStats:
+    """
+    Per-wire report for WIRE_STATS.
+    
+    For every drawn wire: source and target slot, length, the source's
+    fan-out, the target's fan-in and its level span, read from the cached
+    DegreeTable. Long-haul wires span at least min_span levels (never less
+    than 2, so a wire to the next component is not one).
+    """
+    
+    COLUMNS = ["source", "source_name", "target", "target_name", "length", "fan_out", "fan_in", "span",
+               "long_haul"]
+    
+    def __init__(self, index, table, dst, src, lengths, threshold):
+        self.index = index
+        self.table = table
+        self.dst = dst
+        self.src = src
+        self.lengths = lengths.tolist() if np is not None else list(lengths)
+        levels = table.levels
+        self.spans = [levels[d] - levels[s] for d, s in zip(dst, src)]
+        cut = table.cut(threshold, self.spans)
+        # Spans are whole levels, so an interpolated percentile rounds up
+        self.min_span = max(2, math.ceil(cut) if cut < math.inf else cut)
+        self.long_haul = sum(1 for span in self.spans if span >= self.min_span)
+    
+    def __len__(self):
+        return len(self.dst)
+    
+    def name(self, slot):
+        """Owner.Param nickname of a slot"""
+        param = self.index.params[slot]
+        owner = self.index.owners[slot]
+        return param.NickName if owner is param else f"{owner.NickName}.{param.NickName}"
+    
+    @staticmethod
+    def _figures(values):
+        if not values:
+            return {"max": 0, "mean": 0, "p50": 0, "p95": 0}
+        return {"max": max(values), "mean": round(sum(values) / len(values), 3),
+                "p50": percentile(values, 50), "p95": percentile(values, 95)}
+    
+    def summary(self):
+        """Summary figures, JSON-ready"""
+        table = self.table
+        fan_out = {src: table.fan_out[src] for src in self.src}
+        fan_in = {dst: table.fan_in[dst] for dst in self.dst}
+        busiest = sorted(fan_out, key=lambda slot: -fan_out[slot])[:5]
+        lengths = self._figures(self.lengths)
+        lengths["min"] = min(self.lengths) if self.lengths else 0
+        return {
+            "wires": len(self),
+            "fan_out": dict(self._figures(list(fan_out.values())),
+                            top=[{"param": str(self.index.params[slot].InstanceGuid), "name": self.name(slot),
+                                  "recipients": fan_out[slot]} for slot in busiest]),
+            "fan_in": self._figures(list(fan_in.values())),
+            "length": lengths,
+            "levels": max(table.levels) + 1 if len(table.levels) else 0,
+            "long_haul": {"min_span": self.min_span, "wires": self.long_haul},
+        }
+    
+    def rows(self):
+        """One list per wire, in COLUMNS order"""
+        params = self.index.params
+        fan_out = self.table.fan_out
+        fan_in = self.table.fan_in
+        names = {}
+        for dst, src, length, span in zip(self.dst, self.src, self.lengths, self.spans):
+            for slot in (src, dst):
+                if slot not in names:
+                    names[slot] = self.name(slot)
+            yield [str(params[src].InstanceGuid), names[src], str(params[dst].InstanceGuid), names[dst],
+                   round(length, 3), fan_out[src], fan_in[dst], span, span >= self.min_span]
+    
+    def export(self, path):
+        """Write the report as CSV, or as JSON (summary plus one list per column) for a .json path"""
+        with open(path, "w", newline="", encoding="utf-8") as handle:
+            if path.lower().endswith(".json"):
+                columns = {name: [] for name in self.COLUMNS}
+                for row in self.rows():
+                    for name, value in zip(self.COLUMNS, row):
+                        columns[name].append(value)
+                json.dump({"summary": self.summary(), "wires": columns}, handle)
+            else:
+                writer = csv.writer(handle)
+                writer.writerow(self.COLUMNS)
+                writer.writerows(self.rows())
+
+
+def parse_threshold(text, default):
+    """
+    ("Absolute", value) or ("Percentile", q) from a Target such as "40",
+    "Percentile:95" or "Quantile:0.95"; default for an empty Target.
+    """
+    text = str(text or "").strip()
+    if text in ("", "All"):
+        return default
+    name, sep, value = text.partition(":")
+    name = name.strip().capitalize()
+    try:
+        if not sep:
+            return "Absolute", float(text)
+        if name == "Percentile":
+            return "Percentile", float(value)
+        if name == "Quantile":
+            return "Percentile", float(value) * 100.0
+    except ValueError:
+        pass
+    raise ValueError(f"Expected a number, Percentile:<q> or Quantile:<q>, got '{text}'")
+
+
+STATS_EXPORTS = (".csv", ".json")
+
+
+def parse_stats_target(text):
+    """
+    (long-haul threshold, export path or None) from a WIRE_STATS Target such
+    as 'Percentile:99 wires.csv'. Only a name ending in .csv or .json is an
+    export path; a path with spaces needs the threshold in front of it.
+    """
+    text = str(text or "").strip()
+    if text in ("", "All"):
+        return DEFAULT_LONG_HAUL, None
+    if " " not in text and text.lower().endswith(STATS_EXPORTS):
+        return DEFAULT_LONG_HAUL, text
+    first, _, path = text.partition(" ")
+    path = path.strip() or None
+    if path is not None and not path.lower().endswith(STATS_EXPORTS):
+        raise ValueError(f"WIRE_STATS exports to a .csv or .json file, got '{path}'")
+    return parse_threshold(first, DEFAULT_LONG_HAUL), path
+
+
+# ==================== WIRE GRID ====================
+
+class WireGrid:
+    """
+    Uniform grid over wire bounding boxes, for viewport queries.
+    
+    Each wire (source OutputGrip to destination InputGrip) is registered in
+    every cell its box overlaps; wires spanning more than MAX_CELLS cells go
+    to a short list that every query scans instead. update() compares each
+    object's pivot with the one its wires were read at and re-reads only the
+    wires ending at, or leaving, objects that moved. A wiring change or an
+    index rebuild starts a new grid.
+    """
+    
+    CELL = 256.0        # cell side in canvas units
+    MAX_CELLS = 64
+    
+    def __init__(self, index):
+        self.index = index
+        self.generation = index.generation
+        self.edge_serial = index.edge_serial
+        self.cells = {}         # (column, row) -> wire ids
+        self.large = []         # ids of wires spanning too many cells
+        self.dst = array('l')   # destination slot per wire
+        self.boxes = array('d') # left, top, right, bottom per wire
+        self.alive = bytearray()
+        self.dead = 0
+        self.wires_of = {}      # destination slot -> wire ids
+        self.pivots = {}        # owner InstanceGuid -> pivot its wires were read at
+        self.moved = 0          # objects re-read by the last update()
+    
+    def build(self):
+        """Read every wire"""
+        self._moved_slots()
+        self._insert(*self.index.wire_geometry())
+        return self
+    
+    def update(self):
+        """Re-read the wires of objects that moved (or appeared) since they were read"""
+        moved = self._moved_slots()
+        if not moved:
+            return self
+        affected = set(moved)
+        recipients = self.index.recipients
+        for slot in moved:
+            affected.update(recipients[slot])
+        alive = self.alive
+        for slot in affected:
+            for wire in self.wires_of.pop(slot, ()):
+                alive[wire] = 0
+                self.dead += 1
+        self._insert(*self.index.wire_geometry(sorted(affected)))
+        return self
+    
+    def _moved_slots(self):
+        index = self.index
+        owners = index.owners
+        pivots = self.pivots
+        moved = []
+        self.moved = 0
+        with index.profiler.phase("grips"):
+            for guid, slots in index.owner_slots.items():
+                if not slots:
+                    continue
+                attributes = owners[slots[0]].Attributes
+                pivot = (attributes.Pivot.X, attributes.Pivot.Y) if attributes else (0.0, 0.0)
+                if pivots.get(guid) != pivot:
+                    pivots[guid] = pivot
+                    moved.extend(slots)
+                    self.moved += 1
+        return moved
+    
+    def _insert(self, dst, x0, y0, x1, y1):
+        cell = self.CELL
+        cells = self.cells
+        for i in range(len(dst)):
+            left, right = (x0[i], x1[i]) if x0[i] <= x1[i] else (x1[i], x0[i])
+            top, bottom = (y0[i], y1[i]) if y0[i] <= y1[i] else (y1[i], y0[i])
+            wire = len(self.dst)
+            self.dst.append(dst[i])
+            self.boxes.extend((left, top, right, bottom))
+            self.alive.append(1)
+            self.wires_of.setdefault(dst[i], []).append(wire)
+            c0, c1 = int(math.floor(left / cell)), int(math.floor(right / cell))
+            r0, r1 = int(math.floor(top / cell)), int(math.floor(bottom / cell))
+            if (c1 - c0 + 1) * (r1 - r0 + 1) > self.MAX_CELLS:
+                self.large.append(wire)
+                continue
+            for column in range(c0, c1 + 1):
+                for row in range(r0, r1 + 1):
+                    cells.setdefault((column, row), []).append(wire)
+    
+    def query(self, left, top, right, bottom):
+        """Destination slots of wires whose box overlaps the rectangle"""
+        cell = self.CELL
+        c0, c1 = int(math.floor(left / cell)), int(math.floor(right / cell))
+        r0, r1 = int(math.floor(top / cell)), int(math.floor(bottom / cell))
+        if (c1 - c0 + 1) * (r1 - r0 + 1) <= len(self.cells):
+            buckets = [self.cells.get((column, row), ())
+                       for column in range(c0, c1 + 1) for row in range(r0, r1 + 1)]
+        else:
+            # Zoomed far out: walk the occupied cells instead of the empty ones
+            buckets = [wires for (column, row), wires in self.cells.items()
+                       if c0 <= column <= c1 and r0 <= row <= r1]
+        buckets.append(self.large)
+        
+        boxes, alive, dst = self.boxes, self.alive, self.dst
+        found = set()
+        for wires in buckets:
+            for wire in wires:
+                if not alive[wire] or dst[wire] in found:
+                    continue
+                b = wire * 4
+                if boxes[b] <= right and boxes[b + 2] >= left and boxes[b + 1] <= bottom and boxes[b + 3] >= top:
+                    found.add(dst[wire])
+        return found
+
+
+# ==================== MEMBERSHIP ====================
+
+class MembershipIndex:
+    """
+    Groups and clusters of a document, for GROUP: and CLUSTER scopes.
+    
+    Found in one walk of doc.Objects and then kept current from the
+    WireIndex's document events, so scoping an action never rescans the
+    document. A group's members are resolved to top-level objects through
+    the index's owner slots (nested groups add theirs) and cached until
+    objects are added or deleted or the group's ObjectIDs change. Each
+    cluster's document gets an engine of its own, kept while the cluster
+    and its document stay the same.
+    """
+    
+    def __init__(self, index, previous=None):
+        self.index = index
+        self.generation = index.generation
+        self.groups = {}    # InstanceGuid -> GH_Group
+        self.clusters = {}  # InstanceGuid -> GH_Cluster
+        self.cache = {}     # group InstanceGuid -> (ObjectIDs, [top-level objects])
+        self.engines = {}   # cluster InstanceGuid -> WireHopperPython of its document
+        with index.profiler.phase("traverse"):
+            for obj in index.doc.Objects:
+                self.add(obj)
+        if previous is not None:
+            for guid, engine in previous.engines.items():
+                if guid in self.clusters:
+                    self.engines[guid] = engine
+                else:
+                    engine.close()
+    
+    def add(self, obj):
+        if isinstance(obj, GH_Group):
+            self.groups[obj.InstanceGuid] = obj
+        elif isinstance(obj, GH_Cluster):
+            self.clusters[obj.InstanceGuid] = obj
+        self.cache = {}
+    
+    def remove(self, obj):
+        self.groups.pop(obj.InstanceGuid, None)
+        self.clusters.pop(obj.InstanceGuid, None)
+        engine = self.engines.pop(obj.InstanceGuid, None)
+        if engine is not None:
+            engine.close()
+        self.cache = {}
+    
+    def close(self):
+        """Close the engines of cluster documents"""
+        for engine in self.engines.values():
+            engine.close()
+        self.engines = {}
+    
+    def find_groups(self, name):
+        """Groups whose name is name, ignoring case"""
+        name = name.lower()
+        return [group for group in self.groups.values() if group.NickName.lower() == name]
+    
+    def objects_of(self, group, seen=None):
+        """Top-level objects in a group, including those of groups nested in it"""
+        ids = list(group.ObjectIDs)
+        cached = self.cache.get(group.InstanceGuid)
+        if cached is not None and cached[0] == ids:
+            return cached[1]
+        
+        seen = seen or {group.InstanceGuid}
+        index = self.index
+        objects = {}
+        for guid in ids:
+            nested = self.groups.get(guid)
+            if nested is not None:
+                if guid not in seen:
+                    seen.add(guid)
+                    for obj in self.objects_of(nested, seen):
+                        objects.setdefault(obj.InstanceGuid, obj)
+                continue
+            slots = index.owner_slots.get(guid)
+            if slots and index.owners[slots[0]] is not None:
+                objects.setdefault(guid, index.owners[slots[0]])
+        
+        result = list(objects.values())
+        self.cache[group.InstanceGuid] = (ids, result)
+        return result
+    
+    def cluster_engines(self, name=None):
+        """
+        (clusters from the top level down, engine of the innermost one's
+        document) for every cluster, nested ones included. name limits the
+        top-level clusters; password-protected clusters are skipped.
+        """
+        result = []
+        for guid, cluster in self.clusters.items():
+            if name is not None and cluster.NickName.lower() != name.lower():
+                continue
+            document = cluster.Document("")
+            if document is None:
+                continue
+            engine = self.engines.get(guid)
+            if engine is None or not same_document(engine.doc, document):
+                if engine is not None:
+                    engine.close()
+                engine = self.engines[guid] = WireHopperPython(document)
+            result.append(([cluster], engine))
+            for path, inner in engine.index.memberships().cluster_engines():
+                result.append(([cluster] + path, inner))
+        return result
+
+
+# ==================== WIRE LENGTHS ====================
+
+def wire_lengths(x0, y0, x1, y1):
+    """
+    Euclidean length of every wire in packed coordinate arrays.
+    
+    Uses one batched NumPy pass when NumPy is available and a pure-Python loop
+    otherwise; both evaluate sqrt(dx*dx + dy*dy) in double precision, so the
+    results are identical. Returns a NumPy array or an array('d').
+    """
+    if np is not None:
+        dx = np.frombuffer(x0, dtype=np.float64) - np.frombuffer(x1, dtype=np.float64)
+        dy = np.frombuffer(y0, dtype=np.float64) - np.frombuffer(y1, dtype=np.float64)
+        return np.sqrt(dx * dx + dy * dy)
+    
+    sqrt = math.sqrt
+    lengths = array('d')
+    for ax, ay, bx, by in zip(x0, y0, x1, y1):
+        dx = ax - bx
+        dy = ay - by
+        lengths.append(sqrt(dx * dx + dy * dy))
+    return lengths
+
+
+def select_kth(values, k):
+    """k-th smallest value (0-based) in expected linear time (quickselect)"""
+    items = list(values)
+    while True:
+        if len(items) == 1:
+            return items[0]
+        # Median of three keeps already-sorted input linear
+        a, b, c = items[0], items[len(items) // 2], items[-1]
+        pivot = sorted((a, b, c))[1]
+        lows = [v for v in items if v < pivot]
+        if k < len(lows):
+            items = lows
+            continue
+        equal = sum(1 for v in items if v == pivot)
+        if k < len(lows) + equal:
+            return pivot
+        k -= len(lows) + equal
+        items = [v for v in items if v > pivot]
+
+
+def percentile(values, q):
+    """
+    q-th percentile (0-100) with linear interpolation, matching NumPy's default.
+    
+    Only the one or two order statistics needed are selected (np.partition or
+    select_kth), so the cost is linear rather than a full sort.
+    """
+    n = len(values)
+    if n == 0:
+        return 0.0
+    position = (n - 1) * min(max(q, 0.0), 100.0) / 100.0
+    lo = int(math.floor(position))
+    fraction = position - lo
+    hi = min(lo + 1, n - 1)
+    
+    if np is not None:
+        ordered = np.partition(np.asarray(values, dtype=np.float64), [lo, hi])
+        low_value, high_value = float(ordered[lo]), float(ordered[hi])
+    else:
+        low_value = select_kth(values, lo)
+        high_value = select_kth(values, hi) if fraction else low_value
+    
+    return low_value + (high_value - low_value) * fraction
+
+
+def length_tiers(lengths, tiers="Thirds", cuts=None):
+    """
+    (lower cut, upper cut) for AUTO_LENGTH and CLEAN_DATA.
+    
+    "Thirds" splits the range at max/3 and 2*max/3 and "Log" does the same
+    on a log scale (log(1 + x)), so tiers follow orders of magnitude.
+    "Percentile" takes two percentiles (default 33.3 and 66.7) and
+    "Quantile" the same as fractions, so a single outlier no longer
+    flattens every tier.
+    """
+    if tiers in ("Thirds", "Log"):
+        max_length = float(np.max(lengths)) if np is not None else max(lengths)
+        if tiers == "Log":
+            top = math.log1p(max(max_length, 0.0))
+            return math.expm1(top / 3.0), math.expm1(top * 2.0 / 3.0)
+        return max_length / 3.0, max_length * 2.0 / 3.0
+    
+    if tiers == "Quantile":
+        cuts = [c * 100.0 for c in cuts] if cuts else None
+    elif tiers != "Percentile":
+        raise ValueError(f"Unknown tier mode: {tiers}")
+    
+    low, high = sorted(cuts) if cuts else (100.0 / 3.0, 200.0 / 3.0)
+    return percentile(lengths, low), percentile(lengths, high)
+
+
+def parse_tiers(text):
+    """Parse a Target such as "Percentile:80,95" or "Log" into (tiers, cuts)"""
+    name, _, values = (text or "").partition(":")
+    name = name.strip().capitalize()
+    if name == "Log":
+        return "Log", None
+    if name not in ["Percentile", "Quantile"]:
+        return "Thirds", None
+    cuts = [float(v) for v in values.replace(";", ",").split(",") if v.strip()]
+    if cuts and len(cuts) != 2:
+        raise ValueError(f"{name} tiers need two cut points, got {len(cuts)}")
+    return name, cuts or None
+
+
+def parse_data_tiers(text):
+    """Parse a CLEAN_DATA Target such as "Log Branches" into (tiers, cuts, branches)"""
+    words = (text or "").split()
+    branches = any(word.lower() == "branches" for word in words)
+    tiers, cuts = parse_tiers(" ".join(word for word in words if word.lower() != "branches"))
+    return tiers, cuts, branches
+
+
+# ==================== PARAM CLASSIFICATION ====================
+
+# Built-in groups for CLEAN_GEOMETRY/NUMBERS/TEXT/BOOLEAN/COLORS
+DEFAULT_PARAM_GROUPS = {
+    "Geometry": [Param_Geometry, Param_Brep, Param_Surface, Param_Mesh, 
+                Param_Curve, Param_Point, Param_Vector, Param_Line, 
+                Param_Arc, Param_Circle, Param_Plane, Param_Box],
+    "Numbers": [Param_Number, Param_Integer, Param_Complex, Param_Interval],
+    "Text": [Param_String],
+    "Boolean": [Param_Boolean],
+    "Colors": [Param_Colour]
+}
+
+CLASSIFIER_KEY = "WireHopper.ParamClassifier"
+
+
+class ParamClassifier:
+    """
+    Param type -> group classification, computed once per concrete type.
+    
+    A group lists param classes (matched with issubclass) and/or type name
+    patterns such as "Param_LB*" (matched against the type and its bases),
+    so plugin param types can be grouped without importing their assembly.
+    The first lookup of a type tests it against every group; after that it
+    is a dict lookup. Registering a group clears the cache.
+    """
+    
+    def __init__(self):
+        self.groups = {name: list(types) for name, types in DEFAULT_PARAM_GROUPS.items()}
+        self.cache = {}         # param type -> frozenset of group names
+    
+    def register(self, name, types):
+        """Add a group, or extend an existing one, with classes or type name patterns"""
+        self.groups.setdefault(name, []).extend(types)
+        self.cache.clear()
+    
+    def find(self, name):
+        """Registered group name matching name case-insensitively, or None"""
+        name = name.strip().lower()
+        for group in self.groups:
+            if group.lower() == name:
+                return group
+        return None
+    
+    def groups_of(self, param_type):
+        """Names of the groups a concrete param type belongs to"""
+        groups = self.cache.get(param_type)
+        if groups is None:
+            groups = self.cache[param_type] = frozenset(
+                name for name, types in self.groups.items() if self._matches(param_type, types))
+        return groups
+    
+    def _matches(self, param_type, types):
+        names = None
+        for t in types:
+            if isinstance(t, str):
+                if names is None:
+                    names = set()
+                    for base in param_type.__mro__:
+                        names.add(base.__name__)
+                        names.add(f"{base.__module__}.{base.__name__}")
+                if any(fnmatch.fnmatchcase(n, t) for n in names):
+                    return True
+            elif param_type == t or issubclass(param_type, t):
+                return True
+        return False
+
+
+def shared_classifier():
+    """ParamClassifier kept in scriptcontext.sticky so it survives component solves"""
+    classifier = sc.sticky.get(CLASSIFIER_KEY)
+    if classifier is None:
+        classifier = sc.sticky[CLASSIFIER_KEY] = ParamClassifier()
+    return classifier
+
+
+def parse_group(text):
+    """Parse a Target such as "Ladybug:Param_LB*,LadybugParam" into (name, patterns)"""
+    name, _, values = (text or "").partition(":")
+    patterns = [v.strip() for v in values.split(",") if v.strip()]
+    if not name.strip() or not patterns:
+        raise ValueError("Target must look like 'GroupName:TypeName1,TypeName2'")
+    return name.strip(), patterns
+
+
+# ==================== WIRE RULES ====================
+
+class WireRule:
+    """
+    A cleanup rule evaluated one param at a time.
+    
+    prepare() reads what the rule needs for a list of param slots (None for
+    every param) and returns True when a document-wide threshold it depends
+    on has moved, meaning params outside the list may now decide differently.
+    decide() then returns the wire mode for one slot, or None to leave that
+    param alone. Rules keep their per-slot state between prepare() calls so
+    they can be updated incrementally.
+    """
+    
+    name = "RULE"
+    uses_data = False   # decisions depend on solution results (VolatileData)
+    
+    def prepare(self, hopper, index, slots=None):
+        return False
+    
+    def decide(self, slot):
+        return None
+
+
+class LengthRule(WireRule):
+    """CLEAN_LENGTH: mode for params with any source wire longer than max_length"""
+    
+    name = "CLEAN_LENGTH"
+    
+    def __init__(self, max_length, mode):
+        self.max_length = max_length
+        self.mode = mode
+        self.long = set()
+    
+    def prepare(self, hopper, index, slots=None):
+        dst, lengths = hopper._wire_lengths(slots)
+        if np is not None:
+            long_slots = np.asarray(dst)[lengths > self.max_length].tolist()
+        else:
+            long_slots = [slot for slot, length in zip(dst, lengths) if length > self.max_length]
+        
+        if slots is None:
+            self.long = set(long_slots)
+        else:
+            self.long.difference_update(slots)
+            self.long.update(long_slots)
+        return False
+    
+    def decide(self, slot):
+        return self.mode if slot in self.long else None
+
+
+class RelativeLengthRule(WireRule):
+    """AUTO_LENGTH: tier of each param's last source wire (long hidden, middle faint, short default)"""
+    
+    name = "AUTO_LENGTH"
+    
+    def __init__(self, tiers="Thirds", cuts=None):
+        self.tiers = tiers
+        self.cuts = cuts
+        self.lengths = {}       # slot -> lengths of its drawable source wires
+        self.cut_points = None
+        self.wire_count = 0
+    
+    def prepare(self, hopper, index, slots=None):
+        dst, lengths = hopper._wire_lengths(slots)
+        if slots is None:
+            self.lengths = {}
+            all_lengths = lengths
+        else:
+            params = index.params
+            self.lengths = {slot: l for slot, l in self.lengths.items() if params[slot] is not None}
+            for slot in slots:
+                self.lengths.pop(slot, None)
+        
+        for slot, length in zip(dst, lengths.tolist() if np is not None else lengths):
+            self.lengths.setdefault(slot, []).append(length)
+        
+        if slots is not None:
+            all_lengths = [length for values in self.lengths.values() for length in values]
+        
+        previous = self.cut_points
+        self.wire_count = len(all_lengths)
+        self.cut_points = length_tiers(all_lengths, self.tiers, self.cuts) if self.wire_count else None
+        return slots is not None and self.cut_points != previous
+    
+    def decide(self, slot):
+        lengths = self.lengths.get(slot)
+        if not lengths or self.cut_points is None:
+            return None
+        tier1, tier2 = self.cut_points
+        length = lengths[-1]
+        if length >= tier2:
+            return 0  # Hidden
+        if length >= tier1:
+            return 1  # Faint
+        return 2  # Default
+
+
+class DataSizeRule(WireRule):
+    """CLEAN_DATA: Default for the most data, Faint for medium, Hidden for the least"""
+    
+    name = "CLEAN_DATA"
+    uses_data = True
+    
+    def __init__(self, tiers="Thirds", cuts=None, branches=False):
+        self.tiers = tiers
+        self.cuts = cuts
+        self.branches = branches    # add branch count to item count
+        self.counts = {}            # slot -> data size
+        self.cut_points = None
+    
+    def prepare(self, hopper, index, slots=None):
+        params = index.params
+        with hopper.profiler.phase("data"):
+            if slots is None:
+                self.counts = index.data_sizes(index.live_slots(), self.branches)
+            else:
+                self.counts = {slot: c for slot, c in self.counts.items() if params[slot] is not None}
+                self.counts.update(index.data_sizes(slots, self.branches))
+        
+        previous = self.cut_points
+        if self.tiers == "Thirds":
+            max_count = max(self.counts.values()) if self.counts else 0
+            if max_count == 0:
+                max_count = 1
+            self.cut_points = (max_count / 3, max_count * 2 / 3)
+        else:
+            self.cut_points = length_tiers(list(self.counts.values()) or [0], self.tiers, self.cuts)
+        return slots is not None and self.cut_points != previous
+    
+    def decide(self, slot):
+        data_count = self.counts.get(slot)
+        if data_count is None:
+            return None
+        tier1, tier2 = self.cut_points
+        if data_count >= tier2:
+            return 2  # Default (most data)
+        if data_count >= tier1:
+            return 1  # Faint (medium data)
+        return 0  # Hidden (least data)
+
+
+class FanoutRule(WireRule):
+    """
+    CLEAN_FANOUT: mode for params whose every source feeds at least cut
+    recipients. Wire display is per input, so an input that also has a
+    wire from an ordinary output is left alone.
+    """
+    
+    name = "CLEAN_FANOUT"
+    
+    def __init__(self, threshold, mode):
+        self.threshold = threshold  # ("Absolute", recipients) or ("Percentile", q)
+        self.mode = mode
+        self.table = None
+        self.cut = None
+    
+    def prepare(self, hopper, index, slots=None):
+        previous = (self.table, self.cut)
+        self.table = index.degree_table()
+        self.sources = index.sources
+        # A single recipient is not fan-out, whatever the percentile says
+        self.cut = max(2, self.table.cut(self.threshold))
+        return slots is not None and (self.table is not previous[0] or self.cut != previous[1])
+    
+    def decide(self, slot):
+        sources = self.sources[slot]
+        fan_out = self.table.fan_out
+        if sources and all(fan_out[src] >= self.cut for src in sources):
+            return self.mode
+        return None
+
+
+class PreviewRule(WireRule):
+    """SYNC_PREVIEW: Default for params whose object previews, Hidden otherwise"""
+    
+    name = "SYNC_PREVIEW"
+    
+    def prepare(self, hopper, index, slots=None):
+        self.owners = index.owners
+        self.modes = {}
+        return False
+    
+    def decide(self, slot):
+        owner = self.owners[slot]
+        mode = self.modes.get(id(owner))
+        if mode is None:
+            mode = self.modes[id(owner)] = preview_mode(owner)
+        return mode
+
+
+class TypeRule(WireRule):
+    """CLEAN_<GROUP>: mode for params whose type belongs to a param group"""
+    
+    def __init__(self, group, mode, include_inputs=True, include_outputs=True):
+        self.name = "CLEAN_" + group.upper()
+        self.group = group
+        self.mode = mode
+        self.include_inputs = include_inputs
+        self.include_outputs = include_outputs
+    
+    def prepare(self, hopper, index, slots=None):
+        self.groups_of = hopper.classifier.groups_of
+        self.params = index.params
+        self.kinds = index.kinds
+        return False
+    
+    def decide(self, slot):
+        kind = self.kinds[slot]
+        if kind == WireIndex.INPUT and not self.include_inputs:
+            return None
+        if kind == WireIndex.OUTPUT and not self.include_outputs:
+            return None
+        if self.group in self.groups_of(type(self.params[slot])):
+            return self.mode
+        return None
+
+
+def preview_mode(obj):
+    """Default (2) for objects whose preview is on, Hidden (0) otherwise"""
+    preview_on = True
+    
+    # Check if object has preview capability
+    if hasattr(obj, 'IsPreviewCapable') and hasattr(obj, 'Hidden'):
+        preview_on = obj.IsPreviewCapable and not obj.Hidden
+    
+    return 2 if preview_on else 0  # Default or Hidden
+
+
+def split_spec(line):
+    """
+    Words of a spec line; double quotes group words with spaces. Backslashes
+    and apostrophes are plain characters, so Windows paths and nicknames such
+    as Bob's survive.
+    """
+    lexer = shlex.shlex(line, posix=True)
+    lexer.whitespace_split = True
+    lexer.commenters = ""
+    lexer.escape = ""
+    lexer.quotes = '"'
+    try:
+        return list(lexer)
+    except ValueError:
+        raise ValueError(f"Unbalanced double quote in '{line}'")
+
+
+def parse_rule_spec(line, mode=2, target="All", length=1000.0):
+    """Split "CLEAN_LENGTH Length=1500 Mode=0" into (action, mode, target, length)"""
+    # Values with spaces can be quoted: PIPELINE Target="AUTO_LENGTH; CLEAN_DATA"
+    parts = split_spec(line)
+    action = parts[0].upper()
+    for part in parts[1:]:
+        key, sep, value = part.partition("=")
+        key = key.strip().lower()
+        if not sep:
+            raise ValueError(f"Expected Key=Value in '{line}', got '{part}'")
+        if key == "mode":
+            mode = int(value)
+        elif key == "target":
+            target = value
+        elif key == "length":
+            length = float(value)
+        else:
+            raise ValueError(f"Unknown override '{key}' in '{line}' (use Mode, Target or Length)")
+    return action, mode, target, length
+
+
+def split_specs(text):
+    """Rule/action specs from a ';' or newline separated string"""
+    return [line.strip() for line in (text or "").replace(";", "\n").splitlines() if line.strip()]
+
+
+def make_rule(action, mode=2, target="All", length=1000.0, classifier=None):
+    """WireRule for a cleanup action name"""
+    action = action.upper()
+    if action == "CLEAN_LENGTH":
+        return LengthRule(length, mode)
+    if action == "AUTO_LENGTH":
+        return RelativeLengthRule(*parse_tiers(target))
+    if action == "CLEAN_DATA":
+        return DataSizeRule(*parse_data_tiers(target))
+    if action == "SYNC_PREVIEW":
+        return PreviewRule()
+    if action == "CLEAN_FANOUT":
+        return FanoutRule(parse_threshold(target, DEFAULT_FANOUT), mode)
+    if action.startswith("CLEAN_"):
+        group = (classifier or shared_classifier()).find(action[6:])
+        if group:
+            return TypeRule(group, mode)
+    raise ValueError(f"{action} cannot be used as a rule")
+
+
+def parse_rules(text, mode=2, target="All", length=1000.0, classifier=None):
+    """WireRules from specs such as "CLEAN_LENGTH Length=1500; SYNC_PREVIEW" """
+    rules = []
+    for line in split_specs(text):
+        rules.append(make_rule(*parse_rule_spec(line, mode, target, length), classifier=classifier))
+    return rules
+
+
+# ==================== WIRE VIEWS ====================
+
+VIEW_MAGIC = b"WHV1"
+VIEWS_KEY = "WireHopper.Views"
+
+
+def guid_key(guid):
+    """16-byte key for a System.Guid"""
+    return uuid.UUID(str(guid)).bytes
+
+
+def cluster_path_key(path):
+    """Key of a cluster document: the GUID keys of its clusters from the top level down"""
+    return b"".join(guid_key(cluster.InstanceGuid) for cluster in path)
+
+
+class WireView:
+    """
+    Compact snapshot of every param's wire mode.
+    
+    Params are stored as 16-byte GUID keys grouped by mode, with no
+    references to live objects, and encoded as zlib-compressed base64
+    text for storage.
+    """
+    
+    def __init__(self, name, keys_by_mode=None):
+        self.name = name
+        self.keys = keys_by_mode or {0: [], 1: [], 2: []}
+    
+    def __len__(self):
+        return sum(len(keys) for keys in self.keys.values())
+    
+    def modes(self):
+        """GUID key -> mode"""
+        return {key: mode for mode, keys in self.keys.items() for key in keys}
+    
+    def encode(self):
+        header = VIEW_MAGIC + struct.pack("<III", *(len(self.keys[mode]) for mode in (0, 1, 2)))
+        payload = header + b"".join(b"".join(self.keys[mode]) for mode in (0, 1, 2))
+        return base64.b64encode(zlib.compress(payload)).decode("ascii")
+    
+    @classmethod
+    def decode(cls, name, text):
+        payload = zlib.decompress(base64.b64decode(text))
+        if payload[:4] != VIEW_MAGIC:
+            raise ValueError(f"View '{name}' is not a WireHopper view")
+        counts = struct.unpack("<III", payload[4:16])
+        keys = {}
+        offset = 16
+        for mode, count in zip((0, 1, 2), counts):
+            keys[mode] = [payload[i:i + 16] for i in range(offset, offset + count * 16, 16)]
+            offset += count * 16
+        return cls(name, keys)
+
+
+class ViewStore:
+    """
+    Named WireViews for one document.
+    
+    Views are written to the document's ValueTable so they are saved with
+    the .gh file. Without a ValueTable they go to a JSON sidecar next to the
+    file, and unsaved documents keep them for the session in sticky.
+    """
+    
+    def __init__(self, doc):
+        self.doc = doc
+        self.table = getattr(doc, "ValueTable", None)
+        path = getattr(doc, "FilePath", None)
+        self.sidecar = path + ".wireviews.json" if path and self.table is None else None
+    
+    @property
+    def location(self):
+        if self.table is not None:
+            return "document"
+        return self.sidecar or "session"
+    
+    def names(self):
+        return sorted(self._read())
+    
+    def load(self, name):
+        text = self._read().get(name)
+        if text is None:
+            raise KeyError(f"No saved view named '{name}'")
+        return WireView.decode(name, text)
+    
+    def save(self, view):
+        views = self._read()
+        views[view.name] = view.encode()
+        self._write(views)
+    
+    def delete(self, name):
+        views = self._read()
+        if views.pop(name, None) is None:
+            return False
+        self._write(views)
+        return True
+    
+    def _read(self):
+        if self.table is not None:
+            names = [n for n in self.table.GetValue(VIEWS_KEY, "").split(";") if n]
+            return {n: self.table.GetValue(f"{VIEWS_KEY}.{n}", "") for n in names}
+        if self.sidecar:
+            if not os.path.exists(self.sidecar):
+                return {}
+            with open(self.sidecar) as handle:
+                return json.load(handle)
+        return dict(sc.sticky.get(f"{VIEWS_KEY}.{self.doc.DocumentID}", {}))
+    
+    def _write(self, views):
+        if self.table is not None:
+            for name in self._read():
+                if name not in views:
+                    self.table.SetValue(f"{VIEWS_KEY}.{name}", "")
+            for name, text in views.items():
+                self.table.SetValue(f"{VIEWS_KEY}.{name}", text)
+            self.table.SetValue(VIEWS_KEY, ";".join(sorted(views)))
+        elif self.sidecar:
+            with open(self.sidecar, "w") as handle:
+                json.dump(views, handle)
+        else:
+            sc.sticky[f"{VIEWS_KEY}.{self.doc.DocumentID}"] = views
+
+
+# ==================== WIRE BATCH ====================
+
+DEFAULT_SLICE_MS = 16   # one frame at 60 Hz
+
+class WireBatch:
+    """
+    Write-coalescing transaction for wire display changes.
+    
+    Records the desired mode per param (the last request wins), then on
+    commit writes only params whose WireDisplay actually differs, expires
+    each written layout once and refreshes the canvas once.
+    """
+    
+    def __init__(self, hopper):
+        self.hopper = hopper
+        self.pending = {}       # param InstanceGuid -> (param, GH_ParamWireDisplay)
+        self.depth = 0
+        self.written = 0
+        self.skipped = 0
+        self.refresh = False    # refresh even if no param was written
+        self.used = False       # a wire action ran inside this batch
+        self.sliced = None      # SlicedApply still writing on Idle after commit
+    
+    def set(self, param, mode):
+        """Record the desired mode for a param"""
+        self.pending[param.InstanceGuid] = (param, self.hopper.wire_modes[mode])
+    
+    def set_display(self, param, display):
+        """Record the desired GH_ParamWireDisplay for a param"""
+        self.pending[param.InstanceGuid] = (param, display)
+    
+    def display(self, param):
+        """WireDisplay the param will have once the batch commits"""
+        pending = self.pending.get(param.InstanceGuid)
+        return pending[1] if pending is not None else param.WireDisplay
+    
+    def __enter__(self):
+        self.depth += 1
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.depth -= 1
+        if self.depth == 0:
+            self.hopper._batch = None
+            if exc_type is None:
+                self.commit()
+        return False
+    
+    def commit(self):
+        """Write changed params, expire their layouts and refresh once"""
+        profiler = self.hopper.profiler
+        budget = self.hopper.slice_budget
+        plan = self.hopper.plan
+        recorder = self.hopper.recorder
+        with profiler.phase("writes"):
+            if plan is not None:
+                # Plan-only: record the writes instead of making them
+                for param, display in self.pending.values():
+                    if param.WireDisplay == display:
+                        self.skipped += 1
+                        continue
+                    plan.set_display(param, display)
+                    self.written += 1
+            elif budget:
+                # Every write is decided here; SlicedApply only spreads the writing
+                writes = [(param, display) for param, display in self.pending.values()
+                          if param.WireDisplay != display]
+                self.skipped += len(self.pending) - len(writes)
+                self.written += len(writes)
+                if recorder is not None:
+                    for param, display in writes:
+                        recorder.set_display(param, param.WireDisplay, display)
+                if writes:
+                    self.sliced = SlicedApply(self.hopper, writes, budget).start()
+            else:
+                for param, display in self.pending.values():
+                    if param.WireDisplay == display:
+                        self.skipped += 1
+                        continue
+                    if recorder is not None:
+                        recorder.set_display(param, param.WireDisplay, display)
+                    param.WireDisplay = display
+                    if param.Attributes:
+                        param.Attributes.ExpireLayout()
+                    self.written += 1
+        profiler.count("params_touched", len(self.pending))
+        profiler.count("writes", self.written)
+        profiler.count("writes_skipped", self.skipped)
+        self.pending = {}
+        
+        if plan is not None:
+            pass    # nothing on the canvas changed
+        elif self.sliced is not None and self.sliced.running:
+            pass    # the slices refresh the canvas as they go
+        elif (self.written or self.refresh) and gh.Instances.ActiveCanvas:
+            with profiler.phase("refresh"):
+                gh.Instances.ActiveCanvas.Refresh()
+            profiler.count("refreshes")
+        self.hopper.last_batch = self
+
+
+class SlicedApply:
+    """
+    Wire display writes spread over Rhino's Idle event in time-boxed slices.
+    
+    The batch decides every write up front, so only the writing itself is
+    spread out: each slice writes params until its budget is spent, then
+    refreshes the canvas and advances the status bar progress meter. The
+    first slice runs inside the solve, so small changes finish there.
+    finish() writes the rest at once and cancel() (APPLY_CANCEL or Esc) puts
+    back the displays already written, so the document ends either exactly
+    as after a one-shot commit or as it was before. A cancel also takes the
+    writes back out of the run's undo entry.
+    """
+    
+    CHECK_EVERY = 64    # writes between clock reads
+    
+    def __init__(self, hopper, writes, budget):
+        self.hopper = hopper
+        self.writes = writes    # [(param, GH_ParamWireDisplay)] in commit order
+        self.previous = []      # display each written param had before, for cancel()
+        self.restored = 0       # params cancel() put back
+        self.budget = budget    # seconds per slice
+        self.journal = None     # UndoJournal holding entry
+        self.entry = None       # UndoEntry recording the writes, trimmed by cancel()
+        self.slices = 0
+        self.running = False
+        self.state = "done"
+    
+    def start(self):
+        """Run the first slice now and schedule the rest on Idle"""
+        self._slice(self.budget)
+        if len(self.previous) < len(self.writes):
+            self.running = True
+            self.state = "running"
+            Rhino.RhinoApp.Idle += self._on_idle
+            Rhino.RhinoApp.EscapeKeyPressed += self._on_escape
+            Rhino.UI.StatusBar.ShowProgressMeter(0, len(self.writes), "WireHopper", True, True)
+            Rhino.UI.StatusBar.UpdateProgressMeter(len(self.previous), True)
+            self.hopper.sliced = self
+        return self
+    
+    def _slice(self, budget=None):
+        """Write params until budget seconds are spent (None: write the rest)"""
+        writes = self.writes
+        previous = self.previous
+        position = len(previous)
+        deadline = time.perf_counter() + budget if budget is not None else None
+        while position < len(writes):
+            end = min(len(writes), position + self.CHECK_EVERY)
+            for i in range(position, end):
+                param, display = writes[i]
+                previous.append(param.WireDisplay)
+                param.WireDisplay = display
+                if param.Attributes:
+                    param.Attributes.ExpireLayout()
+            position = end
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+        self.slices += 1
+    
+    def _on_idle(self, sender, e):
+        self._slice(self.budget)
+        if len(self.previous) < len(self.writes):
+            Rhino.UI.StatusBar.UpdateProgressMeter(len(self.previous), True)
+            if gh.Instances.ActiveCanvas:
+                gh.Instances.ActiveCanvas.Refresh()
+        else:
+            self._end("done")
+    
+    def _on_escape(self, sender, e):
+        self.cancel()
+    
+    def finish(self):
+        """Write everything left now"""
+        if self.running:
+            self._slice(None)
+            self._end("done")
+    
+    def cancel(self):
+        """Stop and restore the params already written; returns how many"""
+        if not self.running:
+            return 0
+        writes = self.writes
+        previous = self.previous
+        for i in range(len(previous) - 1, -1, -1):
+            param = writes[i][0]
+            param.WireDisplay = previous[i]
+            if param.Attributes:
+                param.Attributes.ExpireLayout()
+        self.restored = len(previous)
+        if self.entry is not None:
+            self.journal.drop_displays(self.entry)
+            self.entry = None
+        self._end("cancelled")
+        return self.restored
+    
+    def _end(self, state):
+        self.running = False
+        self.state = state
+        Rhino.RhinoApp.Idle -= self._on_idle
+        Rhino.RhinoApp.EscapeKeyPressed -= self._on_escape
+        Rhino.UI.StatusBar.HideProgressMeter()
+        if self.hopper.sliced is self:
+            self.hopper.sliced = None
+        self.hopper.last_sliced = self
+        if gh.Instances.ActiveCanvas:
+            gh.Instances.ActiveCanvas.Refresh()
+    
+    def status(self):
+        """One-line summary for Info"""
+        if self.state == "cancelled":
+            return (f"Wire apply cancelled: {self.restored}/{len(self.writes)} params rolled back "
+                    f"after {self.slices} slices of {self.budget * 1000:g} ms")
+        return (f"Wire apply {self.state}: {len(self.previous)}/{len(self.writes)} params "
+                f"in {self.slices} slices of {self.budget * 1000:g} ms")
+
+
+def parse_slice(value):
+    """Seconds per slice from the Slice input (True or milliseconds), None when off"""
+    if value is None or value is False:
+        return None
+    if value is True:
+        return DEFAULT_SLICE_MS / 1000.0
+    text = str(value).strip().lower()
+    if text in ("", "false", "off", "none"):
+        return None
+    if text in ("true", "on"):
+        return DEFAULT_SLICE_MS / 1000.0
+    try:
+        milliseconds = float(text)
+    except ValueError:
+        raise ValueError(f"Slice must be True or milliseconds per slice, got '{value}'")
+    return milliseconds / 1000.0 if milliseconds > 0 else None
+
+
+def batched(method):
+    """Run a wire action inside one WireBatch: coalesced writes, one refresh"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.batch() as batch:
+            batch.used = True
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+# ==================== PLANS ====================
+
+MODE_NAMES = {0: "Hidden", 1: "Faint", 2: "Default"}
+
+
+def enum_name(value):
+    """Name of a .NET (or mock) enum value"""
+    return getattr(value, "name", None) or str(value)
+
+
+def tree_property(param, name):
+    """A param's DataMapping (by name), Simplify or Reverse"""
+    value = getattr(param, name)
+    return enum_name(value) if name == "DataMapping" else bool(value)
+
+
+class WirePlan:
+    """
+    Change set of a plan-only run, recorded instead of applied.
+    
+    Every write site checks hopper.plan and records here instead: wire
+    display (old -> new), wires to remove, DataMapping/Simplify/Reverse,
+    the Draw Wires setting and named views, plus the objects whose solution
+    would expire. Later lines of a script read planned values back (wire
+    display through the batch, tree flags through tree_value), so a script
+    plans what it would do. hopper.apply_plan() replays the change set
+    without re-running the actions once stale() finds the document unchanged.
+    """
+    
+    def __init__(self, hopper):
+        self.hopper = hopper
+        self.actions = []
+        self.displays = {}      # param InstanceGuid -> [param, old display, new display]
+        self.removed = {}       # (param guid, source guid) -> (param, source)
+        self.trees = {}         # param InstanceGuid -> [param, {property: [old, new]}]
+        self.settings = {}      # Grasshopper setting -> value
+        self.views = []         # ("save", WireView) or ("delete", name)
+        self.expire = {}        # InstanceGuid -> object to expire
+        self.expired = set()    # everything downstream that would recompute
+        self.state = None       # hopper.document_state() when planned
+    
+    # ---------- recording ----------
+    
+    def set_display(self, param, display):
+        entry = self.displays.get(param.InstanceGuid)
+        if entry is None:
+            self.displays[param.InstanceGuid] = [param, param.WireDisplay, display]
+        else:
+            entry[2] = display
+    
+    def remove_wire(self, param, source):
+        self.removed[(param.InstanceGuid, source.InstanceGuid)] = (param, source)
+    
+    def is_removed(self, param, source):
+        return (param.InstanceGuid, source.InstanceGuid) in self.removed
+    
+    def planned_view(self, name):
+        """("save", WireView) or ("delete", name) planned last for a view name, or None"""
+        for action, item in reversed(self.views):
+            if (item.name if action == "save" else item) == name:
+                return action, item
+        return None
+    
+    def set_tree(self, param, name, value):
+        entry = self.trees.setdefault(param.InstanceGuid, [param, {}])
+        change = entry[1].setdefault(name, [tree_property(param, name), value])
+        change[1] = value
+    
+    def tree_value(self, param, name):
+        """Planned value of a tree property, else the param's own"""
+        entry = self.trees.get(param.InstanceGuid)
+        if entry is not None and name in entry[1]:
+            return entry[1][name][1]
+        return tree_property(param, name)
+    
+    def expire_objects(self, objects, downstream):
+        for obj in objects:
+            self.expire.setdefault(obj.InstanceGuid, obj)
+        self.expired |= downstream
+    
+    # ---------- reading ----------
+    
+    def tree_changes(self):
+        """(param, property, old, new) for every property that would change"""
+        return [(param, name, old, new)
+                for param, changes in self.trees.values()
+                for name, (old, new) in changes.items() if old != new]
+    
+    def stale(self):
+        """Why the plan no longer matches the document, or None"""
+        if self.hopper.document_state() != self.state:
+            return "objects were added, removed, moved or rewired"
+        for param, old, new in self.displays.values():
+            if param.WireDisplay != old:
+                return f"the wire display of {param.NickName} changed"
+        for param, name, old, new in self.tree_changes():
+            if tree_property(param, name) != old:
+                return f"{name} of {param.NickName} changed"
+        return None
+    
+    def summary(self):
+        """One-line summary for Info"""
+        return (f"{len(self.displays)} wire display changes, {len(self.removed)} wires to disconnect, "
+                f"{len(self.tree_changes())} tree changes, {len(self.expired)} objects to recompute")
+    
+    def to_json(self):
+        """The change set as JSON, for the Plan output"""
+        names = {display: MODE_NAMES[mode] for mode, display in self.hopper.wire_modes.items()}
+        record = {
+            "actions": self.actions,
+            "state": self.state,
+            "wire_display": [
+                {"param": str(param.InstanceGuid), "name": param.NickName,
+                 "old": names.get(old, enum_name(old)), "new": names[new]}
+                for param, old, new in self.displays.values()],
+            "disconnect": [
+                {"param": str(param.InstanceGuid), "source": str(source.InstanceGuid)}
+                for param, source in self.removed.values()],
+            "tree": [
+                {"param": str(param.InstanceGuid), "name": param.NickName, "property": name, "old": old, "new": new}
+                for param, name, old, new in self.tree_changes()],
+            "settings": self.settings,
+            "views": [{"action": action, "name": item.name if action == "save" else item}
+                      for action, item in self.views],
+            "expire": sorted(str(guid) for guid in self.expired),
+        }
+        return json.dumps(record, sort_keys=True)
+
+
+# ==================== UNDO JOURNAL ====================
+
+UNDO_KEY = "WireHopper.Undo"
+DATA_MAPPINGS = ("None", "Flatten", "Graft")
+
+
+def tree_state(param):
+    """DataMapping, Simplify and Reverse packed into one small int"""
+    state = 2 * bool(param.Simplify) + bool(param.Reverse)
+    if param.GetType().GetProperty("DataMapping"):
+        state |= 4 * (1 + DATA_MAPPINGS.index(enum_name(param.DataMapping)))
+    return state
+
+
+def tree_state_changes(state):
+    """{property: value} that puts a param back into a packed tree state"""
+    changes = {"Simplify": bool(state & 2), "Reverse": bool(state & 1)}
+    if state >= 4:
+        changes["DataMapping"] = DATA_MAPPINGS[(state >> 2) - 1]
+    return changes
+
+
+class UndoEntry:
+    """
+    One run's changes as packed arrays.
+    
+    Each changed param is a 16-byte GUID key with its old and new wire mode,
+    tree state or source list (as GUID keys too), so an entry holds no
+    references to live objects and costs a few dozen bytes per param.
+    Changes inside cluster documents are nested entries, keyed by the GUID
+    keys of the clusters from the top level down.
+    """
+    
+    def __init__(self, label):
+        self.label = label
+        self.display_keys = bytearray()
+        self.modes = array('b')         # old, new wire mode per display key
+        self.tree_keys = bytearray()
+        self.states = array('b')        # old, new tree_state() per tree key
+        self.source_keys = bytearray()
+        self.wires = bytearray()        # source GUID keys, old then new list per source key
+        self.bounds = array('l', [0])   # end of each old and new list in wires, in keys
+        self.clusters = {}              # cluster path key -> UndoEntry of that cluster's document
+    
+    def __len__(self):
+        return ((len(self.display_keys) + len(self.tree_keys) + len(self.source_keys)) // 16
+                + sum(len(nested) for nested in self.clusters.values()))
+    
+    def clear_displays(self):
+        """Forget the wire display changes"""
+        self.display_keys = bytearray()
+        self.modes = array('b')
+    
+    def nbytes(self):
+        """Size of the packed data"""
+        return (len(self.display_keys) + len(self.tree_keys) + len(self.source_keys) + len(self.wires)
+                + len(self.modes) + len(self.states) + self.bounds.itemsize * len(self.bounds)
+                + sum(len(key) + nested.nbytes() for key, nested in self.clusters.items()))
+    
+    def add_display(self, param, old, new):
+        self.display_keys += guid_key(param.InstanceGuid)
+        self.modes.extend((old, new))
+    
+    def add_tree(self, param, old, new):
+        self.tree_keys += guid_key(param.InstanceGuid)
+        self.states.extend((old, new))
+    
+    def add_sources(self, param, old, new):
+        self.source_keys += guid_key(param.InstanceGuid)
+        for sources in (old, new):
+            for source in sources:
+                self.wires += guid_key(source.InstanceGuid)
+            self.bounds.append(len(self.wires) // 16)
+    
+    def displays(self, side):
+        """(key, mode) per param; side 0 is before the run, 1 after it"""
+        keys = self.display_keys
+        for i in range(len(keys) // 16):
+            yield bytes(keys[16 * i:16 * i + 16]), self.modes[2 * i + side]
+    
+    def trees(self, side):
+        """(key, tree state) per param"""
+        keys = self.tree_keys
+        for i in range(len(keys) // 16):
+            yield bytes(keys[16 * i:16 * i + 16]), self.states[2 * i + side]
+    
+    def sources(self, side):
+        """(key, [source keys]) per param"""
+        keys, wires, bounds = self.source_keys, self.wires, self.bounds
+        for i in range(len(keys) // 16):
+            start, end = bounds[2 * i + side], bounds[2 * i + side + 1]
+            yield (bytes(keys[16 * i:16 * i + 16]),
+                   [bytes(wires[16 * k:16 * k + 16]) for k in range(start, end)])
+
+
+class UndoRecorder:
+    """
+    Params changed during one run, with their state before the first change.
+    
+    Write sites call set_display/set_tree/set_sources before writing while
+    hopper.recorder is set; pack() compares with the state after the run and
+    keeps only what actually changed.
+    """
+    
+    def __init__(self, hopper):
+        self.hopper = hopper
+        self.displays = {}  # InstanceGuid -> [param, old display, new display]
+        self.trees = {}     # InstanceGuid -> (param, old tree_state)
+        self.wires = {}     # InstanceGuid -> (param, [old sources])
+        self.clusters = {}  # cluster path key -> UndoRecorder of that cluster's document
+    
+    def cluster(self, path, engine):
+        """The recorder for the document of the last cluster in path, run by engine"""
+        key = cluster_path_key(path)
+        recorder = self.clusters.get(key)
+        if recorder is None:
+            recorder = self.clusters[key] = UndoRecorder(engine)
+        return recorder
+    
+    def set_display(self, param, old, new):
+        entry = self.displays.get(param.InstanceGuid)
+        if entry is None:
+            self.displays[param.InstanceGuid] = [param, old, new]
+        else:
+            entry[2] = new
+    
+    def set_tree(self, param):
+        if param.InstanceGuid not in self.trees:
+            self.trees[param.InstanceGuid] = (param, tree_state(param))
+    
+    def set_sources(self, param):
+        if param.InstanceGuid not in self.wires:
+            self.wires[param.InstanceGuid] = (param, list(param.Sources))
+    
+    def pack(self, label):
+        """UndoEntry of the changes, or None if nothing changed"""
+        modes = {display: mode for mode, display in self.hopper.wire_modes.items()}
+        entry = UndoEntry(label)
+        for param, old, new in self.displays.values():
+            if old != new:
+                entry.add_display(param, modes[old], modes[new])
+        for param, old in self.trees.values():
+            new = tree_state(param)
+            if new != old:
+                entry.add_tree(param, old, new)
+        for param, old in self.wires.values():
+            new = list(param.Sources)
+            if [source.InstanceGuid for source in old] != [source.InstanceGuid for source in new]:
+                entry.add_sources(param, old, new)
+        for key, recorder in self.clusters.items():
+            nested = recorder.pack(label)
+            if nested is not None:
+                entry.clusters[key] = nested
+        return entry if len(entry) else None
+
+
+class UndoJournal:
+    """
+    Undo and redo stacks of one document's UndoEntries.
+    
+    Kept in scriptcontext.sticky, so history survives engine rebuilds. The
+    oldest entries are dropped once the stacks hold more than MAX_ENTRIES
+    entries or MAX_BYTES of packed data; the newest entry is always kept.
+    """
+    
+    MAX_ENTRIES = 100
+    MAX_BYTES = 4 * 1024 * 1024
+    
+    def __init__(self):
+        self.undo = []
+        self.redo = []
+    
+    def record(self, entry):
+        """Push a new entry; it replaces anything that could be redone"""
+        self.undo.append(entry)
+        self.redo = []
+        while len(self.undo) > 1 and (len(self.undo) > self.MAX_ENTRIES or self.nbytes() > self.MAX_BYTES):
+            self.undo.pop(0)
+    
+    def drop_displays(self, entry):
+        """Take an entry's wire display changes back out (a cancelled sliced apply)"""
+        entry.clear_displays()
+        if not len(entry):
+            for stack in (self.undo, self.redo):
+                if entry in stack:
+                    stack.remove(entry)
+    
+    def nbytes(self):
+        return sum(entry.nbytes() for entry in self.undo) + sum(entry.nbytes() for entry in self.redo)
+    
+    def status(self):
+        return f"{len(self.undo)} undo / {len(self.redo)} redo steps, {self.nbytes() / 1024:.1f} KB"
+
+
+def undo_journal(doc):
+    """The UndoJournal of a document, created on first use"""
+    journals = sc.sticky.setdefault(UNDO_KEY, {})
+    key = str(doc.DocumentID)
+    if key not in journals:
+        journals[key] = UndoJournal()
+    return journals[key]
+
 
 class WireHopperPython:
     """Main class containing all wire operations"""
     
-    def __init__(self):
-        self.doc = gh.Instances.ActiveCanvas.Document if gh.Instances.ActiveCanvas else None
+    def __init__(self, doc=None, profiler=None):
+        if doc is None and gh.Instances.ActiveCanvas:
+            doc = gh.Instances.ActiveCanvas.Document
+        self.doc = doc
         self.wire_modes = {
             0: GH_ParamWireDisplay.hidden,
             1: GH_ParamWireDisplay.faint,
             2: GH_ParamWireDisplay.default
         }
+        self.classifier = shared_classifier()
+        self.profiler = profiler or NULL_PROFILER
+        self._index = None
+        self._batch = None
+        self.last_batch = None
+        self.last_expired = None
+        self._shared_lengths = None
+        self._lengths_cache = None  # (edge_serial, pivots, lengths) kept while warm
+        self.last_view_report = None
+        self.last_trace = None
+        self.warm = False
+        self.fingerprint = None
+        self.expired_guids = set()  # everything expired during this solve
+        self.defer_solution = False # hold NewSolution back for solve_deferred()
+        self.unsolved = False
+        self.slice_budget = None    # seconds per Idle slice for wire writes, None: write at once
+        self.sliced = None          # SlicedApply still running from an earlier solve
+        self.last_sliced = None     # SlicedApply that ended last, for APPLY_STATUS
+        self.scope = None           # slots wire actions are limited to, None for every param
+        self.members = None         # objects standing in for the selection, None for the selection
+        self.plan = None            # WirePlan recording writes instead of making them
+        self.saved_plan = None      # last plan, kept for PLAN_APPLY
+        self.recorder = None        # UndoRecorder of the current run, None when not journaled
+        self.last_undo_report = None
+    
+    @property
+    def index(self):
+        """Shared WireIndex for the document, built on first use"""
+        if self._index is None:
+            self._index = WireIndex(self.doc, self.profiler).attach()
+        return self._index.ensure()
+    
+    def batch(self):
+        """Open (or join) the WireBatch that coalesces wire display writes"""
+        if self._batch is None:
+            self._batch = WireBatch(self)
+        return self._batch
+    
+    def begin(self, profiler=None):
+        """Reset per-action state so a warm engine can run the next action"""
+        self._batch = None
+        self.last_batch = None
+        self.last_expired = None
+        self.last_view_report = None
+        self.last_trace = None
+        self._shared_lengths = None
+        self.expired_guids = set()
+        self.defer_solution = False
+        self.unsolved = False
+        self.slice_budget = None
+        self.scope = None
+        self.members = None
+        self.plan = None
+        self.recorder = None
+        self.last_undo_report = None
+        self.profiler = profiler or NULL_PROFILER
+        if self._index is not None:
+            self._index.profiler = self.profiler
+        return self
+    
+    def release(self):
+        """End an action: warm engines stay attached, others are closed"""
+        if self.warm:
+            self.begin()
+        else:
+            self.close()
+    
+    def close(self):
+        """Release document event handlers held by the index"""
+        if self.sliced is not None:
+            self.sliced.finish()
+        if self._index is not None:
+            self._index.detach()
+            self._index = None
+        self._lengths_cache = None
         
     # ==================== CORE WIRE OPERATIONS ====================
     
+    def current_display(self, param):
+        """A param's WireDisplay, including writes still pending in an open batch"""
+        if self._batch is not None:
+            return self._batch.display(param)
+        return param.WireDisplay
+    
     def apply_wire_mode(self, param, mode):
-        """Apply wire display mode to a single parameter"""
+        """Apply wire display mode to a single parameter (deferred inside a batch)"""
         if param and mode in self.wire_modes:
-            param.WireDisplay = self.wire_modes[mode]
-            if param.Attributes:
-                param.Attributes.ExpireLayout()
+            if self._batch is not None:
+                self._batch.set(param, mode)
+            elif param.WireDisplay != self.wire_modes[mode]:
+                param.WireDisplay = self.wire_modes[mode]
+                if param.Attributes:
+                    param.Attributes.ExpireLayout()
     
+    @batched
     def set_all_wires(self, mode):
         """Set wire mode for ALL wires in document"""
         if not self.doc:
             return 0
-            
+        
+        index = self.index
         count = 0
-        for obj in self.doc.Objects:
-            if isinstance(obj, IGH_Param):
-                self.apply_wire_mode(obj, mode)
+        with self.profiler.phase("writes"):
+            for slot in (index.live_slots() if self.scope is None else self.scope):
+                self.apply_wire_mode(index.params[slot], mode)
                 count += 1
-            elif isinstance(obj, IGH_Component):
-                for param in obj.Params.Input:
-                    self.apply_wire_mode(param, mode)
-                    count += 1
-                for param in obj.Params.Output:
-                    self.apply_wire_mode(param, mode)
-                    count += 1
-        
-        # Set global setting
-        gh.Instances.Settings.SetValue("Draw Wires", mode)
         
-        if gh.Instances.ActiveCanvas:
-            gh.Instances.ActiveCanvas.Refresh()
+        # Set global setting (not for a scoped subset)
+        if self.scope is None:
+            if self.plan is not None:
+                self.plan.settings["Draw Wires"] = mode
+            else:
+                gh.Instances.Settings.SetValue("Draw Wires", mode)
+        self._batch.refresh = True
         
         return count
     
+    @batched
     def set_selected_wires(self, mode):
         """Set wire mode for SELECTED objects only"""
         if not self.doc:
             return 0
-            
+        
+        index = self.index
         count = 0
-        for obj in self.doc.SelectedObjects():
-            if isinstance(obj, IGH_Param):
-                self.apply_wire_mode(obj, mode)
+        selected = index.slots_of(self.selected_objects())
+        if self.scope is not None:
+            scope = set(self.scope)
+            selected = [slot for slot in selected if slot in scope]
+        with self.profiler.phase("writes"):
+            for slot in selected:
+                self.apply_wire_mode(index.params[slot], mode)
                 count += 1
-            elif isinstance(obj, IGH_Component):
-                for param in obj.Params.Input:
-                    self.apply_wire_mode(param, mode)
-                    count += 1
-                for param in obj.Params.Output:
-                    self.apply_wire_mode(param, mode)
-                    count += 1
-        
-        if gh.Instances.ActiveCanvas:
-            gh.Instances.ActiveCanvas.Refresh()
         
         return count
     
+    # ==================== GROUP AND CLUSTER SCOPES ====================
+    
+    def selected_objects(self):
+        """The selection, or the members of the group an action is scoped to"""
+        return self.doc.SelectedObjects() if self.members is None else self.members
+    
+    def group_members(self, name):
+        """Top-level objects of the groups named name, nested groups included"""
+        members = self.index.memberships()
+        groups = members.find_groups(name)
+        if not groups:
+            raise ValueError(f"No group named '{name}'")
+        objects = {}
+        for group in groups:
+            for obj in members.objects_of(group):
+                objects.setdefault(obj.InstanceGuid, obj)
+        return list(objects.values())
+    
+    # ==================== SOLUTION EXPIRY ====================
+    
+    def expire_objects(self, objects, recompute=True):
+        """
+        Expire objects and everything downstream without recomputing each one,
+        then start a single solution (or none when recompute is False).
+        
+        Returns the number of distinct document objects expired, counting the
+        given objects and their downstream dependents.
+        """
+        affected = {}
+        for obj in objects:
+            affected.setdefault(obj.InstanceGuid, obj)
+        if not affected:
+            self.last_expired = len(self.expired_guids)
+            return 0
+        
+        if self.plan is not None:
+            expired = self.downstream_of(affected.values())
+            self.plan.expire_objects(affected.values(), expired)
+            return len(expired)
+        
+        with self.profiler.phase("solution"):
+            for obj in affected.values():
+                obj.ExpireSolution(False)
+        
+        expired = self.downstream_of(affected.values())
+        self.profiler.count("expired", len(expired))
+        self.expired_guids |= expired
+        self.last_expired = len(self.expired_guids)
+        
+        if recompute and not self.defer_solution:
+            with self.profiler.phase("solution"):
+                self.doc.NewSolution(False)
+        else:
+            self.unsolved = True
+        
+        return len(expired)
+    
+    def solve_deferred(self):
+        """Start the one solution held back while defer_solution was set"""
+        if self.unsolved:
+            self.unsolved = False
+            with self.profiler.phase("solution"):
+                self.doc.NewSolution(False)
+    
+    def downstream_of(self, objects):
+        """Owners reachable through recipient wires, including the objects themselves"""
+        index = self.index.ensure_edges()
+        owners = index.owners
+        kinds = index.kinds
+        recipients = index.recipients
+        
+        seen = set()
+        stack = []
+        for obj in objects:
+            guid = obj.InstanceGuid
+            if guid not in seen:
+                seen.add(guid)
+                stack.append(guid)
+        
+        while stack:
+            for slot in index.owner_slots.get(stack.pop(), []):
+                if kinds[slot] == WireIndex.INPUT:
+                    continue
+                for rec in recipients[slot]:
+                    guid = owners[rec].InstanceGuid
+                    if guid not in seen:
+                        seen.add(guid)
+                        stack.append(guid)
+        
+        return seen
+    
     # ==================== DISCONNECT OPERATIONS ====================
     
-    def disconnect_selected(self, target="All"):
+    def disconnect_selected(self, target="All", recompute=True):
         """Disconnect wires from selected objects"""
         if not self.doc:
             return 0
-            
+        
+        index = self.index
+        params = index.params
+        kinds = index.kinds
+        inputs = target in ["All", "Inputs"]
+        outputs = target in ["All", "Outputs"]
+        
+        plan = self.plan
+        planned = []
+        affected = []
         count = 0
-        for obj in self.doc.SelectedObjects():
-            if isinstance(obj, IGH_Component):
-                if target in ["All", "Inputs"]:
-                    for inp in obj.Params.Input:
-                        count += len(inp.Sources)
-                        inp.RemoveAllSources()
-                
-                if target in ["All", "Outputs"]:
-                    for out in obj.Params.Output:
-                        recipients = list(out.Recipients)
-                        for rec in recipients:
-                            rec.RemoveSource(out)
-                            count += 1
-                
-                obj.ExpireSolution(True)
-                
-            elif isinstance(obj, IGH_Param):
-                if target in ["All", "Inputs"]:
-                    count += len(obj.Sources)
-                    obj.RemoveAllSources()
+        for obj in self.selected_objects():
+            if not index.is_indexed(obj):
+                continue
+            
+            before = count
+            for slot in index.slots_of([obj]):
+                param = params[slot]
+                self.profiler.count("params_touched")
+                if inputs and kinds[slot] != WireIndex.OUTPUT:
+                    if plan is not None:
+                        for source in param.Sources:
+                            if not plan.is_removed(param, source):
+                                plan.remove_wire(param, source)
+                                planned.append((param, source))
+                                count += 1
+                    else:
+                        count += len(param.Sources)
+                        if self.recorder is not None:
+                            self.recorder.set_sources(param)
+                        param.RemoveAllSources()
                 
-                if target in ["All", "Outputs"]:
-                    recipients = list(obj.Recipients)
+                if outputs and kinds[slot] != WireIndex.INPUT:
+                    recipients = list(param.Recipients)
                     for rec in recipients:
-                        rec.RemoveSource(obj)
+                        if plan is not None:
+                            if plan.is_removed(rec, param):
+                                continue
+                            plan.remove_wire(rec, param)
+                            planned.append((rec, param))
+                        else:
+                            if self.recorder is not None:
+                                self.recorder.set_sources(rec)
+                            rec.RemoveSource(param)
                         count += 1
-                
-                obj.ExpireSolution(True)
+                        # The recipient lost its data, so it needs expiring too
+                        affected.append(rec.Attributes.GetTopLevel.DocObject if rec.Attributes else rec)
+            
+            if count > before:
+                affected.append(obj)
         
+        if plan is None:
+            index.invalidate_edges()
+        elif planned:
+            slots = index.slots
+            index.remove_edges([(slots.get(param.InstanceGuid), slots.get(source.InstanceGuid))
+                                for param, source in planned])
+        self.expire_objects(affected, recompute)
         return count
     
     # ==================== TREE OPERATIONS ====================
     
-    def apply_tree_function(self, function_name, target="Both"):
+    def apply_tree_function(self, function_name, target="Both", recompute=True):
         """Apply tree functions to selected parameters"""
         if not self.doc:
             return 0
-            
+        
+        index = self.index
+        params = index.params
+        kinds = index.kinds
+        skip = {"Inputs": WireIndex.OUTPUT, "Outputs": WireIndex.INPUT}.get(target)
+        
+        affected = []
         count = 0
-        for obj in self.doc.SelectedObjects():
-            if isinstance(obj, IGH_Component):
-                params = []
-                if target in ["Both", "Inputs"]:
-                    params.extend(obj.Params.Input)
-                if target in ["Both", "Outputs"]:
-                    params.extend(obj.Params.Output)
-                
-                for param in params:
-                    if self._apply_function_to_param(param, function_name):
-                        count += 1
-                        if param.Attributes:
-                            param.Attributes.ExpireLayout()
-                
-                obj.ExpireSolution(True)
-                
-            elif isinstance(obj, IGH_Param) and target == "Both":
-                if self._apply_function_to_param(obj, function_name):
+        for obj in self.selected_objects():
+            if not index.is_indexed(obj):
+                continue
+            
+            slots = index.slots_of([obj])
+            floating = len(slots) == 1 and kinds[slots[0]] == WireIndex.FLOATING
+            if floating and target != "Both":
+                continue
+            if not floating and target not in ["Both", "Inputs", "Outputs"]:
+                continue
+            
+            changed = False
+            for slot in slots:
+                if kinds[slot] == skip:
+                    continue
+                param = params[slot]
+                self.profiler.count("params_touched")
+                if self._apply_function_to_param(param, function_name):
                     count += 1
-                    if obj.Attributes:
-                        obj.Attributes.ExpireLayout()
-                    obj.ExpireSolution(True)
-        
-        if count > 0:
-            self.doc.NewSolution(True)
+                    self.profiler.count("writes")
+                    changed = True
+                    if param.Attributes and self.plan is None:
+                        param.Attributes.ExpireLayout()
+            
+            if changed:
+                affected.append(obj)
         
+        self.expire_objects(affected, recompute)
         return count
     
     def _apply_function_to_param(self, param, function_name):
-        """Helper to apply specific tree function"""
-        if function_name == "Flatten":
-            prop = param.GetType().GetProperty("DataMapping")
-            if prop:
-                prop.SetValue(param, System.Enum.Parse(prop.PropertyType, "Flatten"))
-                return True
-        
-        elif function_name == "Graft":
-            prop = param.GetType().GetProperty("DataMapping")
-            if prop:
-                prop.SetValue(param, System.Enum.Parse(prop.PropertyType, "Graft"))
-                return True
+        """Helper to apply specific tree function (recorded instead in a plan)"""
+        changes = self._tree_changes(param, function_name)
+        if changes is None:
+            return False
+        if self.plan is not None:
+            for name, value in changes.items():
+                self.plan.set_tree(param, name, value)
+        else:
+            self._write_tree(param, changes)
+        return True
+    
+    def tree_value(self, param, name):
+        """DataMapping (by name), Simplify or Reverse, including planned changes"""
+        if self.plan is not None:
+            return self.plan.tree_value(param, name)
+        return tree_property(param, name)
+    
+    def _tree_changes(self, param, function_name):
+        """{property: new value} a tree function sets, or None if it does not apply"""
+        has_mapping = bool(param.GetType().GetProperty("DataMapping"))
+        if function_name in ("Flatten", "Graft"):
+            return {"DataMapping": function_name} if has_mapping else None
+        if function_name in ("Simplify", "Reverse"):
+            return {function_name: not self.tree_value(param, function_name)}
+        if function_name == "RemoveAll":
+            changes = {"DataMapping": "None"} if has_mapping else {}
+            changes["Simplify"] = False
+            changes["Reverse"] = False
+            return changes
+        return None
+    
+    def _write_tree(self, param, changes):
+        if self.recorder is not None:
+            self.recorder.set_tree(param)
+        for name, value in changes.items():
+            if name == "DataMapping":
+                prop = param.GetType().GetProperty("DataMapping")
+                prop.SetValue(param, System.Enum.Parse(prop.PropertyType, value))
+            else:
+                setattr(param, name, value)
+    
+    # ==================== RULE EVALUATION ====================
+    
+    def evaluate_rules(self, rules, slots=None, prepare=True):
+        """
+        {slot: mode} for every param some rule decides, in one traversal.
         
-        elif function_name == "Simplify":
-            param.Simplify = not param.Simplify
-            return True
+        Later rules take precedence, so the result matches running the rules
+        one after another. Pass slots to evaluate only those params.
+        """
+        index = self.index
+        if prepare:
+            # Rules that need wire lengths share one geometry pass
+            self._shared_lengths = None
+            try:
+                for rule in rules:
+                    rule.prepare(self, index, slots)
+            finally:
+                self._shared_lengths = None
+        if slots is None:
+            slots = index.live_slots()
         
-        elif function_name == "Reverse":
-            param.Reverse = not param.Reverse
-            return True
+        deciders = [rule.decide for rule in rules]
+        decisions = {}
+        with self.profiler.phase("evaluate"):
+            for slot in slots:
+                mode = None
+                for decide in deciders:
+                    decided = decide(slot)
+                    if decided is not None:
+                        mode = decided
+                if mode is not None:
+                    decisions[slot] = mode
+        return decisions
+    
+    def apply_decisions(self, decisions):
+        """Apply {slot: mode} decisions; returns the number of params decided"""
+        params = self.index.params
+        with self.profiler.phase("writes"):
+            for slot, mode in decisions.items():
+                self.apply_wire_mode(params[slot], mode)
+        return len(decisions)
+    
+    def apply_rules(self, rules, slots=None):
+        """Evaluate rules and apply the result (for the scope, if one is set)"""
+        if slots is None:
+            slots = self.scope
+        return self.apply_decisions(self.evaluate_rules(rules, slots))
+    
+    @batched
+    def run_pipeline(self, rules):
+        """
+        Run several cleanup rules in one traversal, writing each param once.
         
-        elif function_name == "RemoveAll":
-            prop = param.GetType().GetProperty("DataMapping")
-            if prop:
-                prop.SetValue(param, System.Enum.Parse(prop.PropertyType, "None"))
-            param.Simplify = False
-            param.Reverse = False
-            return True
+        Rules are applied in order with later ones taking precedence, so the
+        result is the same as running the actions one after another.
+        """
+        if not self.doc:
+            return 0
         
-        return False
+        return self.apply_rules(rules)
     
     # ==================== LENGTH-BASED OPERATIONS ====================
     
+    def _wire_lengths(self, slots=None):
+        """Destination slots and lengths of every wire, as packed arrays"""
+        if slots is not None:
+            dst, x0, y0, x1, y1 = self.index.wire_geometry(slots)
+            with self.profiler.phase("lengths"):
+                return dst, wire_lengths(x0, y0, x1, y1)
+        if self._shared_lengths is not None:
+            return self._shared_lengths
+        
+        # Reuse the last full pass while no wire changed and nothing moved
+        index = self.index.ensure_edges()
+        with self.profiler.phase("grips"):
+            pivots = index.pivots()
+        cached = self._lengths_cache
+        if cached is not None and cached[0] == index.edge_serial and cached[1] == pivots:
+            self.profiler.count("lengths_reused")
+            result = cached[2]
+        else:
+            dst, x0, y0, x1, y1 = index.wire_geometry()
+            with self.profiler.phase("lengths"):
+                result = (dst, wire_lengths(x0, y0, x1, y1))
+            self._lengths_cache = (index.edge_serial, pivots, result)
+        self._shared_lengths = result
+        return result
+    
+    @batched
     def clean_by_length(self, max_length, mode):
         """Hide/modify wires longer than specified length"""
         if not self.doc:
             return 0
-            
-        count = 0
-        for obj in self.doc.Objects:
-            params = []
-            
-            if isinstance(obj, IGH_Param):
-                params.append(obj)
-            elif isinstance(obj, IGH_Component):
-                params.extend(obj.Params.Input)
-                params.extend(obj.Params.Output)
-            
-            for param in params:
-                for source in param.Sources:
-                    if source.Attributes and param.Attributes:
-                        src_pt = source.Attributes.OutputGrip
-                        dst_pt = param.Attributes.InputGrip
-                        
-                        dx = src_pt.X - dst_pt.X
-                        dy = src_pt.Y - dst_pt.Y
-                        length = math.sqrt(dx * dx + dy * dy)
-                        
-                        if length > max_length:
-                            self.apply_wire_mode(param, mode)
-                            count += 1
-                            break
         
-        if gh.Instances.ActiveCanvas:
-            gh.Instances.ActiveCanvas.Refresh()
-        
-        return count
+        return self.apply_rules([LengthRule(max_length, mode)])
     
-    def set_by_relative_length(self):
-        """Auto-clean wires based on relative length (top third hidden, middle faint, bottom default)"""
+    @batched
+    def set_by_relative_length(self, tiers="Thirds", cuts=None):
+        """Auto-clean wires based on relative length (top tier hidden, middle faint, bottom default)"""
         if not self.doc:
             return 0
-            
-        # Collect all wire lengths
-        wire_lengths = []
-        
-        for obj in self.doc.Objects:
-            params = []
-            if isinstance(obj, IGH_Param):
-                params.append(obj)
-            elif isinstance(obj, IGH_Component):
-                params.extend(obj.Params.Input)
-                params.extend(obj.Params.Output)
-            
-            for param in params:
-                for source in param.Sources:
-                    if source.Attributes and param.Attributes:
-                        src_pt = source.Attributes.OutputGrip
-                        dst_pt = param.Attributes.InputGrip
-                        
-                        dx = src_pt.X - dst_pt.X
-                        dy = src_pt.Y - dst_pt.Y
-                        length = math.sqrt(dx * dx + dy * dy)
-                        
-                        wire_lengths.append((param, length))
-        
-        if not wire_lengths:
-            return 0
         
-        max_length = max(l for _, l in wire_lengths)
-        tier1 = max_length / 3.0
-        tier2 = max_length * 2.0 / 3.0
+        rule = RelativeLengthRule(tiers, cuts)
+        self.apply_rules([rule])
+        return rule.wire_count
+    
+    # ==================== FAN-OUT ====================
+    
+    @batched
+    def clean_by_fanout(self, threshold=DEFAULT_FANOUT, mode=0):
+        """Set inputs fed only by outputs with many recipients; returns (count, recipient cut)"""
+        if not self.doc:
+            return 0, None
         
-        count = 0
-        for param, length in wire_lengths:
-            if length >= tier2:
-                self.apply_wire_mode(param, 0)  # Hidden
-            elif length >= tier1:
-                self.apply_wire_mode(param, 1)  # Faint
-            else:
-                self.apply_wire_mode(param, 2)  # Default
-            count += 1
+        rule = FanoutRule(threshold, mode)
+        return self.apply_rules([rule]), rule.cut
+    
+    def wire_stats(self, threshold=DEFAULT_LONG_HAUL):
+        """WireStats for every drawn wire (ending in the scope, if one is set)"""
+        if not self.doc:
+            return None
         
-        if gh.Instances.ActiveCanvas:
-            gh.Instances.ActiveCanvas.Refresh()
+        index = self.index.ensure_edges()
+        table = index.degree_table()
+        src = array('l')
+        dst, x0, y0, x1, y1 = index.wire_geometry(self.scope, src)
+        with self.profiler.phase("lengths"):
+            lengths = wire_lengths(x0, y0, x1, y1)
+        with self.profiler.phase("evaluate"):
+            return WireStats(index, table, dst, src, lengths, threshold)
+
+    # ==================== PARAM TYPE OPERATIONS ====================
+    
+    @batched
+    def clean_by_param_type(self, param_type, mode, include_inputs=True, include_outputs=True):
+        """Clean wires by parameter type"""
+        if not self.doc:
+            return 0
+        
+        if param_type not in self.classifier.groups:
+            return 0
+        
+        return self.apply_rules([TypeRule(param_type, mode, include_inputs, include_outputs)])
+    
+    # ==================== DATA SIZE OPERATIONS ====================
+    
+    @batched
+    def clean_by_data_size(self, tiers="Thirds", cuts=None, branches=False):
+        """Set wire modes based on volatile data count"""
+        if not self.doc:
+            return 0
         
-        return count
+        return self.apply_rules([DataSizeRule(tiers, cuts, branches)])
     
-    # ==================== PARAM TYPE OPERATIONS ====================
+    # ==================== PREVIEW SYNC ====================
     
-    def clean_by_param_type(self, param_type, mode, include_inputs=True, include_outputs=True):
-        """Clean wires by parameter type"""
+    @batched
+    def sync_with_preview(self):
+        """Sync wire display with component preview state"""
         if not self.doc:
             return 0
         
-        # Define parameter groups
-        param_groups = {
-            "Geometry": [Param_Geometry, Param_Brep, Param_Surface, Param_Mesh, 
-                        Param_Curve, Param_Point, Param_Vector, Param_Line, 
-                        Param_Arc, Param_Circle, Param_Plane, Param_Box],
-            "Numbers": [Param_Number, Param_Integer, Param_Complex, Param_Interval],
-            "Text": [Param_String],
-            "Boolean": [Param_Boolean],
-            "Colors": [Param_Colour]
-        }
+        return self.apply_rules([PreviewRule()])
+    
+    # ==================== VIEWPORT ====================
+    
+    def visible_slots(self):
+        """Slots of params with an incoming wire crossing the canvas viewport"""
+        canvas = gh.Instances.ActiveCanvas
+        if canvas is None or self.doc is None or not same_document(canvas.Document, self.doc):
+            raise ValueError("VIEW_ actions need the definition open on the canvas")
+        region = canvas.Viewport.VisibleRegion
+        grid = self.index.wire_grid()
+        with self.profiler.phase("evaluate"):
+            found = grid.query(region.X, region.Y, region.X + region.Width, region.Y + region.Height)
+        self.profiler.count("objects_moved", grid.moved)
+        return sorted(found)
+    
+    # ==================== FLOW TRACING ====================
+    
+    @batched
+    def trace_selected(self, direction="Both", hops=None, mode=0):
+        """
+        Show only the wires on dependency paths of the selection.
         
-        if param_type not in param_groups:
+        direction is "Up", "Down" or "Both"; hops limits how many wires away
+        from the selection a path may reach. Wires on a path are set to Default
+        and every other wire to mode (Hidden or Faint).
+        """
+        if not self.doc:
             return 0
         
-        target_types = param_groups[param_type]
-        count = 0
+        selected = self.selected_objects()
+        self.last_trace = len(selected)
+        if not selected:
+            return 0
         
-        for obj in self.doc.Objects:
-            params = []
-            
-            if isinstance(obj, IGH_Param):
-                params.append(obj)
-            elif isinstance(obj, IGH_Component):
-                if include_inputs:
-                    params.extend(obj.Params.Input)
-                if include_outputs:
-                    params.extend(obj.Params.Output)
-            
-            for param in params:
-                param_type_obj = type(param)
-                if any(param_type_obj == t or issubclass(param_type_obj, t) for t in target_types):
-                    self.apply_wire_mode(param, mode)
-                    count += 1
+        index = self.index
+        graph = index.flow_graph()
+        starts = index.slots_of(selected)
+        shown = set()
+        with self.profiler.phase("evaluate"):
+            if direction in ("Up", "Both"):
+                shown |= graph.trace(starts, True, hops)
+            if direction in ("Down", "Both"):
+                shown |= graph.trace(starts, False, hops)
         
-        if gh.Instances.ActiveCanvas:
-            gh.Instances.ActiveCanvas.Refresh()
+        params = index.params
+        with self.profiler.phase("writes"):
+            for slot in index.live_slots():
+                self.apply_wire_mode(params[slot], 2 if slot in shown else mode)
         
-        return count
+        sources = index.sources
+        return sum(len(sources[slot]) for slot in shown)
     
-    # ==================== DATA SIZE OPERATIONS ====================
+    # ==================== NAMED VIEWS ====================
     
-    def clean_by_data_size(self):
-        """Set wire modes based on volatile data count"""
+    def capture_view(self, name):
+        """WireView of every param's current wire mode"""
+        index = self.index
+        modes = {display: mode for mode, display in self.wire_modes.items()}
+        view = WireView(name)
+        for slot in index.live_slots():
+            param = index.params[slot]
+            view.keys[modes.get(self.current_display(param), 2)].append(guid_key(param.InstanceGuid))
+        return view
+    
+    def save_view(self, name):
+        """Save the current wire modes under a name; returns the number of params stored"""
         if not self.doc:
             return 0
         
-        # Collect all parameters with data counts
-        all_params = []
-        for obj in self.doc.Objects:
-            if isinstance(obj, IGH_Param):
-                all_params.append(obj)
-            elif isinstance(obj, IGH_Component):
-                all_params.extend(obj.Params.Input)
-                all_params.extend(obj.Params.Output)
+        view = self.capture_view(name)
+        if self.plan is not None:
+            self.plan.views.append(("save", view))
+        else:
+            ViewStore(self.doc).save(view)
+        return len(view)
+    
+    def delete_view(self, name):
+        """Delete a saved view; returns False if there is none by that name"""
+        store = ViewStore(self.doc)
+        if self.plan is not None:
+            planned = self.plan.planned_view(name)
+            if planned is None and name not in store.names() or planned and planned[0] == "delete":
+                return False
+            self.plan.views.append(("delete", name))
+            return True
+        return store.delete(name)
+    
+    @batched
+    def restore_view(self, name):
+        """
+        Restore a saved view, touching only params whose mode differs.
         
-        if not all_params:
+        Returns the number of params changed; self.last_view_report holds
+        (changed, already matching, missing from the document).
+        """
+        if not self.doc:
             return 0
         
-        max_count = max(p.VolatileDataCount for p in all_params)
-        if max_count == 0:
-            max_count = 1
+        planned = self.plan.planned_view(name) if self.plan is not None else None
+        if planned is None:
+            view = ViewStore(self.doc).load(name)
+        elif planned[0] == "delete":
+            raise KeyError(f"No saved view named '{name}'")
+        else:
+            view = planned[1]
+        index = self.index
+        params = index.params
+        keys = index.slot_keys()
+        wire_modes = self.wire_modes
         
-        tier1 = max_count / 3
-        tier2 = max_count * 2 / 3
+        changed = matched = missing = 0
+        for key, mode in view.modes().items():
+            slot = keys.get(key)
+            if slot is None:
+                missing += 1
+                continue
+            param = params[slot]
+            if self.current_display(param) == wire_modes[mode]:
+                matched += 1
+                continue
+            self.apply_wire_mode(param, mode)
+            changed += 1
         
-        count = 0
-        for param in all_params:
-            data_count = param.VolatileDataCount
-            
-            if data_count >= tier2:
-                self.apply_wire_mode(param, 2)  # Default (most data)
-            elif data_count >= tier1:
-                self.apply_wire_mode(param, 1)  # Faint (medium data)
-            else:
-                self.apply_wire_mode(param, 0)  # Hidden (least data)
-            count += 1
+        self.last_view_report = (changed, matched, missing)
+        return changed
+    
+    # ==================== PLANS ====================
+    
+    def document_state(self):
+        """CRC of the layout and wiring a plan is made against"""
+        index = self.index.ensure_edges()
+        crc = zlib.crc32(index.pivots().tobytes())
+        return zlib.crc32(repr((len(self.doc.Objects), index.generation, index.edge_serial)).encode(), crc)
+    
+    @batched
+    def apply_plan(self, plan, recompute=True):
+        """
+        Make a plan's changes without re-running its actions.
         
-        if gh.Instances.ActiveCanvas:
-            gh.Instances.ActiveCanvas.Refresh()
+        Raises ValueError when the document no longer matches the plan.
+        Returns the number of params and wires changed.
+        """
+        stale = plan.stale()
+        if stale:
+            raise ValueError(f"The document changed since the plan was made ({stale}); plan again")
         
-        return count
+        with self.profiler.phase("writes"):
+            for param, name, old, new in plan.tree_changes():
+                self._write_tree(param, {name: new})
+                if param.Attributes:
+                    param.Attributes.ExpireLayout()
+            for param, source in plan.removed.values():
+                if self.recorder is not None:
+                    self.recorder.set_sources(param)
+                param.RemoveSource(source)
+            for param, old, new in plan.displays.values():
+                self._batch.set_display(param, new)
+        if plan.removed:
+            self.index.invalidate_edges()
+        
+        for key, value in plan.settings.items():
+            gh.Instances.Settings.SetValue(key, value)
+            self._batch.refresh = True
+        store = ViewStore(self.doc)
+        for action, item in plan.views:
+            if action == "save":
+                store.save(item)
+            else:
+                store.delete(item)
+        
+        self.expire_objects(plan.expire.values(), recompute)
+        return len(plan.displays) + len(plan.removed) + len(plan.trees)
     
-    # ==================== PREVIEW SYNC ====================
+    # ==================== UNDO ====================
     
-    def sync_with_preview(self):
-        """Sync wire display with component preview state"""
+    @batched
+    def apply_undo(self, entry, redo=False, recompute=True):
+        """
+        Put the params of an UndoEntry back as they were before its run
+        (or after it, with redo), touching nothing else. Nested entries go
+        back into their cluster documents, which are then recomputed through
+        their top-level cluster.
+        
+        Returns the number of params changed; self.last_undo_report holds
+        (changed, missing from the document).
+        """
         if not self.doc:
             return 0
         
-        count = 0
-        for obj in self.doc.Objects:
-            preview_on = True
-            
-            # Check if object has preview capability
-            if hasattr(obj, 'IsPreviewCapable') and hasattr(obj, 'Hidden'):
-                preview_on = obj.IsPreviewCapable and not obj.Hidden
-            
-            mode = 2 if preview_on else 0  # Default or Hidden
-            
-            if isinstance(obj, IGH_Param):
-                self.apply_wire_mode(obj, mode)
-                count += 1
-            elif isinstance(obj, IGH_Component):
-                for param in obj.Params.Input:
-                    self.apply_wire_mode(param, mode)
-                    count += 1
-                for param in obj.Params.Output:
-                    self.apply_wire_mode(param, mode)
-                    count += 1
+        index = self.index
+        params = index.params
+        owners = index.owners
+        keys = index.slot_keys()
+        side = 1 if redo else 0
         
-        if gh.Instances.ActiveCanvas:
-            gh.Instances.ActiveCanvas.Refresh()
+        changed = missing = 0
+        affected = []
+        rewired = False
+        with self.profiler.phase("writes"):
+            for key, mode in entry.displays(side):
+                slot = keys.get(key)
+                if slot is None:
+                    missing += 1
+                    continue
+                self.apply_wire_mode(params[slot], mode)
+                changed += 1
+            for key, state in entry.trees(side):
+                slot = keys.get(key)
+                if slot is None:
+                    missing += 1
+                    continue
+                param = params[slot]
+                self._write_tree(param, tree_state_changes(state))
+                if param.Attributes:
+                    param.Attributes.ExpireLayout()
+                affected.append(owners[slot])
+                changed += 1
+            for key, sources in entry.sources(side):
+                slot = keys.get(key)
+                if slot is None:
+                    missing += 1
+                    continue
+                param = params[slot]
+                param.RemoveAllSources()
+                for source in sources:
+                    # Sources deleted since are left out
+                    if keys.get(source) is not None:
+                        param.AddSource(params[keys[source]])
+                affected.append(owners[slot])
+                rewired = True
+                changed += 1
+        if rewired:
+            index.invalidate_edges()
         
-        return count
+        if entry.clusters:
+            engines = {cluster_path_key(path): (path, engine)
+                       for path, engine in index.memberships().cluster_engines()}
+            for key, nested in entry.clusters.items():
+                if key not in engines:
+                    missing += len(nested)
+                    continue
+                path, engine = engines[key]
+                engine.begin(self.profiler)
+                engine.defer_solution = True
+                try:
+                    changed += engine.apply_undo(nested, redo, recompute)
+                    missing += engine.last_undo_report[1]
+                    unsolved = engine.unsolved
+                finally:
+                    engine.begin()
+                # As in run_in_cluster: expire the clusters, solve from the top level
+                if unsolved:
+                    for cluster in reversed(path[1:]):
+                        cluster.ExpireSolution(False)
+                    affected.append(path[0])
+        
+        self.last_undo_report = (changed, missing)
+        self.expire_objects(affected, recompute)
+        return changed
 
 
-# ==================== MAIN EXECUTION ====================
+# ==================== LIVE MODE ====================
 
-if __name__ == "__main__":
-    # Initialize the wire hopper
-    hopper = WireHopperPython()
+LIVE_KEY = "WireHopper.Live"
+
+
+class LiveRules:
+    """
+    Persistent "live" mode that keeps wire display in line with a set of rules.
     
-    # Default outputs
-    Info = "No action performed"
-    Count = 0
+    Subscribes to document events (objects added/deleted, solution end) and to
+    ObjectChanged on every object and param (sources, preview, enabled). Changed
+    objects are queued, and once no new event has arrived for `debounce`
+    seconds Rhino's Idle event re-evaluates the rules for just those params
+    and the recipients of their wires, so a paste of 500 components is one
+    incremental update. Rules that read solution data (CLEAN_DATA) also
+    re-evaluate everything downstream of a change when the solution ends.
+    If a document-wide threshold moves, every param is re-decided from the
+    rules' cached state.
+    """
     
-    # Parse action (default to "Help" if not provided)
-    action = Action.upper() if 'Action' in globals() and Action else "HELP"
+    def __init__(self, hopper, rules, debounce=0.25):
+        self.hopper = hopper
+        self.rules = rules
+        self.debounce = debounce
+        self.uses_data = any(rule.uses_data for rule in rules)
+        self.pending = {}       # InstanceGuid -> top-level object to re-evaluate
+        self.pending_data = {}  # objects whose downstream data changes with the next solution
+        self.watched = {}       # InstanceGuid -> objects carrying our ObjectChanged handler
+        self.last_event = 0.0
+        self.generation = None
+        self.running = False
+        self.applying = False
+        self.updates = 0
+        self.evaluated = 0
     
-    # Parse mode (default to 2 = Default)
-    mode = int(Mode) if 'Mode' in globals() and Mode is not None else 2
+    def start(self):
+        """Subscribe to events and bring the whole document in line once"""
+        doc = self.hopper.doc
+        if self.running or doc is None:
+            return self
+        doc.ObjectsAdded += self._on_objects_added
+        doc.ObjectsDeleted += self._on_objects_deleted
+        doc.SolutionEnd += self._on_solution_end
+        Rhino.RhinoApp.Idle += self._on_idle
+        for obj in doc.Objects:
+            self._watch(obj)
+        self.running = True
+        self.full_update()
+        return self
     
-    # Parse target (default to "All")
-    target = Target if 'Target' in globals() and Target else "All"
+    def stop(self):
+        """Unsubscribe from every event and release the engine"""
+        doc = self.hopper.doc
+        if not self.running:
+            return
+        doc.ObjectsAdded -= self._on_objects_added
+        doc.ObjectsDeleted -= self._on_objects_deleted
+        doc.SolutionEnd -= self._on_solution_end
+        Rhino.RhinoApp.Idle -= self._on_idle
+        for guid in list(self.watched):
+            self._unwatch(guid)
+        self.pending = {}
+        self.pending_data = {}
+        self.running = False
+        self.hopper.close()
     
-    # Parse length (default to 1000)
-    length = float(Length) if 'Length' in globals() and Length is not None else 1000.0
+    # ---------- event handlers ----------
     
-    # Execute action
-    try:
-        if action == "HELP":
-            Info = """WireHopper Actions:
+    def _watch(self, obj):
+        guid = obj.InstanceGuid
+        if guid in self.watched:
+            return
+        watched = [obj]
+        if isinstance(obj, IGH_Component):
+            watched.extend(obj.Params.Input)
+            watched.extend(obj.Params.Output)
+        for item in watched:
+            item.ObjectChanged += self._on_object_changed
+        self.watched[guid] = watched
+    
+    def _unwatch(self, guid):
+        for item in self.watched.pop(guid, []):
+            item.ObjectChanged -= self._on_object_changed
+    
+    def _queue(self, obj, data=False):
+        self.pending[obj.InstanceGuid] = obj
+        if data and self.uses_data:
+            self.pending_data[obj.InstanceGuid] = obj
+        self.last_event = time.monotonic()
+    
+    def _on_objects_added(self, sender, e):
+        for obj in e.Objects:
+            self._watch(obj)
+            self._queue(obj, data=True)
+    
+    def _on_objects_deleted(self, sender, e):
+        for obj in e.Objects:
+            self._unwatch(obj.InstanceGuid)
+            self.pending.pop(obj.InstanceGuid, None)
+            self.pending_data.pop(obj.InstanceGuid, None)
+    
+    def _on_object_changed(self, sender, e):
+        if self.applying:
+            return
+        owner = sender
+        if isinstance(sender, IGH_Param) and sender.Attributes:
+            owner = sender.Attributes.GetTopLevel.DocObject
+        self._queue(owner, data=True)
+    
+    def _on_solution_end(self, sender, e):
+        if not self.pending_data:
+            return
+        changed = list(self.pending_data.values())
+        self.pending_data = {}
+        index = self.hopper.index
+        for guid in self.hopper.downstream_of(changed):
+            slots = index.owner_slots.get(guid)
+            if slots:
+                self._queue(index.owners[slots[0]])
+    
+    def _on_idle(self, sender, e):
+        if self.pending and time.monotonic() - self.last_event >= self.debounce:
+            self.flush()
+    
+    # ---------- updates ----------
+    
+    def full_update(self):
+        """Evaluate the rules for every param"""
+        hopper = self.hopper
+        self.generation = hopper.index.generation
+        self.pending = {}
+        self._apply(hopper.evaluate_rules(self.rules), len(hopper.index.live_slots()))
+    
+    def flush(self):
+        """Re-evaluate the rules for the queued objects only"""
+        hopper = self.hopper
+        index = hopper.index.ensure_edges()
+        if index.generation != self.generation:
+            return self.full_update()
+        
+        objects = [obj for guid, obj in self.pending.items() if guid in index.owner_slots]
+        self.pending = {}
+        slots = set(index.slots_of(objects))
+        # Moving or rewiring an object also changes the wires ending at its recipients
+        for slot in list(slots):
+            slots.update(index.recipients[slot])
+        slots = sorted(slots)
+        
+        moved = False
+        for rule in self.rules:
+            if rule.prepare(hopper, index, slots):
+                moved = True
+        if moved:
+            slots = index.live_slots()
+        self._apply(hopper.evaluate_rules(self.rules, slots, prepare=False), len(slots))
+    
+    def _apply(self, decisions, evaluated):
+        self.applying = True
+        try:
+            with self.hopper.batch():
+                self.hopper.apply_decisions(decisions)
+        finally:
+            self.applying = False
+        self.updates += 1
+        self.evaluated += evaluated
+    
+    def status(self):
+        """One-line summary for Info"""
+        names = ", ".join(rule.name for rule in self.rules)
+        return f"Live rules [{names}]: {self.updates} updates, {self.evaluated} params evaluated, {len(self.pending)} pending"
+
+
+def live_rules(doc):
+    """The LiveRules running for a document, or None"""
+    return sc.sticky.get(LIVE_KEY, {}).get(str(doc.DocumentID)) if doc else None
+
+
+def start_live(doc, rules, debounce=0.25):
+    """Start (or restart) live mode for a document with the given rules"""
+    stop_live(doc)
+    live = LiveRules(WireHopperPython(doc), rules, debounce).start()
+    sc.sticky.setdefault(LIVE_KEY, {})[str(doc.DocumentID)] = live
+    return live
+
+
+def stop_live(doc):
+    """Stop live mode for a document; returns the stopped LiveRules or None"""
+    live = sc.sticky.get(LIVE_KEY, {}).pop(str(doc.DocumentID), None) if doc else None
+    if live is not None:
+        live.stop()
+    return live
+
+
+# ==================== WARM ENGINE ====================
+
+ENGINE_KEY = "WireHopper.Engines"
+
+
+def script_fingerprint(namespace):
+    """
+    CRC of the script's source, to spot an edited script.
+    
+    Inside GHPython the source is the component's Code; run from a file
+    (the bench and the mock) it is the file. Without either, the bytecode of
+    everything the script defines is hashed instead.
+    """
+    component = getattr(namespace.get("ghenv"), "Component", None)
+    source = getattr(component, "Code", None)
+    if source is None and namespace.get("__file__"):
+        try:
+            with open(namespace["__file__"], "rb") as handle:
+                source = handle.read()
+        except (IOError, OSError):
+            source = None
+    if source is not None:
+        return zlib.crc32(source if isinstance(source, bytes) else source.encode("utf-8"))
+    return code_fingerprint(namespace)
+
+
+FINGERPRINT_CONSTANTS = (bool, int, float, str, bytes, tuple, frozenset)
+
+
+def code_fingerprint(namespace):
+    """CRC of the code, defaults and constants of everything the script defines"""
+    module = namespace.get("__name__")
+    crc = 0
+    for name, value in sorted(namespace.items()):
+        if isinstance(value, FINGERPRINT_CONSTANTS):
+            # Upper-case module constants only; component inputs are globals too
+            if name.isupper():
+                crc = zlib.crc32(repr((name, value)).encode(), crc)
+            continue
+        if getattr(value, "__module__", None) != module:
+            continue
+        members = sorted(vars(value).items()) if isinstance(value, type) else [(name, value)]
+        for member_name, member in members:
+            if isinstance(member, FINGERPRINT_CONSTANTS):
+                crc = zlib.crc32(repr((member_name, member)).encode(), crc)
+                continue
+            function = getattr(member, "__func__", None) or getattr(member, "fget", None) or member
+            function = getattr(function, "__wrapped__", function)
+            code = getattr(function, "__code__", None)
+            if code is not None:
+                crc = _code_crc(code, crc)
+                defaults = (function.__defaults__, function.__kwdefaults__)
+                crc = zlib.crc32(repr(defaults).encode(), crc)
+    return crc
+
+
+def _code_crc(code, crc):
+    crc = zlib.crc32(code.co_code, crc)
+    crc = zlib.crc32(repr(code.co_names).encode(), crc)
+    for const in code.co_consts:
+        if hasattr(const, "co_code"):
+            crc = _code_crc(const, crc)
+        else:
+            crc = zlib.crc32(repr(const).encode(), crc)
+    return crc
+
+
+def same_document(a, b):
+    """Whether two references are one GH_Document; .NET wrappers need not be identical"""
+    return a is b or (a is not None and b is not None and a == b)
+
+
+def warm_engine(doc=None, profiler=None):
+    """
+    The persistent WireHopperPython for a document, kept in scriptcontext.sticky.
+    
+    Its index, flow graph and wire lengths stay current through document
+    events between solves. An engine is replaced when its document object
+    changes or the script is edited, and dropped when the document closes.
+    """
+    if doc is None and gh.Instances.ActiveCanvas:
+        doc = gh.Instances.ActiveCanvas.Document
+    if doc is None:
+        return WireHopperPython(doc, profiler)
+    
+    engines = sc.sticky.get(ENGINE_KEY)
+    if engines is None:
+        engines = sc.sticky[ENGINE_KEY] = {}
+        server = getattr(gh.Instances, "DocumentServer", None)
+        if server is not None:
+            server.DocumentRemoved += _on_document_removed
+    
+    key = str(doc.DocumentID)
+    fingerprint = script_fingerprint(globals())
+    engine = engines.get(key)
+    if engine is not None and (not same_document(engine.doc, doc) or engine.fingerprint != fingerprint):
+        engine.close()
+        engine = None
+    if engine is None:
+        engine = engines[key] = WireHopperPython(doc)
+        engine.warm = True
+        engine.fingerprint = fingerprint
+    return engine.begin(profiler)
+
+
+def drop_engine(doc):
+    """Close and forget the warm engine, live mode and undo history of a document"""
+    engine = sc.sticky.get(ENGINE_KEY, {}).pop(str(doc.DocumentID), None)
+    if engine is not None:
+        engine.close()
+    stop_live(doc)
+    sc.sticky.get(UNDO_KEY, {}).pop(str(doc.DocumentID), None)
+    return engine
+
+
+def _on_document_removed(sender, doc):
+    drop_engine(doc)
+
+
+# ==================== ACTION REGISTRY ====================
+
+HELP_TEXT = """WireHopper Actions:
             
 WIRE DISPLAY:
   ALL_DEFAULT, ALL_FAINT, ALL_HIDDEN - Set all wires
@@ -451,121 +3407,723 @@ TREE FUNCTIONS:
   FLATTEN, GRAFT, SIMPLIFY, REVERSE - Apply to selected
   REMOVE_TREE - Remove all tree operations
   (Use Target: Both/Inputs/Outputs)
+  (Disconnect and tree actions run one solution; Recompute=False defers it)
   
 CLEANUP:
   CLEAN_LENGTH - Hide wires > Length pixels (use Mode)
   AUTO_LENGTH - Auto-clean by relative length
+    (Target: Percentile:80,95 or Quantile:0.8,0.95 for percentile tiers,
+     Log for log-scale tiers)
   CLEAN_GEOMETRY, CLEAN_NUMBERS, CLEAN_TEXT - By param type
+  CLEAN_BOOLEAN, CLEAN_COLORS - By param type
+  REGISTER_GROUP - Add a param group (Target: Name:TypeName1,Param_LB*)
+  CLEAN_<NAME> - By a registered group
   CLEAN_DATA - By data size
+    (Target: Log, Percentile:50,90 or Quantile:0.5,0.9; add Branches to
+     count tree branches as well as items, e.g. 'Log Branches')
+  CLEAN_FANOUT - Hide inputs fed only by outputs with many recipients
+    (use Mode; Target: recipients, e.g. 40, or Percentile:95; default 10)
   SYNC_PREVIEW - Match component preview state
+  PIPELINE - Run several cleanup rules in one pass, later rules win
+    (Target: 'AUTO_LENGTH; CLEAN_DATA; SYNC_PREVIEW')
+
+WIRE STATS:
+  WIRE_STATS - Fan-in/out, lengths and long-haul wires
+    (Target: long-haul span, e.g. Percentile:99 or 5, and/or a .csv or
+     .json path to export one row per wire, e.g. 'Percentile:99 C:\\w.csv')
+
+FLOW TRACING:
+  TRACE_UP, TRACE_DOWN, TRACE_BOTH - Show only wires on paths of selected
+    (Target: hop limit, e.g. 3; Mode=1 fades other wires instead of hiding)
+
+NAMED VIEWS:
+  VIEW_SAVE, VIEW_RESTORE, VIEW_DELETE - Target: view name
+  VIEW_LIST - List saved views
+
+VIEWPORT (only wires on screen):
+  VIEW_DEFAULT, VIEW_FAINT, VIEW_HIDDEN - Set wires in view
+  VIEW_<cleanup action> - e.g. VIEW_CLEAN_LENGTH, VIEW_AUTO_LENGTH,
+    VIEW_CLEAN_TEXT, VIEW_SYNC_PREVIEW, VIEW_PIPELINE
+
+GROUPS AND CLUSTERS (start Target with a scope, then '|'):
+  GROUP:<name> - Members of a named group, e.g. 'GROUP:Facade | Inputs'
+  CLUSTER, CLUSTER:<name> - Everything inside clusters (nested too)
+  (Works with display, cleanup, disconnect, tree and trace actions)
+  VIEW_ actions take GROUP: too (the group's wires on screen), not CLUSTER
+
+BATCH:
+  One action per line (or a list, with Action set to List Access),
+  each with optional Mode=/Target=/Length=, run in one solve:
+    ALL_HIDDEN
+    SEL_DEFAULT
+    FLATTEN Target=Inputs
+
+SLICED APPLY (Slice input: True or ms per slice):
+  Large wire changes are written on idle in frame-sized slices
+  APPLY_STATUS - Report progress
+  APPLY_CANCEL - Stop and restore the params already written
+
+PLANS (DryRun input):
+  With DryRun=True any action or script only plans its changes;
+  the Plan output lists them as JSON
+  PLAN_APPLY - Apply the last plan if the document has not changed
+  PLAN_DISCARD - Forget the last plan
+
+UNDO (wire display, tree flags and disconnects):
+  UNDO_WIRES - Undo the last run (Target: number of runs, e.g. 3)
+  REDO_WIRES - Redo what UNDO_WIRES undid
+
+LIVE MODE:
+  LIVE_ON - Keep rules applied as you edit
+    (Target: 'CLEAN_LENGTH Length=1500 Mode=0; SYNC_PREVIEW')
+  LIVE_OFF, LIVE_STATUS - Stop / report live mode
 
 Examples:
   Action='ALL_HIDDEN', Mode=0
   Action='CLEAN_LENGTH', Length=1500, Mode=0
   Action='FLATTEN', Target='Inputs'"""
+
+ACTIONS = {}    # action name -> handler(hopper, command) returning (count, info)
+
+
+def register_action(*names, uses_data=False, controls_apply=False, scoped=False, selects=False,
+                    plannable=True, journaled=True):
+    """
+    Register a handler for one or more action names.
+    
+    uses_data marks handlers that read solution data, so a batch recomputes
+    anything it has expired before running them. controls_apply marks
+    handlers that act on a sliced apply still running instead of waiting
+    for it to finish. scoped marks wire actions that honour hopper.scope,
+    which makes them available as VIEW_<action>. selects marks actions on
+    the selection (hopper.selected_objects()); both kinds take a GROUP: or
+    CLUSTER scope in Target. plannable=False marks
+    handlers that cannot run in a plan-only (DryRun) pass. journaled=False
+    marks handlers that move through the undo journal themselves, so a run
+    containing them records no entry. Without names only the flags are set,
+    for handlers resolved by prefix.
+    """
+    def decorate(handler):
+        handler.uses_data = uses_data
+        handler.controls_apply = controls_apply
+        handler.scoped = scoped
+        handler.selects = selects
+        handler.plannable = plannable
+        handler.journaled = journaled
+        for name in names:
+            ACTIONS[name] = handler
+        return handler
+    return decorate
+
+
+class ActionCommand:
+    """One action with its inputs, from the Action input or one script line"""
+    
+    def __init__(self, action, mode=2, target="All", length=1000.0, recompute=True, debounce=0.25):
+        self.action = action
+        self.mode = mode
+        self.target = target
+        self.length = length
+        self.recompute = recompute
+        self.debounce = debounce
+    
+    def handler(self, classifier):
+        """Registered handler for the action, or None if it is unknown"""
+        handler = ACTIONS.get(self.action)
+        if handler is None and self.action.startswith("CLEAN_") and classifier.find(self.action[6:]):
+            handler = clean_group_action
+        if handler is None and self.action.startswith("VIEW_"):
+            inner = self.inner().handler(classifier)
+            if inner is not None and inner.scoped:
+                handler = viewport_action
+        return handler
+    
+    def inner(self):
+        """The action a VIEW_ action wraps: VIEW_HIDDEN -> ALL_HIDDEN, VIEW_CLEAN_TEXT -> CLEAN_TEXT"""
+        name = self.action[5:]
+        if name in ("DEFAULT", "FAINT", "HIDDEN"):
+            name = "ALL_" + name
+        return ActionCommand(name, self.mode, self.target, self.length, self.recompute, self.debounce)
+
+
+def parse_script(actions, mode=2, target="All", length=1000.0, recompute=True, debounce=0.25):
+    """
+    ActionCommands from the Action input.
+    
+    Action may be a single action, a newline-separated script or a list of
+    either. Each line may override the component's inputs, e.g.
+    "CLEAN_LENGTH Length=1500 Mode=0"; blank lines and # comments are skipped.
+    """
+    if actions is None or isinstance(actions, str):
+        items = [actions]
+    else:
+        items = list(actions)
+    commands = []
+    for item in items:
+        for line in str(item or "").splitlines():
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                name, line_mode, line_target, line_length = parse_rule_spec(line, mode, target, length)
+            except ValueError as e:
+                raise ValueError(f"Cannot parse line {len(commands) + 1}: {e}")
+            commands.append(ActionCommand(name, line_mode, line_target, line_length, recompute, debounce))
+    return commands or [ActionCommand("HELP", mode, target, length, recompute, debounce)]
+
+
+def run_script(hopper, commands, recompute=True, dry_run=False):
+    """
+    Run commands in one solve; returns (count, info).
+    
+    Every wire write goes through one WireBatch, so the canvas refreshes once,
+    and objects expired by disconnect and tree actions are recomputed by a
+    single solution at the end. If a line fails, the lines before it are
+    still applied and the error names the failing line. What the run
+    changed becomes one entry of the document's UndoJournal. With dry_run
+    the commands only record a WirePlan (hopper.saved_plan) and nothing
+    changes.
+    """
+    handlers = [command.handler(hopper.classifier) for command in commands]
+    if len(commands) > 1:
+        for number, (command, handler) in enumerate(zip(commands, handlers), 1):
+            if handler is None:
+                raise ValueError(f"Unknown action on line {number}: {command.action}. Use 'HELP' for action list.")
+    if len(commands) > 1 and not all(handler.journaled for handler in handlers):
+        raise ValueError("UNDO_WIRES and REDO_WIRES cannot be combined with other actions in a script")
+    if dry_run:
+        for command, handler in zip(commands, handlers):
+            if handler is not None and not handler.plannable:
+                raise ValueError(f"{command.action} cannot be planned; run it without DryRun")
+    
+    # Writes still running on Idle finish first, so later actions see their result
+    if hopper.sliced is not None and not all(handler is not None and handler.controls_apply
+                                             for handler in handlers):
+        hopper.sliced.finish()
+    
+    results = []
+    failure = None
+    hopper.defer_solution = True
+    if dry_run:
+        hopper.plan = WirePlan(hopper)
+    elif hopper.doc and all(handler is None or handler.journaled for handler in handlers):
+        # Everything the run changes becomes one undo entry
+        hopper.recorder = UndoRecorder(hopper)
+    try:
+        with hopper.batch() as batch:
+            for number, (command, handler) in enumerate(zip(commands, handlers), 1):
+                if handler is None:
+                    results.append((0, f"Unknown action: {command.action}. Use 'HELP' for action list."))
+                    continue
+                if handler.uses_data and recompute:
+                    hopper.solve_deferred()
+                pending = dict(batch.pending)
+                try:
+                    results.append(run_command(hopper, command, handler))
+                except Exception as e:
+                    # Drop the failing line's own writes, keep the lines before it
+                    batch.pending = pending
+                    failure = (number, command, e)
+                    break
+    finally:
+        plan = hopper.plan
+        hopper.plan = None
+        recorder = hopper.recorder
+        hopper.recorder = None
+        if recorder is not None:
+            entry = recorder.pack(", ".join(command.action for command in commands))
+            if entry is not None:
+                journal = undo_journal(hopper.doc)
+                journal.record(entry)
+                sliced = hopper.sliced
+                if sliced is not None and sliced.running and sliced.entry is None:
+                    # Cancelling the slices takes their writes back out of this entry
+                    sliced.journal, sliced.entry = journal, entry
+        if plan is not None and plan.removed:
+            # Back to the document's own wires after planned disconnects
+            hopper.index.invalidate_edges()
+        hopper.defer_solution = False
+        if recompute:
+            hopper.solve_deferred()
+    
+    if failure is not None:
+        number, command, e = failure
+        if len(commands) == 1:
+            raise e
+        raise ValueError(f"line {number} ({command.action}) failed after {number - 1} actions ran: {e}")
+    
+    count = sum(result[0] for result in results)
+    if len(results) == 1:
+        info = results[0][1]
+    else:
+        info = "\n".join(f"{number}. {result[1]}" for number, result in enumerate(results, 1))
+        info += f"\nRan {len(results)} actions in one solve"
+    
+    if plan is not None:
+        plan.actions = [command.action for command in commands]
+        plan.state = hopper.document_state()
+        hopper.saved_plan = plan
+        return count, f"Plan only, nothing changed:\n{info}\nPlanned {plan.summary()} (PLAN_APPLY to apply)"
+    
+    # Report how much write churn the batch avoided
+    if batch.used:
+        info += f" ({batch.written} written, {batch.skipped} unchanged)"
+    
+    # Report how far the solution expiry reached
+    if hopper.last_expired is not None:
+        info += f" (expired {hopper.last_expired} objects{'' if recompute else ', recompute deferred'})"
+    
+    # Writes left for Idle slices
+    if batch.sliced is not None and batch.sliced.running:
+        info += f"\n{batch.sliced.status()}, the rest follows on idle (APPLY_CANCEL or Esc to cancel)"
+    return count, info
+
+
+def parse_scope(target):
+    """
+    (kind, name, rest of Target) for a Target starting with GROUP:<name> or
+    CLUSTER[:<name>], else (None, None, target). The action's own Target
+    follows a '|', e.g. 'GROUP:Facade | Inputs'.
+    """
+    head, _, rest = str(target).partition("|")
+    kind, _, name = head.partition(":")
+    kind = kind.strip().upper()
+    if kind not in ("GROUP", "CLUSTER"):
+        return None, None, target
+    name = name.strip() or None
+    if kind == "GROUP" and name is None:
+        raise ValueError("GROUP needs a group name, e.g. 'GROUP:Facade'")
+    return kind, name, rest.strip() or "All"
+
+
+def run_command(hopper, command, handler):
+    """
+    Run one command, limited to the group or clusters its Target starts
+    with, and within any scope already set (the viewport of a VIEW_ action).
+    """
+    kind = None
+    if handler.scoped or handler.selects:
+        kind, name, target = parse_scope(command.target)
+    if kind is None:
+        return handler(hopper, command)
+    
+    command = ActionCommand(command.action, command.mode, target, command.length, command.recompute,
+                            command.debounce)
+    outer = hopper.scope
+    if kind == "GROUP":
+        objects = hopper.group_members(name)
+        hopper.members = objects
+        hopper.scope = hopper.index.slots_of(objects)
+        if outer is not None:
+            # Inside a VIEW_ action: the group's params that are on screen
+            visible = set(outer)
+            hopper.scope = [slot for slot in hopper.scope if slot in visible]
+        try:
+            count, info = handler(hopper, command)
+        finally:
+            hopper.members = None
+            hopper.scope = outer
+        return count, f"{info} in group '{name}' ({len(objects)} objects)"
+    
+    if outer is not None:
+        raise ValueError("CLUSTER scopes cannot be combined with VIEW_ actions")
+    if hopper.plan is not None:
+        raise ValueError("CLUSTER scopes cannot be planned; run them without DryRun")
+    engines = hopper.index.memberships().cluster_engines(name)
+    if not engines:
+        raise ValueError(f"No cluster named '{name}'" if name else "No clusters in the document")
+    count = 0
+    for path, engine in engines:
+        count += run_in_cluster(hopper, path, engine, command, handler)
+    return count, f"{command.action} inside {len(engines)} cluster documents (nested included): {count} changed"
+
+
+def run_in_cluster(hopper, path, engine, command, handler):
+    """
+    Run a handler on every object of a cluster's document; returns its count.
+    
+    The cluster document is never solved on its own: when the action expired
+    anything in it, the clusters along path are expired instead and the
+    top-level one goes through hopper's solution.
+    """
+    engine.begin(hopper.profiler)
+    if hopper.recorder is not None:
+        engine.recorder = hopper.recorder.cluster(path, engine)
+    index = engine.index
+    engine.members = [obj for obj in engine.doc.Objects if index.is_indexed(obj)]
+    engine.scope = index.live_slots()
+    engine.defer_solution = True
+    try:
+        count = handler(engine, command)[0]
+        changed = engine.unsolved
+    finally:
+        engine.begin()
+    if changed:
+        for cluster in reversed(path[1:]):
+            cluster.ExpireSolution(False)
+        hopper.expire_objects([path[0]], command.recompute)
+    return count
+
+
+@register_action("HELP")
+def help_action(hopper, command):
+    return 0, HELP_TEXT
+
+
+# Wire display: action -> (selected only, mode, label)
+WIRE_DISPLAY_ACTIONS = {
+    "ALL_DEFAULT": (False, 2, "Default"),
+    "ALL_FAINT": (False, 1, "Faint"),
+    "ALL_HIDDEN": (False, 0, "Hidden"),
+    "SEL_DEFAULT": (True, 2, "Default"),
+    "SEL_FAINT": (True, 1, "Faint"),
+    "SEL_HIDDEN": (True, 0, "Hidden"),
+}
+
+
+@register_action(*WIRE_DISPLAY_ACTIONS, scoped=True)
+def wire_display_action(hopper, command):
+    selected, mode, label = WIRE_DISPLAY_ACTIONS[command.action]
+    if selected:
+        count = hopper.set_selected_wires(mode)
+        return count, f"Set {count} selected wires to {label}"
+    count = hopper.set_all_wires(mode)
+    return count, f"Set {count} wires to {label}"
+
+
+# Disconnect: action -> (target, what the count is of)
+DISCONNECT_ACTIONS = {
+    "DISCONNECT_ALL": ("All", "wires"),
+    "DISCONNECT_INPUTS": ("Inputs", "input wires"),
+    "DISCONNECT_OUTPUTS": ("Outputs", "output wires"),
+}
+
+
+@register_action(*DISCONNECT_ACTIONS, selects=True)
+def disconnect_action(hopper, command):
+    target, label = DISCONNECT_ACTIONS[command.action]
+    count = hopper.disconnect_selected(target, command.recompute)
+    return count, f"Disconnected {count} {label}"
+
+
+# Tree functions: action -> (function name, message)
+TREE_ACTIONS = {
+    "FLATTEN": ("Flatten", "Flattened {} parameters"),
+    "GRAFT": ("Graft", "Grafted {} parameters"),
+    "SIMPLIFY": ("Simplify", "Toggled Simplify on {} parameters"),
+    "REVERSE": ("Reverse", "Toggled Reverse on {} parameters"),
+    "REMOVE_TREE": ("RemoveAll", "Removed tree operations from {} parameters"),
+}
+
+
+@register_action(*TREE_ACTIONS, selects=True)
+def tree_action(hopper, command):
+    function_name, message = TREE_ACTIONS[command.action]
+    count = hopper.apply_tree_function(function_name, command.target, command.recompute)
+    return count, message.format(count)
+
+
+@register_action("CLEAN_LENGTH", scoped=True)
+def clean_length_action(hopper, command):
+    count = hopper.clean_by_length(command.length, command.mode)
+    return count, f"Modified {count} wires longer than {command.length}px"
+
+
+@register_action("AUTO_LENGTH", scoped=True)
+def auto_length_action(hopper, command):
+    tiers, cuts = parse_tiers(command.target)
+    count = hopper.set_by_relative_length(tiers, cuts)
+    return count, f"Auto-cleaned {count} wires by relative length ({tiers})"
+
+
+# Built-in param type cleanup: action -> (group, label)
+TYPE_ACTIONS = {
+    "CLEAN_GEOMETRY": ("Geometry", "geometry"),
+    "CLEAN_NUMBERS": ("Numbers", "number"),
+    "CLEAN_TEXT": ("Text", "text"),
+    "CLEAN_BOOLEAN": ("Boolean", "boolean"),
+    "CLEAN_COLORS": ("Colors", "color"),
+}
+
+
+@register_action(*TYPE_ACTIONS, scoped=True)
+def clean_type_action(hopper, command):
+    group, label = TYPE_ACTIONS[command.action]
+    count = hopper.clean_by_param_type(group, command.mode)
+    return count, f"Modified {count} {label} parameter wires"
+
+
+@register_action(scoped=True)
+def clean_group_action(hopper, command):
+    """CLEAN_<NAME> for groups added with REGISTER_GROUP"""
+    group = hopper.classifier.find(command.action[6:])
+    count = hopper.clean_by_param_type(group, command.mode)
+    return count, f"Modified {count} {group} parameter wires"
+
+
+@register_action("REGISTER_GROUP", plannable=False)
+def register_group_action(hopper, command):
+    group, patterns = parse_group(command.target)
+    hopper.classifier.register(group, patterns)
+    return 0, f"Registered {len(patterns)} type patterns in group '{group}' (use CLEAN_{group.upper()})"
+
+
+@register_action("CLEAN_DATA", uses_data=True, scoped=True)
+def clean_data_action(hopper, command):
+    tiers, cuts, branches = parse_data_tiers(command.target)
+    count = hopper.clean_by_data_size(tiers, cuts, branches)
+    return count, f"Auto-cleaned {count} wires by data size ({tiers}{', with branches' if branches else ''})"
+
+
+@register_action("CLEAN_FANOUT", scoped=True)
+def clean_fanout_action(hopper, command):
+    count, cut = hopper.clean_by_fanout(parse_threshold(command.target, DEFAULT_FANOUT), command.mode)
+    if cut is None:
+        return 0, "No active document"
+    return count, f"Modified {count} wires fed only by outputs with {cut:g}+ recipients"
+
+
+@register_action("WIRE_STATS", scoped=True)
+def wire_stats_action(hopper, command):
+    threshold, path = parse_stats_target(command.target)
+    stats = hopper.wire_stats(threshold)
+    if stats is None:
+        return 0, "No active document"
+    summary = stats.summary()
+    fan_out, fan_in, length = summary["fan_out"], summary["fan_in"], summary["length"]
+    info = (f"{len(stats)} wires; fan-out max {fan_out['max']} (p95 {fan_out['p95']:g}), "
+            f"fan-in max {fan_in['max']} (p95 {fan_in['p95']:g}); "
+            f"length p50 {length['p50']:.0f}px, p95 {length['p95']:.0f}px, max {length['max']:.0f}px; "
+            f"{stats.long_haul} long-haul wires spanning {stats.min_span:g}+ of {summary['levels']} levels")
+    if fan_out["top"]:
+        top = fan_out["top"][0]
+        info += f"; busiest output {top['name']} ({top['recipients']} recipients)"
+    if path:
+        with hopper.profiler.phase("export"):
+            stats.export(path)
+        info += f"; written to {path}"
+    return len(stats), info
+
+
+@register_action("SYNC_PREVIEW", scoped=True)
+def sync_preview_action(hopper, command):
+    count = hopper.sync_with_preview()
+    return count, f"Synced {count} wires with preview state"
+
+
+@register_action("TRACE_UP", "TRACE_DOWN", "TRACE_BOTH", selects=True)
+def trace_action(hopper, command):
+    direction = command.action[6:].capitalize()
+    hops = parse_hops(command.target)
+    count = hopper.trace_selected(direction, hops, 1 if command.mode == 1 else 0)
+    if not hopper.last_trace:
+        return count, "Select objects to trace"
+    side = {"Up": "upstream", "Down": "downstream", "Both": "up- and downstream"}[direction]
+    reach = f" within {hops} hops" if hops is not None else ""
+    return count, f"Traced {count} wires {side} of {hopper.last_trace} selected objects{reach}"
+
+
+@register_action("VIEW_SAVE")
+def view_save_action(hopper, command):
+    if command.target == "All":
+        raise ValueError("VIEW_SAVE needs a view name in Target")
+    count = hopper.save_view(command.target)
+    return count, f"Saved view '{command.target}' with {count} wires ({ViewStore(hopper.doc).location})"
+
+
+@register_action("VIEW_RESTORE")
+def view_restore_action(hopper, command):
+    count = hopper.restore_view(command.target)
+    changed, matched, missing = hopper.last_view_report
+    return count, (f"Restored view '{command.target}': {changed} wires changed, "
+                   f"{matched} already matched, {missing} no longer in document")
+
+
+@register_action("VIEW_DELETE")
+def view_delete_action(hopper, command):
+    count = 1 if hopper.delete_view(command.target) else 0
+    return count, f"Deleted view '{command.target}'" if count else f"No saved view named '{command.target}'"
+
+
+@register_action("VIEW_LIST")
+def view_list_action(hopper, command):
+    names = ViewStore(hopper.doc).names()
+    return len(names), "Saved views: " + (", ".join(names) if names else "(none)")
+
+
+# The wrapped action may read solution data (VIEW_CLEAN_DATA, VIEW_PIPELINE)
+@register_action(uses_data=True)
+def viewport_action(hopper, command):
+    """VIEW_<action>: a display or cleanup action limited to wires on screen"""
+    inner = command.inner()
+    handler = inner.handler(hopper.classifier)
+    hopper.scope = hopper.visible_slots()
+    on_screen = len(hopper.scope)
+    try:
+        count, info = run_command(hopper, inner, handler)
+    finally:
+        hopper.scope = None
+    return count, f"{info} in view ({on_screen} params with wires on screen)"
+
+
+def command_rules(hopper, command, example):
+    """Rules listed in a command's Target, or an error showing an example"""
+    text = command.target if command.target != "All" else ""
+    rules = parse_rules(text, command.mode, "All", command.length, hopper.classifier)
+    if not rules:
+        raise ValueError(f"{command.action} needs rules in Target, e.g. '{example}'")
+    return rules
+
+
+@register_action("PIPELINE", uses_data=True, scoped=True)
+def pipeline_action(hopper, command):
+    rules = command_rules(hopper, command, "AUTO_LENGTH; CLEAN_DATA; SYNC_PREVIEW")
+    count = hopper.run_pipeline(rules)
+    return count, f"Pipeline [{', '.join(rule.name for rule in rules)}] set {count} wires"
+
+
+@register_action("LIVE_ON", uses_data=True, plannable=False)
+def live_on_action(hopper, command):
+    rules = command_rules(hopper, command, "CLEAN_LENGTH Length=1500; SYNC_PREVIEW")
+    live = start_live(hopper.doc, rules, command.debounce)
+    return live.evaluated, "Started " + live.status()
+
+
+@register_action("LIVE_OFF", plannable=False)
+def live_off_action(hopper, command):
+    live = stop_live(hopper.doc)
+    return 0, "Stopped " + live.status() if live else "Live mode is not running"
+
+
+@register_action("LIVE_STATUS")
+def live_status_action(hopper, command):
+    live = live_rules(hopper.doc)
+    return (live.updates, live.status()) if live else (0, "Live mode is not running")
+
+
+@register_action("PLAN_APPLY", plannable=False)
+def plan_apply_action(hopper, command):
+    plan = hopper.saved_plan
+    if plan is None:
+        raise ValueError("No plan to apply; run the actions with DryRun=True first")
+    count = hopper.apply_plan(plan, command.recompute)
+    hopper.saved_plan = None
+    return count, f"Applied plan [{', '.join(plan.actions)}]: {plan.summary()}"
+
+
+@register_action("PLAN_DISCARD", plannable=False)
+def plan_discard_action(hopper, command):
+    plan = hopper.saved_plan
+    hopper.saved_plan = None
+    return 0, f"Discarded plan [{', '.join(plan.actions)}]" if plan else "No plan to discard"
+
+
+@register_action("UNDO_WIRES", "REDO_WIRES", plannable=False, journaled=False)
+def undo_action(hopper, command):
+    if not hopper.doc:
+        return 0, "No active document"
+    journal = undo_journal(hopper.doc)
+    redo = command.action == "REDO_WIRES"
+    source, destination = (journal.redo, journal.undo) if redo else (journal.undo, journal.redo)
+    steps = int(command.target) if str(command.target).isdigit() else 1
+    
+    labels = []
+    count = missing = 0
+    while source and len(labels) < steps:
+        entry = source[-1]
+        count += hopper.apply_undo(entry, redo, command.recompute)
+        missing += hopper.last_undo_report[1]
+        destination.append(source.pop())
+        labels.append(entry.label)
+    if not labels:
+        return 0, f"Nothing to {'redo' if redo else 'undo'} ({journal.status()})"
+    note = f", {missing} no longer in document" if missing else ""
+    return count, (f"{'Redid' if redo else 'Undid'} [{'; '.join(labels)}]: {count} params restored{note} "
+                   f"({journal.status()})")
+
+
+@register_action("APPLY_STATUS", controls_apply=True)
+def apply_status_action(hopper, command):
+    sliced = hopper.sliced
+    if sliced is not None:
+        return len(sliced.previous), sliced.status()
+    last = hopper.last_sliced
+    if last is not None and last.state == "cancelled":
+        return last.restored, last.status()
+    return 0, "No wire apply is running"
+
+
+@register_action("APPLY_CANCEL", controls_apply=True, plannable=False)
+def apply_cancel_action(hopper, command):
+    sliced = hopper.sliced
+    if sliced is None:
+        return 0, "No wire apply is running"
+    restored = sliced.cancel()
+    return restored, sliced.status()
+
+
+# ==================== MAIN EXECUTION ====================
+
+if __name__ == "__main__":
+    # Default outputs
+    Info = "No action performed"
+    Count = 0
+    Metrics = None
+    Plan = None
+    
+    # Parse action: one action, a newline-separated script or a list (default "Help")
+    actions = Action if 'Action' in globals() and Action else None
+    action = "HELP"
+    
+    # Parse mode (default to 2 = Default)
+    mode = int(Mode) if 'Mode' in globals() and Mode is not None else 2
+    
+    # Parse target (default to "All")
+    target = Target if 'Target' in globals() and Target else "All"
+    
+    # Parse length (default to 1000)
+    length = float(Length) if 'Length' in globals() and Length is not None else 1000.0
+    
+    # Parse recompute (optional input, default True; False only expires objects)
+    recompute = bool(Recompute) if 'Recompute' in globals() and Recompute is not None else True
+    
+    # Parse debounce (optional input, seconds of quiet before live mode updates)
+    debounce = float(Debounce) if 'Debounce' in globals() and Debounce is not None else 0.25
+    
+    # Parse profile (optional input: True, or a .jsonl path to append metrics to)
+    profile, trace_path = parse_profile(Profile if 'Profile' in globals() else None)
+    error = None
+    
+    # Reuse the document's warm engine (indexes and caches survive solves)
+    hopper = warm_engine(profiler=Profiler(enabled=True) if profile else None)
+    
+    # Execute the action, or the script of actions, in one solve
+    try:
+        # Parse slice (optional input: True or ms per slice; spreads large wire writes over idle time)
+        hopper.slice_budget = parse_slice(Slice if 'Slice' in globals() else None)
         
-        # Wire display actions
-        elif action == "ALL_DEFAULT":
-            Count = hopper.set_all_wires(2)
-            Info = f"Set {Count} wires to Default"
-        
-        elif action == "ALL_FAINT":
-            Count = hopper.set_all_wires(1)
-            Info = f"Set {Count} wires to Faint"
-        
-        elif action == "ALL_HIDDEN":
-            Count = hopper.set_all_wires(0)
-            Info = f"Set {Count} wires to Hidden"
-        
-        elif action == "SEL_DEFAULT":
-            Count = hopper.set_selected_wires(2)
-            Info = f"Set {Count} selected wires to Default"
-        
-        elif action == "SEL_FAINT":
-            Count = hopper.set_selected_wires(1)
-            Info = f"Set {Count} selected wires to Faint"
-        
-        elif action == "SEL_HIDDEN":
-            Count = hopper.set_selected_wires(0)
-            Info = f"Set {Count} selected wires to Hidden"
-        
-        # Disconnect actions
-        elif action == "DISCONNECT_ALL":
-            Count = hopper.disconnect_selected("All")
-            Info = f"Disconnected {Count} wires"
-        
-        elif action == "DISCONNECT_INPUTS":
-            Count = hopper.disconnect_selected("Inputs")
-            Info = f"Disconnected {Count} input wires"
-        
-        elif action == "DISCONNECT_OUTPUTS":
-            Count = hopper.disconnect_selected("Outputs")
-            Info = f"Disconnected {Count} output wires"
-        
-        # Tree function actions
-        elif action == "FLATTEN":
-            Count = hopper.apply_tree_function("Flatten", target)
-            Info = f"Flattened {Count} parameters"
-        
-        elif action == "GRAFT":
-            Count = hopper.apply_tree_function("Graft", target)
-            Info = f"Grafted {Count} parameters"
-        
-        elif action == "SIMPLIFY":
-            Count = hopper.apply_tree_function("Simplify", target)
-            Info = f"Toggled Simplify on {Count} parameters"
-        
-        elif action == "REVERSE":
-            Count = hopper.apply_tree_function("Reverse", target)
-            Info = f"Toggled Reverse on {Count} parameters"
-        
-        elif action == "REMOVE_TREE":
-            Count = hopper.apply_tree_function("RemoveAll", target)
-            Info = f"Removed tree operations from {Count} parameters"
-        
-        # Length-based cleanup
-        elif action == "CLEAN_LENGTH":
-            Count = hopper.clean_by_length(length, mode)
-            Info = f"Modified {Count} wires longer than {length}px"
-        
-        elif action == "AUTO_LENGTH":
-            Count = hopper.set_by_relative_length()
-            Info = f"Auto-cleaned {Count} wires by relative length"
-        
-        # Param type cleanup
-        elif action == "CLEAN_GEOMETRY":
-            Count = hopper.clean_by_param_type("Geometry", mode)
-            Info = f"Modified {Count} geometry parameter wires"
-        
-        elif action == "CLEAN_NUMBERS":
-            Count = hopper.clean_by_param_type("Numbers", mode)
-            Info = f"Modified {Count} number parameter wires"
-        
-        elif action == "CLEAN_TEXT":
-            Count = hopper.clean_by_param_type("Text", mode)
-            Info = f"Modified {Count} text parameter wires"
-        
-        elif action == "CLEAN_BOOLEAN":
-            Count = hopper.clean_by_param_type("Boolean", mode)
-            Info = f"Modified {Count} boolean parameter wires"
-        
-        elif action == "CLEAN_COLORS":
-            Count = hopper.clean_by_param_type("Colors", mode)
-            Info = f"Modified {Count} color parameter wires"
-        
-        # Data size cleanup
-        elif action == "CLEAN_DATA":
-            Count = hopper.clean_by_data_size()
-            Info = f"Auto-cleaned {Count} wires by data size"
-        
-        # Preview sync
-        elif action == "SYNC_PREVIEW":
-            Count = hopper.sync_with_preview()
-            Info = f"Synced {Count} wires with preview state"
+        # Parse dry run (optional input: plan the changes without making them)
+        dry_run = bool(DryRun) if 'DryRun' in globals() and DryRun is not None else False
         
-        else:
-            Info = f"Unknown action: {action}. Use 'HELP' for action list."
+        commands = parse_script(actions, mode, target, length, recompute, debounce)
+        action = ", ".join(command.action for command in commands)
+        Count, Info = run_script(hopper, commands, recompute, dry_run)
+        if dry_run:
+            Plan = hopper.saved_plan.to_json()
     
     except Exception as e:
         Info = f"Error: {str(e)}"
         Count = -1
+        error = str(e)
+    
+    finally:
+        # Structured phase timings and counters for the Metrics output
+        if profile:
+            record = hopper.profiler.metrics(action, Count, hopper.doc, error)
+            Metrics = json.dumps(record, sort_keys=True)
+            if trace_path:
+                try:
+                    Profiler.append(trace_path, record)
+                except (IOError, OSError) as e:
+                    Info += f" (could not write profile trace: {e})"
+        hopper.release()